@@ -4,12 +4,33 @@ import os
 import tempfile
 import warnings
 from email_prof_eml import generate_email, generate_email_html
-from send_mail_streamlit import send_mail, get_sender_list, get_sender_name
+from send_mail_streamlit import send_mail, send_mail_batch, get_sender_list, get_sender_name
+from mail_outbox import get_statuses, get_worker, requeue
 from Graph_Api import download_file
-from mandat import generate_mandat_email
+from sharepoint_sync import get_mirror
+from mandat import generate_mandat_email, mandat_message
+from bulk_export import export_mandats_zip
+from workbook_cache import load_sheet, frame_fingerprint, row_fingerprint
+from matching_eml import run_matching
+from assignment import suggest_assignment, CAPACITY_COLUMN, DEFAULT_CAPACITY
+from collections import OrderedDict
+from search_index import SearchIndex
+from teacher_index import TeacherIndex
+from asset_loader import AssetLoader
+from travel_cache import get_travel_cache
+from geocode_index import build_geocode_index
+import tracing
+
+# googlemaps est optionnel (préfiltre à vol d'oiseau du matching)
+try:
+    import googlemaps
+except Exception:
+    googlemaps = None
 
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
+TEST_EMAIL = "idir.hadjhamou@study-success.fr"
+
 st.set_page_config(page_title="Matching Elève-Prof", layout="wide")
 st.title("🧑‍🏫 Interface Matching Elève / Professeur")
 
@@ -29,43 +50,70 @@ with col2:
 with col3:
     mode_test = st.checkbox("🧪 Mode Test", value=False)
     if mode_test:
-        st.warning("⚠️ Mode TEST activé - Les emails seront envoyés à idir.hadjhamou@study-success.fr")
+        st.warning(f"⚠️ Mode TEST activé - Les emails seront envoyés à {TEST_EMAIL}")
 
 st.markdown("---")
 
+# Miroir SharePoint synchronisé en tâche de fond (optionnel : SHAREPOINT_SYNC=1)
+SHAREPOINT_SYNC = os.getenv("SHAREPOINT_SYNC", "") == "1"
+
+
+def fetch_sharepoint(file_path, suffix):
+    """Fichier du miroir local s'il est synchronisé, sinon téléchargement direct."""
+    if SHAREPOINT_SYNC:
+        mirror = get_mirror()
+        mirror.start()
+        local_path = mirror.local_path(file_path)
+        if local_path:
+            return local_path
+    return download_file(file_path, suffix)
+
+
+# Dossier propre à la session : les fichiers générés ne s'écrasent pas entre utilisateurs
+if "session_dir" not in st.session_state:
+    st.session_state["session_dir"] = tempfile.mkdtemp(prefix="study_success_")
+temp_folder = st.session_state["session_dir"]
+
 # Charger les données avec fallback
-temp_folder = tempfile.mkdtemp()
-mandat_pdf_path = None
-pptx_file_path = None
 excel_file_path = None
 profs_file_path = None
 
+PROFS_COLUMNS = [
+    "Nom", "Prénom", "Mail", "Numéro", "Niveau", "Matière", "Actif",
+    "Précisions sur la situation", "adresse", "Présentiel ou Visio ?"
+]
+SUIVI_COLUMNS = [
+    'Id', 'Nom', 'Prénom', 'Adresse', 'Niveau', 'Matières enseignées', 'Visio ?',
+    "Dispo & Profil de l'élève", "Téléphone parents", "Mail", "Etat", "Professeur", "Gérant", "Tps attente"
+]
+
+@st.cache_resource(show_spinner=False)
+def get_asset_loader():
+    """Chargeur partagé : son pool de threads est créé une fois par process, pas à chaque rerun."""
+    return AssetLoader(fetch_sharepoint)
+
+
+# Classeurs téléchargés en parallèle et parsés dès réception ;
+# PDF du mandat et modèle PPTX récupérés seulement au premier usage
+loader = get_asset_loader()
+mandat_pdf = loader.lazy("Mandat (PDF)", "GESTION QUOTIDIENNE/DOCUMENTS UTILES/Mandats/Mandat Study Success_ Particulier Employeur.pdf", ".pdf")
+pptx_template = loader.lazy("Modèle profil (PPTX)", "GESTION QUOTIDIENNE/TEST DE MEMOIRE/testNouveau_Résultat-test.pptx", ".pptx")
+
 try:
-    mandat_pdf_path = download_file("GESTION QUOTIDIENNE/DOCUMENTS UTILES/Mandats/Mandat Study Success_ Particulier Employeur.pdf", ".pdf")
-    pptx_file_path = download_file("GESTION QUOTIDIENNE/TEST DE MEMOIRE/testNouveau_Résultat-test.pptx", ".pptx")
-    excel_file_path = download_file("GESTION QUOTIDIENNE/Parent_Eleve_Prof.xlsx", ".xlsx")
-    profs_file_path = download_file("GESTION QUOTIDIENNE/SCOPE PROFS/Contact_Profs.xlsx", ".xlsx")
+    suivi_future = loader.submit(
+        "Parent_Eleve_Prof.xlsx", "GESTION QUOTIDIENNE/Parent_Eleve_Prof.xlsx", ".xlsx",
+        parse=lambda path: load_sheet(path, 'Suivi', columns=SUIVI_COLUMNS)
+    )
+    profs_future = loader.submit(
+        "Contact_Profs.xlsx", "GESTION QUOTIDIENNE/SCOPE PROFS/Contact_Profs.xlsx", ".xlsx",
+        parse=lambda path: load_sheet(path, 'Liste profs', columns=PROFS_COLUMNS)
+    )
     
-    if profs_file_path:
-        df_profs = pd.read_excel(profs_file_path, sheet_name='Liste profs', usecols=[
-            "Nom", "Prénom", "Mail", "Numéro", "Niveau", "Matière", "Actif",
-            "Précisions sur la situation", "adresse", "Présentiel ou Visio ?"
-        ])
-    else:
-        raise ValueError("Impossible de charger le fichier des professeurs")
-        
+    profs_file_path, df_profs = profs_future.result()
     df_profs['Nom'] = df_profs['Nom'].fillna('').astype(str)
     df_profs['Prénom'] = df_profs['Prénom'].fillna('').astype(str)
     
-    if excel_file_path:
-        sheets = pd.read_excel(excel_file_path, sheet_name=None)
-        df_suivi = sheets['Suivi'][[
-            'Id', 'Nom', 'Prénom', 'Adresse', 'Niveau', 'Matières enseignées', 'Visio ?',
-            "Dispo & Profil de l'élève", "Téléphone parents", "Mail", "Etat", "Professeur", "Gérant", "Tps attente"
-        ]].copy()
-    else:
-        raise ValueError("Impossible de charger le fichier de suivi")
-        
+    excel_file_path, df_suivi = suivi_future.result()
     df_suivi['Etat'] = df_suivi['Etat'].fillna('')
     df_suivi = df_suivi[df_suivi['Etat'].astype(str).str.strip().str.match(r'^[0-2]')]
     df_suivi['Nom'] = df_suivi['Nom'].str.upper()
@@ -105,15 +153,117 @@ except Exception as e:
         "Tps attente": ["", ""]
     })
 
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_search_index(version, columns, _df):
+    """Index de recherche construit une fois par version des données (cf. frame_fingerprint)."""
+    return SearchIndex(_df, columns)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_prof_search_index(version, _df_profs):
+    """Index sur « Prénom Nom » des profs, une fois par version du roster."""
+    return SearchIndex(_df_profs.assign(**{"Nom complet": _df_profs["Prénom"] + " " + _df_profs["Nom"]}), ("Nom complet",))
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_prof_options(version, _df_profs):
+    """Options des filtres profs, calculées une fois par version du roster."""
+    return {col: _df_profs[col].unique().tolist() for col in ("Niveau", "Matière")}
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_roster_geocode_index(version, _df_profs):
+    """
+    Index de géocodage des adresses profs, rafraîchi une fois par version du
+    roster (préfiltre à vol d'oiseau du matching) ; None sans clé Google Maps.
+    """
+    api_key = os.getenv("GOOGLE_API_KEY", "")
+    if not api_key or googlemaps is None or "adresse" not in _df_profs.columns:
+        return None
+    return build_geocode_index(_df_profs, googlemaps.Client(key=api_key), address_col="adresse")
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_teacher_index(version, _df_profs):
+    """Index d'éligibilité des profs (matching), une fois par version du roster."""
+    return TeacherIndex(_df_profs)
+
+
+# ---- Matching mémorisé par session ----
+MATCHING_CACHE_SIZE = 20
+MATCHING_MODES = {"matrix": "Distance Matrix (par lots)", "directions": "Directions (un appel par prof)"}
+# profs les plus proches à vol d'oiseau envoyés au calcul de trajet (0 = tous)
+MATCHING_MAX_CANDIDATES = int(os.getenv("MATCHING_MAX_CANDIDATES", "0"))
+
+
+def get_matching_cache(roster_version):
+    """Résultats de matching de la session ; vidés quand le roster profs change."""
+    if st.session_state.get("matching_roster") != roster_version:
+        st.session_state["matching_cache"] = OrderedDict()
+        st.session_state["matching_roster"] = roster_version
+    return st.session_state["matching_cache"]
+
+
+def cached_matching(eleve, roster_version, api_mode, max_candidates=0, compute=False, refresh=False):
+    """
+    Profs compatibles pour l'élève, clé (empreinte élève, version roster, mode
+    API, nombre max de candidats).
+    Sans `compute`, retourne seulement le résultat déjà en cache (ou None) ;
+    `refresh` force un nouveau calcul.
+    """
+    cache = get_matching_cache(roster_version)
+    key = (row_fingerprint(eleve), roster_version, api_mode, max_candidates)
+    if refresh:
+        cache.pop(key, None)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    if not compute:
+        return None
+    geocode_index = get_roster_geocode_index(roster_version, df_profs) if max_candidates else None
+    result = run_matching(eleve, {}, df_profs, api_mode=api_mode, max_candidates=max_candidates or None,
+                          geocode_index=geocode_index, teacher_index=get_teacher_index(roster_version, df_profs))
+    cache[key] = result
+    while len(cache) > MATCHING_CACHE_SIZE:
+        cache.popitem(last=False)
+    return result
+
+
+def send_group(messages, label):
+    """Envoi groupé par $batch (send_mail_batch) avec barre de progression, puis bilan par destinataire."""
+    if mode_test:
+        messages = [{**msg, "to_email": TEST_EMAIL, "cc": None} for msg in messages]
+    progress = st.progress(0.0, text=f"Envoi des {label}...")
+    results = send_mail_batch(messages, progress_callback=lambda done, total: progress.progress(
+        done / max(total, 1), text=f"📤 {done}/{total} {label}"))
+    sent = sum(r["success"] for r in results)
+    st.success(f"✅ {sent}/{len(results)} {label} envoyé(s)")
+    for msg, result in zip(messages, results):
+        if result.get("uncertain"):
+            st.warning(f"{msg['to_email']} : {result['message']}")
+        elif not result["success"]:
+            st.error(f"{msg['to_email']} : {result['message']}")
+
+
+roster_version = frame_fingerprint(df_profs)
+if MATCHING_MAX_CANDIDATES:
+    with st.spinner("Géocodage des adresses profs (une fois par roster)..."):
+        get_roster_geocode_index(roster_version, df_profs)
+
+if loader.timings:
+    with st.expander("⏱️ Chargement des fichiers"):
+        st.dataframe(pd.DataFrame.from_dict(loader.timings, orient="index"), use_container_width=True)
+
 st.header("1️⃣ Rechercher un élève")
 prenom_input = st.text_input("Prénom")
 nom_input = st.text_input("Nom (en MAJUSCULES)")
 
-resultats = df_suivi.copy()
-if prenom_input:
-    resultats = resultats[resultats['Prénom'].str.lower().str.contains(prenom_input.lower())]
-if nom_input:
-    resultats = resultats[resultats['Nom'].str.upper().str.contains(nom_input.upper())]
+# Recherche sans accents ni casse ; résultats approchés si faute de frappe
+eleves_index = get_search_index(frame_fingerprint(df_suivi, ["Prénom", "Nom"]), ("Prénom", "Nom"), df_suivi)
+positions, approche = eleves_index.search({"Prénom": prenom_input, "Nom": nom_input})
+resultats = df_suivi.iloc[positions]
+if approche and not resultats.empty:
+    st.caption("🔎 Aucun résultat exact : élèves aux noms les plus proches")
 
 if not resultats.empty:
     st.dataframe(resultats, use_container_width=True)
@@ -121,14 +271,41 @@ if not resultats.empty:
     
     eleve_info = resultats.iloc[selected_row]
     st.subheader(f"✅ Élève sélectionné: {eleve_info['Prénom']} {eleve_info['Nom']}")
+
+    # Matching : recalculé seulement si l'élève, le roster ou le mode changent
+    with st.expander("🚗 Profs compatibles (temps de trajet)"):
+        api_mode = st.radio("Calcul des trajets :", list(MATCHING_MODES), format_func=MATCHING_MODES.get,
+                            horizontal=True, key="matching_api_mode")
+        max_candidates = st.number_input("Profs les plus proches à interroger (0 = tous)", min_value=0, step=10,
+                                         value=MATCHING_MAX_CANDIDATES, key="matching_max_candidates")
+        matching = cached_matching(eleve_info, roster_version, api_mode, max_candidates)
+        if matching is None and st.button("🔍 Lancer le matching"):
+            with st.spinner("Calcul des temps de trajet..."):
+                matching = cached_matching(eleve_info, roster_version, api_mode, max_candidates, compute=True)
+        if matching is not None:
+            if st.button("🔄 Recalculer"):
+                with st.spinner("Calcul des temps de trajet..."):
+                    matching = cached_matching(eleve_info, roster_version, api_mode, max_candidates,
+                                               compute=True, refresh=True)
+            if matching.empty:
+                st.info("Aucun prof compatible")
+            else:
+                st.dataframe(matching, use_container_width=True)
 else:
     st.info("Aucun résultat trouvé")
 
 st.header("2️⃣ Rechercher un professeur")
-profs_niveau = st.multiselect("Niveau(x):", df_profs['Niveau'].unique())
-profs_matiere = st.multiselect("Matière(s):", df_profs['Matière'].unique())
+prof_options = get_prof_options(roster_version, df_profs)
+prof_nom_input = st.text_input("Nom ou prénom du professeur")
+profs_niveau = st.multiselect("Niveau(x):", prof_options["Niveau"])
+profs_matiere = st.multiselect("Matière(s):", prof_options["Matière"])
 
-profs_filtrés = df_profs.copy()
+profs_filtrés = df_profs
+if prof_nom_input:
+    positions, approche = get_prof_search_index(roster_version, df_profs).search({"Nom complet": prof_nom_input})
+    profs_filtrés = profs_filtrés.iloc[positions]
+    if approche and not profs_filtrés.empty:
+        st.caption("🔎 Aucun résultat exact : professeurs aux noms les plus proches")
 if profs_niveau:
     profs_filtrés = profs_filtrés[profs_filtrés['Niveau'].isin(profs_niveau)]
 if profs_matiere:
@@ -145,14 +322,181 @@ else:
 
 st.header("3️⃣ Prévisualiser et envoyer un email")
 if 'eleve_info' in locals() and 'prof_info' in locals():
-    email_html = generate_email_html(eleve_info, prof_info)
-    st.markdown(email_html, unsafe_allow_html=True)
+    email = generate_email_html(eleve_info, df_profs, prof_info, selected_sender)
+    if email:
+        # Aperçu sans l'image cid: (non résolue par le navigateur) : la signature est affichée à part
+        st.markdown(email["preview_html"], unsafe_allow_html=True)
+        for image in email["inline_images"]:
+            st.image(image["content"], width=350)
     
-    if st.button("📧 Envoyer l'email"):
-        try:
-            send_mail(prof_info['Mail'], eleve_info['Mail'], email_html, selected_sender, mode_test)
-            st.success("✅ Email envoyé avec succès!")
-        except Exception as e:
-            st.error(f"❌ Erreur lors de l'envoi: {e}")
+    if email and st.button("📧 Envoyer l'email"):
+        message = {
+            "to_email": TEST_EMAIL if mode_test else email["to_email"],
+            "subject": email["subject"],
+            "html_body": email["html_body"],
+            "from_email": selected_sender,
+            "cc": None if mode_test else email["cc_email"],
+            "inline_images": email["inline_images"],
+        }
+        # Envoi non bloquant : le mail part dans la file d'envoi durable
+        result = send_mail(**message, deferred=True)
+        if result["success"]:
+            st.session_state.setdefault("outbox_ids", []).append(result["outbox_id"])
+            st.success(result["message"])
+        else:
+            st.error(result["message"])
 else:
     st.info("Sélectionnez d'abord un élève et un professeur")
+
+st.header("4️⃣ Export groupé des mandats")
+eleves_export = st.multiselect(
+    "Élèves :", range(len(df_suivi)),
+    format_func=lambda x: f"{df_suivi.iloc[x]['Prénom']} {df_suivi.iloc[x]['Nom']}",
+    key="export_eleves"
+)
+if eleves_export and st.button("📦 Générer les mandats (.zip)"):
+    progress = st.progress(0.0, text="Génération des mandats...")
+    zip_path = os.path.join(temp_folder, f"mandats_{pd.Timestamp.now():%Y%m%d_%H%M%S}.zip")
+    try:
+        # PDF du mandat lu une seule fois pour tous les élèves
+        export = export_mandats_zip(
+            df_suivi.iloc[eleves_export], mandat_pdf.read_bytes(), zip_path,
+            progress_callback=lambda done, total: progress.progress(done / total, text=f"{done}/{total} mandat(s)")
+        )
+        st.session_state["mandats_export"] = export
+    except Exception as e:
+        st.error(f"❌ Export impossible: {e}")
+
+if eleves_export and st.button("📧 Envoyer les mandats par mail"):
+    messages = []
+    try:
+        mandat_bytes = mandat_pdf.read_bytes()
+        if not mandat_bytes:
+            raise FileNotFoundError("PDF du mandat non chargé")
+        for _, row in df_suivi.iloc[eleves_export].iterrows():
+            try:
+                messages.append(mandat_message(row, mandat_bytes, selected_sender))
+            except ValueError as e:
+                st.warning(f"⚠️ {row['Prénom']} {row['Nom']} : {e}")
+    except Exception as e:
+        st.error(f"❌ Mandat indisponible: {e}")
+    if messages:
+        send_group(messages, "mandat(s)")
+
+export = st.session_state.get("mandats_export")
+if export and os.path.exists(export["path"]):
+    st.success(f"✅ {export['count']} mandat(s) générés en {export['duration_s']}s")
+    for eleve, erreur in export["errors"]:
+        st.warning(f"⚠️ {eleve} : {erreur}")
+    with open(export["path"], "rb") as f:
+        st.download_button("⬇️ Télécharger l'archive", f, file_name=os.path.basename(export["path"]),
+                           mime="application/zip")
+
+# ============ RÉPARTITION DU JOUR ============
+st.header("5️⃣ Répartition du jour")
+st.caption("Élèves « 0. Nouveau » / « 1. En recherche » répartis entre les profs en une passe : "
+           "temps de trajet, matières couvertes et nombre d'élèves par prof.")
+if CAPACITY_COLUMN in df_profs.columns:
+    capacite = None
+    st.caption(f"Capacité des profs : colonne « {CAPACITY_COLUMN} » du roster")
+else:
+    capacite = st.number_input("Élèves max par prof", min_value=1, max_value=10, value=DEFAULT_CAPACITY)
+
+# mémorisée par session tant que roster, élèves et capacité ne changent pas
+repartition_key = (roster_version, frame_fingerprint(df_suivi), capacite)
+if st.button("🧮 Proposer une répartition"):
+    with st.spinner("Calcul des trajets et de la répartition..."):
+        st.session_state["repartition"] = (
+            repartition_key, suggest_assignment(df_suivi, df_profs, capacity=capacite, api_mode="matrix",
+                                                teacher_index=get_teacher_index(roster_version, df_profs))
+        )
+
+repartition = st.session_state.get("repartition")
+if repartition and repartition[0] == repartition_key:
+    df_repartition = repartition[1]
+    if df_repartition.empty:
+        st.info("Aucun élève en attente")
+    else:
+        infos = df_repartition.attrs
+        st.success(f"✅ {infos['places']}/{len(df_repartition)} élève(s) placés "
+                   f"(solveur {infos['solveur']}, {infos['couples']} couples, {infos['duree_s']}s)")
+        if infos["ids_invalides"]:
+            st.warning(f"⚠️ {len(infos['ids_invalides'])} Id élève(s) vide(s) ou en double dans le suivi : "
+                       "ces élèves ne sont pas répartis")
+        st.dataframe(df_repartition, use_container_width=True)
+        st.download_button("⬇️ Télécharger la répartition (CSV)",
+                           df_repartition.to_csv(index=False).encode("utf-8-sig"),
+                           file_name=f"repartition_{pd.Timestamp.now():%Y%m%d}.csv", mime="text/csv")
+        proposes = df_repartition[df_repartition["Mail prof"] != ""]
+        if not proposes.empty and st.button(f"📧 Envoyer les coordonnées aux {len(proposes)} prof(s) proposés"):
+            profs_by_mail = df_profs.drop_duplicates("Mail").set_index("Mail", drop=False)
+            messages = []
+            for idx, ligne in proposes.iterrows():
+                prof = profs_by_mail.loc[ligne["Mail prof"]]
+                email = generate_email_html(df_suivi.loc[idx], df_profs, prof, selected_sender)
+                if email:
+                    messages.append({
+                        "to_email": email["to_email"], "subject": email["subject"],
+                        "html_body": email["html_body"], "from_email": selected_sender,
+                        "cc": email["cc_email"], "inline_images": email["inline_images"],
+                    })
+            send_group(messages, "mail(s) prof")
+
+# Suivi des envois de la session (file d'envoi durable)
+statuses = get_statuses(st.session_state.get("outbox_ids", []))
+if statuses:
+    with st.expander("📬 Suivi des envois", expanded=True):
+        sent = sum(s["status"] == "sent" for s in statuses)
+        st.progress(sent / len(statuses), text=f"📤 {sent}/{len(statuses)} envoyé(s)")
+        labels = {"queued": "⏳ En file", "sending": "📤 En cours", "sent": "✅ Envoyé", "failed": "❌ Échec",
+                  "uncertain": "⚠️ Incertain"}
+        st.dataframe(pd.DataFrame([{
+            "Destinataire": s["to_email"],
+            "Sujet": s["subject"],
+            "Statut": labels.get(s["status"], s["status"]),
+            "Essais": s["attempts"],
+            "Erreur": s["last_error"] or "",
+        } for s in statuses]), use_container_width=True)
+        uncertain = [s["id"] for s in statuses if s["status"] == "uncertain"]
+        if uncertain:
+            st.warning(f"⚠️ {len(uncertain)} envoi(s) interrompu(s) : le mail a pu partir. "
+                       "Vérifiez les éléments envoyés avant de renvoyer.")
+            if st.button("🔁 Renvoyer les envois incertains"):
+                for message_id in uncertain:
+                    requeue(message_id)
+                get_worker().notify()
+                st.rerun()
+        st.button("🔄 Actualiser")
+
+# Diagnostics : temps et nombre d'appels des chemins coûteux (agrégés sur le process, cf. tracing)
+with st.expander("🩺 Diagnostics"):
+    span_stats = tracing.stats()
+    if span_stats:
+        st.dataframe(pd.DataFrame.from_dict(span_stats, orient="index")[
+            ["count", "errors", "avg_ms", "max_ms", "total_ms"]
+        ], use_container_width=True)
+    else:
+        st.caption("Aucune mesure pour l'instant.")
+
+    diag_col1, diag_col2 = st.columns(2)
+    with diag_col1:
+        st.markdown("**Compteurs** (appels API, caches)")
+        st.dataframe(pd.Series(tracing.counters(), name="total", dtype="int64"), use_container_width=True)
+    with diag_col2:
+        st.markdown("**Cache des trajets**")
+        travel_cache = get_travel_cache()
+        st.dataframe(pd.Series(travel_cache.stats() if travel_cache else {}, name="valeur", dtype="object"),
+                     use_container_width=True)
+
+    recent_spans = tracing.recent(50)
+    if recent_spans:
+        st.markdown("**Dernières mesures**")
+        df_spans = pd.DataFrame(recent_spans)
+        df_spans["start"] = pd.to_datetime(df_spans["start"], unit="s").dt.strftime("%H:%M:%S")
+        # attributs de types variés selon le span : affichés en texte
+        st.dataframe(df_spans.fillna("").astype(str), use_container_width=True)
+    if tracing.TRACE_EXPORT_PATH:
+        st.caption(f"Export JSONL : {tracing.TRACE_EXPORT_PATH}")
+    if st.button("🧹 Remettre les compteurs à zéro"):
+        tracing.reset()
+        st.rerun()
@@ -1,119 +1,258 @@
 import os
-import requests
-import msal
+import time
+import hashlib
+import threading
 import tempfile
 import json
 from pathlib import Path
 
-# Identifiants Azure AD - Load from environment variables
-CLIENT_ID = os.getenv("CLIENT_ID", "")
-TENANT_ID = os.getenv("TENANT_ID", "")
+import requests
 
-# Essayer plusieurs approches d'authentification
-CERT_THUMBPRINT = os.getenv("CERT_THUMBPRINT", "")
-PRIVATE_KEY = os.getenv("PRIVATE_KEY", "")
-CLIENT_SECRET = os.getenv("CLIENT_SECRET", "")
+import graph_client
+from tracing import span, count
 
 # Infos SharePoint - Load from environment variables
 SITE_ID = os.getenv("SITE_ID", "studysuccess.sharepoint.com,9e9e1ce0-5693-4484-abdb-6c7c1f350351,3daa2958-c7e0-40f1-a80c-0b19460aa66d")
 DRIVE_ID = os.getenv("DRIVE_ID", "b!4ByenpNWhESr22x8HzUDUVgpqj3gx_FAqAwLGUYKpm1hWqPgcevxSoDhcRMK8Na3")
 
 # Scope pour Graph
-SCOPES = ["https://graph.microsoft.com/.default"]
-
-# Authentification MSAL - Avec certificat ou secret
-def create_msal_app():
-    """Crée une app MSAL avec certificat ou secret"""
-    
-    # Tenter avec certificat d'abord
-    if PRIVATE_KEY and CERT_THUMBPRINT:
-        try:
-            # Créer un fichier temporaire pour le certificat
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.pem', delete=False) as f:
-                f.write(PRIVATE_KEY)
-                cert_path = f.name
-            
-            print(f"[DEBUG] Utilisation du certificat: {cert_path}")
-            
-            app = msal.ConfidentialClientApplication(
-                client_id=CLIENT_ID,
-                authority=f"https://login.microsoftonline.com/{TENANT_ID}",
-                client_credential={
-                    "thumbprint": CERT_THUMBPRINT,
-                    "private_key": PRIVATE_KEY
-                }
-            )
-            print("[DEBUG] App créée avec certificat")
-            return app
-        except Exception as e:
-            print(f"[DEBUG] Erreur avec certificat: {e}")
-    
-    # Fallback sur secret si disponible
-    if CLIENT_SECRET:
-        try:
-            print("[DEBUG] Utilisation du CLIENT_SECRET")
-            app = msal.ConfidentialClientApplication(
-                client_id=CLIENT_ID,
-                client_credential=CLIENT_SECRET,
-                authority=f"https://login.microsoftonline.com/{TENANT_ID}"
-            )
-            print("[DEBUG] App créée avec secret")
-            return app
-        except Exception as e:
-            print(f"[DEBUG] Erreur avec secret: {e}")
-    
-    # Si rien ne fonctionne, retourner None
-    print("[DEBUG] Impossible de créer une app MSAL")
-    return None
-
-app = create_msal_app()
+SCOPES = graph_client.SCOPES
+
+# Cache local des fichiers SharePoint (partagé entre sessions / reruns Streamlit)
+CACHE_DIR = Path(os.getenv("SHAREPOINT_CACHE_DIR") or Path(tempfile.gettempdir()) / "study_success_sharepoint")
+# Pendant cette fenêtre (secondes), un fichier en cache est servi sans aucune requête
+CACHE_FRESHNESS_SECONDS = int(os.getenv("SHAREPOINT_CACHE_FRESHNESS", "300"))
+# Magasin adressé par contenu (SHA-256) et téléchargements en cours
+OBJECTS_DIR = CACHE_DIR / "objects"
+PARTS_DIR = CACHE_DIR / "tmp"
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_MAX_RESUMES = 5
+_cache_lock = threading.Lock()
+_gc_done = False
+
 
 def get_access_token():
-    """Obtient un token d'accès Microsoft Graph"""
+    """Obtient un token d'accès Microsoft Graph (cache partagé, cf. graph_client)"""
+    token = graph_client.get_token()
+    if not token:
+        print("❌ Impossible d'obtenir le token d'accès")
+    return token
+
+
+def _cache_index_path() -> Path:
+    return CACHE_DIR / "index.json"
+
+
+def _load_cache_index() -> dict:
     try:
-        if not app:
-            print("❌ App MSAL non initialisée")
-            return None
-            
-        result = app.acquire_token_for_client(scopes=SCOPES)
-        if "access_token" in result:
-            print("✅ Token obtenu avec succès")
-            return result["access_token"]
-        else:
-            print(f"❌ Erreur d'authentification: {result.get('error_description', 'Unknown error')}")
-            print(f"[DEBUG] Full response: {result}")
-            return None
-    except Exception as e:
-        print(f"❌ Erreur lors de l'acquisition du token: {e}")
+        with open(_cache_index_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _update_cache_entry(file_path: str, **fields):
+    """Met à jour l'entrée `file_path` de l'index (écriture atomique)."""
+    with _cache_lock:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        index = _load_cache_index()
+        entry = index.get(file_path, {})
+        entry.update(fields)
+        index[file_path] = entry
+        tmp_path = _cache_index_path().with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, _cache_index_path())
+
+
+def _cached_file(entry: dict):
+    local_path = entry.get("local_path") if entry else None
+    return local_path if local_path and os.path.exists(local_path) else None
+
+
+def _content_length(response, already: int):
+    """Taille totale annoncée par la réponse (Content-Range pour un 206), ou None."""
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range and not content_range.endswith("/*"):
+        return int(content_range.rsplit("/", 1)[1])
+    length = response.headers.get("Content-Length")
+    return int(length) + already if length else None
+
+
+def _download_content(file_path: str, suffix: str, expected_size: int | None = None):
+    """
+    Télécharge le contenu en flux, par morceaux, dans le magasin local.
+    Après une coupure, reprend là où il s'était arrêté (en-tête Range).
+    Le fichier est nommé par son SHA-256 et déplacé atomiquement en place.
+    Retourne le chemin ou None.
+    """
+    url = f"sites/{SITE_ID}/drive/root:/{file_path}:/content"
+    print(f"📥 Téléchargement: {file_path}")
+    OBJECTS_DIR.mkdir(parents=True, exist_ok=True)
+    PARTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(delete=False, dir=PARTS_DIR, suffix=".part") as part:
+        digest = hashlib.sha256()
+        written = 0
+        total = expected_size
+        resumes = 0
+        finished = False  # fin de flux propre (sans coupure ni erreur HTTP)
+        while True:
+            headers = {"Range": f"bytes={written}-"} if written else {}
+            try:
+                response = graph_client.request("GET", url, headers=headers, stream=True)
+                with response:
+                    if response.status_code == 200 and written:
+                        # Range ignoré par le serveur : on repart de zéro
+                        part.seek(0)
+                        part.truncate()
+                        digest, written = hashlib.sha256(), 0
+                    elif response.status_code not in (200, 206):
+                        print(f"❌ Erreur lors du téléchargement: {response.status_code}")
+                        print(f"[DEBUG] Response: {response.text[:500]}")
+                        break
+                    total = total or _content_length(response, written)
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        part.write(chunk)
+                        digest.update(chunk)
+                        written += len(chunk)
+                if total is not None and written < total:
+                    raise requests.ConnectionError(f"flux interrompu à {written}/{total} octets")
+                finished = True
+                break
+            except requests.RequestException as e:
+                resumes += 1
+                if resumes > DOWNLOAD_MAX_RESUMES:
+                    print(f"❌ Téléchargement abandonné ({file_path}): {e}")
+                    break
+                print(f"[DEBUG] Reprise du téléchargement à l'octet {written}: {e}")
+                time.sleep(min(2 ** resumes, 30))
+
+    complete = finished and (written == total if total is not None else written > 0)
+    if not complete:
+        os.remove(part.name)
         return None
 
+    local_path = OBJECTS_DIR / (digest.hexdigest() + suffix)
+    if local_path.exists():
+        os.remove(part.name)  # contenu identique déjà en magasin
+    else:
+        os.replace(part.name, local_path)
+    print(f"✅ Fichier téléchargé: {local_path}")
+    return str(local_path)
+
+
+def collect_garbage(max_part_age: float = 3600):
+    """
+    Nettoie le magasin local : morceaux .part abandonnés (plus vieux que
+    `max_part_age`, pour ne pas gêner un téléchargement en cours ailleurs),
+    objets qui ne sont plus référencés par l'index, fichiers de l'ancien format.
+    Les instantanés Parquet de workbook_cache (`<objet>.<empreinte>.<feuille>.parquet`)
+    sont gardés tant que leur objet est référencé.
+    """
+    referenced = {entry.get("local_path") for entry in _load_cache_index().values()} - {None}
+
+    def is_referenced(path: Path) -> bool:
+        name = str(path)
+        return name in referenced or any(name.startswith(ref + ".") for ref in referenced)
+
+    now = time.time()
+    removed = 0
+    candidates = list(PARTS_DIR.glob("*.part")) + list(CACHE_DIR.glob("*.part"))
+    for path in candidates:
+        try:
+            if now - path.stat().st_mtime > max_part_age:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    legacy = [p for p in CACHE_DIR.glob("*") if p.is_file() and p.suffix not in (".json", ".tmp", ".part")]
+    for path in list(OBJECTS_DIR.glob("*")) + legacy:
+        if not is_referenced(path):
+            try:
+                if now - path.stat().st_mtime < 60:
+                    continue  # tout juste téléchargé, l'index n'est peut-être pas encore à jour
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+    if removed:
+        print(f"🧹 Cache SharePoint: {removed} fichier(s) obsolète(s) supprimé(s)")
+    return removed
+
+
 def download_sharepoint_file(file_path: str, suffix: str = ".xlsx") -> str:
-    """Télécharge un fichier depuis SharePoint"""
+    """
+    Télécharge un fichier depuis SharePoint, avec cache disque.
+
+    - dans la fenêtre de fraîcheur : fichier local servi sans requête ;
+    - ensuite : revalidation par une requête de métadonnées (If-None-Match sur
+      l'eTag, ou comparaison de lastModifiedDateTime), contenu retéléchargé
+      seulement s'il a changé.
+    """
+    with span("sharepoint.download", file=file_path) as s:
+        local_path, s["resultat"] = _download_sharepoint_file(file_path, suffix)
+        count(f"sharepoint.{s['resultat']}")
+        return local_path
+
+
+def _download_sharepoint_file(file_path: str, suffix: str):
+    """
+    (chemin local ou None, issue : cache / inchange / telecharge / echec).
+    En échec, la dernière version connue en cache est rendue si elle existe.
+    """
+    local_path = None
     try:
-        token = get_access_token()
-        if not token:
-            print("❌ Impossible d'obtenir le token d'accès")
-            return None
-        
-        headers = {"Authorization": f"Bearer {token}"}
-        url = f"https://graph.microsoft.com/v1.0/sites/{SITE_ID}/drive/root:/{file_path}:/content"
-        
-        print(f"📥 Téléchargement: {file_path}")
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            # Crée un fichier temporaire
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                tmp.write(response.content)
-                print(f"✅ Fichier téléchargé: {tmp.name}")
-                return tmp.name
+        entry = _load_cache_index().get(file_path, {})
+        local_path = _cached_file(entry)
+        if local_path and time.time() - entry.get("checked_at", 0) < CACHE_FRESHNESS_SECONDS:
+            print(f"♻️ Cache: {file_path}")
+            return local_path, "cache"
+
+        global _gc_done
+        if not _gc_done:
+            _gc_done = True
+            collect_garbage()
+
+        if not get_access_token():
+            return local_path, "echec"
+
+        # ---- Revalidation via les métadonnées du driveItem ----
+        meta_headers = {}
+        if local_path and entry.get("etag"):
+            meta_headers["If-None-Match"] = entry["etag"]
+        meta = graph_client.request("GET", f"sites/{SITE_ID}/drive/root:/{file_path}", headers=meta_headers,
+                                    params={"$select": "eTag,lastModifiedDateTime,size"})
+
+        if meta.status_code == 304 and local_path:
+            _update_cache_entry(file_path, checked_at=time.time())
+            print(f"♻️ Inchangé (eTag): {file_path}")
+            return local_path, "inchange"
+
+        etag, last_modified, size = None, None, None
+        if meta.status_code == 200:
+            info = meta.json()
+            etag, last_modified, size = info.get("eTag"), info.get("lastModifiedDateTime"), info.get("size")
+            unchanged = (etag and etag == entry.get("etag")) or (
+                last_modified and last_modified == entry.get("last_modified"))
+            if local_path and unchanged:
+                _update_cache_entry(file_path, checked_at=time.time())
+                print(f"♻️ Inchangé: {file_path}")
+                return local_path, "inchange"
         else:
-            print(f"❌ Erreur lors du téléchargement: {response.status_code}")
-            print(f"[DEBUG] Response: {response.text[:500]}")
-            return None
+            print(f"[DEBUG] Métadonnées indisponibles ({meta.status_code}) pour {file_path}")
+
+        downloaded = _download_content(file_path, suffix, size)
+        if not downloaded:
+            return local_path, "echec"  # à défaut, la dernière version connue
+        _update_cache_entry(file_path, local_path=downloaded, etag=etag,
+                            last_modified=last_modified, checked_at=time.time())
+        if local_path and local_path != downloaded:
+            collect_garbage()  # l'ancienne version n'est plus référencée
+        return downloaded, "telecharge"
     except Exception as e:
         print(f"❌ Erreur: {e}")
-        return None
+        return local_path, "echec"  # à défaut, la dernière version connue
 
 # Alias pour compatibilité
 def download_file(file_path: str, suffix: str = ".xlsx") -> str:
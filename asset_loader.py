@@ -0,0 +1,88 @@
+# asset_loader.py
+"""
+Chargement des fichiers SharePoint au démarrage de l'app.
+
+Les fichiers nécessaires au premier affichage sont téléchargés en parallèle,
+et chaque classeur est parsé dès que ses octets sont arrivés (dans le même
+thread que son téléchargement). Les autres (PDF du mandat, modèle PPTX) ne
+sont récupérés qu'au premier usage. Les temps de chaque fichier sont relevés.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from Graph_Api import download_file
+
+
+class LazyAsset:
+    """Fichier récupéré seulement au premier accès à `.path`."""
+
+    def __init__(self, loader, name: str, drive_path: str, suffix: str):
+        self._loader = loader
+        self.name = name
+        self.drive_path = drive_path
+        self.suffix = suffix
+        self._path = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        with self._lock:
+            if not self._loaded:
+                try:
+                    self._path, _ = self._loader._load(self.name, self.drive_path, self.suffix)
+                except FileNotFoundError as e:
+                    print(f"❌ {e}")
+                self._loaded = True
+            return self._path
+
+    def read_bytes(self):
+        """Contenu du fichier, ou None s'il n'a pas pu être récupéré."""
+        path = self.path
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+
+class AssetLoader:
+    """
+    `fetch(drive_path, suffix) -> chemin local` (défaut : Graph_Api.download_file).
+    `timings` : {nom: {"download_s", "parse_s", "status"}} pour l'affichage.
+    """
+
+    def __init__(self, fetch=download_file, max_workers: int = 4):
+        self.fetch = fetch
+        self.timings = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="assets")
+        self._timings_lock = threading.Lock()
+
+    def _record(self, name: str, **fields):
+        with self._timings_lock:
+            self.timings.setdefault(name, {}).update(fields)
+
+    def _load(self, name: str, drive_path: str, suffix: str, parse=None):
+        start = time.perf_counter()
+        path = self.fetch(drive_path, suffix)
+        self._record(name, download_s=round(time.perf_counter() - start, 3),
+                     status="ok" if path else "indisponible")
+        if not path:
+            raise FileNotFoundError(f"Impossible de charger {name}")
+        if parse is None:
+            return path, None
+        start = time.perf_counter()
+        parsed = parse(path)
+        self._record(name, parse_s=round(time.perf_counter() - start, 3))
+        return path, parsed
+
+    def submit(self, name: str, drive_path: str, suffix: str, parse=None):
+        """Lance téléchargement + parsing en arrière-plan ; Future de (chemin, résultat du parse)."""
+        return self._executor.submit(self._load, name, drive_path, suffix, parse)
+
+    def lazy(self, name: str, drive_path: str, suffix: str) -> LazyAsset:
+        return LazyAsset(self, name, drive_path, suffix)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,278 @@
+# assignment.py
+"""
+Répartition du jour : élèves en attente -> profs, en une seule passe globale.
+
+run_matching classe les profs pour un élève à la fois : attribués l'un après
+l'autre, les élèves se voient souvent proposer le même prof bien placé. Ici :
+
+- les couples candidats viennent de run_matching_bulk (`top_n` profs
+  éligibles par élève) : matrice de coûts creuse ;
+- coût d'un couple = temps de trajet + pénalités d'adéquation (matières de
+  l'élève non couvertes, prof « potentiellement OK ») ;
+- chaque prof a une capacité (nb d'élèves à prendre aujourd'hui) ;
+- affectation de coût total minimal : couplage biparti creux de SciPy
+  (profs dupliqués selon leur capacité), ou heuristique gloutonne (SciPy
+  absent, ou trop de couples).
+
+Un élève peut rester sans prof : mieux vaut pas de proposition qu'un couple
+au-delà de UNASSIGNED_COST.
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from matching_eml import run_matching_bulk
+from teacher_index import student_criteria
+from tracing import span
+
+# scipy est optionnel : sans lui, heuristique gloutonne
+try:
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+except Exception:
+    coo_matrix = None
+    min_weight_full_bipartite_matching = None
+
+# élèves à placer : 0. Nouveau, 1. En recherche. Plus étroit que la liste de
+# l'app (^[0-2]) : un élève « 2. Proposé » a déjà un prof en attente de réponse.
+ETATS_A_PLACER = r"^[01]"
+CAPACITY_COLUMN = "Capacité"
+DEFAULT_CAPACITY = int(os.getenv("ASSIGNMENT_DEFAULT_CAPACITY", "1"))
+# profs candidats par élève
+TOP_N = 30
+
+# Coûts, en minutes de trajet équivalentes
+MISSING_TRAVEL_COST = 60.0  # présentiel sans durée connue (API indisponible / hors délai)
+SUBJECT_MISS_COST = 30.0  # toutes les matières de l'élève non couvertes (au prorata)
+UNCERTAIN_TEACHER_COST = 15.0  # prof "4.Prof potentiellement OK"
+UNASSIGNED_COST = 240.0  # élève sans prof
+
+# au-delà (couples x capacité), le couplage exact cède la place au glouton
+EXACT_MAX_EDGES = 500_000
+SOLVERS = ("auto", "exact", "glouton")
+
+
+def _prof_keys(df: pd.DataFrame) -> pd.Series:
+    """Identifiant d'un prof : mail normalisé, sinon « Prénom Nom »."""
+    noms = pd.Series("", index=df.index)
+    for col in ("Prénom", "Nom"):
+        if col in df.columns:
+            noms = noms + " " + df[col].fillna("").astype(str)
+    if "Mail" not in df.columns:
+        return noms.str.strip().str.lower()
+    mails = df["Mail"].astype(str).str.strip().str.lower()
+    return mails.where(df["Mail"].notna() & (mails != ""), noms.str.strip().str.lower())
+
+
+def _capacities(df_profs: pd.DataFrame, capacity) -> dict:
+    """{clé prof: capacité} ; `capacity` : entier commun, dict {mail: capacité}, ou None (colonne / défaut)."""
+    keys = _prof_keys(df_profs)
+    if isinstance(capacity, dict):
+        wanted = {str(k).strip().lower(): int(v) for k, v in capacity.items()}
+        return {k: wanted.get(k, DEFAULT_CAPACITY) for k in keys}
+    if capacity is not None:
+        return {k: int(capacity) for k in keys}
+    if CAPACITY_COLUMN in df_profs.columns:
+        caps = pd.to_numeric(df_profs[CAPACITY_COLUMN], errors="coerce").fillna(DEFAULT_CAPACITY)
+        return dict(zip(keys, caps.astype(int)))
+    return {k: DEFAULT_CAPACITY for k in keys}
+
+
+def pair_costs(candidates: pd.DataFrame, criteria: dict) -> np.ndarray:
+    """
+    Coût de chaque ligne de `candidates` (format long de run_matching_bulk).
+    `criteria` : {Id élève: (niveau, matières, visio)} (cf. student_criteria).
+    """
+    duree = candidates["Durée Transport (min)"].to_numpy(dtype=float)
+    visio = np.fromiter((criteria[i][2] for i in candidates["Id élève"]), dtype=bool, count=len(candidates))
+    travel = np.where(visio, 0.0, np.where(np.isnan(duree), MISSING_TRAVEL_COST, duree))
+
+    matieres = candidates["Matière"].fillna("").astype(str).str.lower().tolist()
+    missing = np.fromiter(
+        (1 - sum(m in matiere for m in criteria[i][1]) / max(len(criteria[i][1]), 1)
+         for i, matiere in zip(candidates["Id élève"], matieres)),
+        dtype=float, count=len(candidates),
+    )
+    uncertain = (candidates["Actif"] == "4.Prof potentiellement OK").to_numpy(dtype=bool)
+    return travel + SUBJECT_MISS_COST * missing + UNCERTAIN_TEACHER_COST * uncertain
+
+
+def _solve_greedy(students, teachers, costs, capacity, n_students):
+    """Couples par coût croissant, pris tant que l'élève est libre et le prof a de la place."""
+    assigned = np.full(n_students, -1, dtype=np.int64)
+    remaining = capacity.copy()
+    for p in np.lexsort((students, costs)):
+        s, t = students[p], teachers[p]
+        if assigned[s] < 0 and remaining[t] > 0:
+            assigned[s] = t
+            remaining[t] -= 1
+    return assigned
+
+
+def _solve_exact(students, teachers, costs, capacity, n_students):
+    """
+    Couplage biparti de coût minimal (SciPy, matrice creuse) : une colonne par
+    place de prof (prof répété `capacité` fois) + une colonne « sans prof » par
+    élève, pour que chaque élève ait toujours une solution.
+    """
+    offsets = np.concatenate(([0], np.cumsum(capacity)))
+    n_slots = int(offsets[-1])
+    reps = capacity[teachers]
+    rows = np.repeat(students, reps)
+    cols = np.repeat(offsets[teachers], reps) + (np.arange(reps.sum()) - np.repeat(np.cumsum(reps) - reps, reps))
+    data = np.repeat(costs, reps)
+    # colonnes « sans prof » ; +1 partout : SciPy ignore les arêtes de poids nul
+    rows = np.concatenate((rows, np.arange(n_students)))
+    cols = np.concatenate((cols, n_slots + np.arange(n_students)))
+    data = np.concatenate((data, np.full(n_students, UNASSIGNED_COST))) + 1.0
+    graph = coo_matrix((data, (rows, cols)), shape=(n_students, n_slots + n_students)).tocsr()
+
+    row_ind, col_ind = min_weight_full_bipartite_matching(graph)
+    assigned = np.full(n_students, -1, dtype=np.int64)
+    placed = col_ind < n_slots
+    assigned[row_ind[placed]] = np.searchsorted(offsets, col_ind[placed], side="right") - 1
+    return assigned
+
+
+def solve(students, teachers, costs, capacity, n_students, solver: str = "auto"):
+    """
+    Affectation de coût minimal. `students` / `teachers` : index (0..n-1) des
+    couples candidats, `costs` : leur coût, `capacity` : places par prof.
+    Retourne (prof affecté par élève, -1 si aucun ; solveur utilisé).
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"Solveur inconnu : {solver} (disponibles : {', '.join(SOLVERS)})")
+    keep = (costs < UNASSIGNED_COST) & (capacity[teachers] > 0)
+    students, teachers, costs = students[keep], teachers[keep], costs[keep]
+
+    exact_ok = min_weight_full_bipartite_matching is not None
+    if solver == "exact" and not exact_ok:
+        print("[DEBUG] scipy non installé : répartition gloutonne")
+    if solver == "auto":
+        solver = "exact" if exact_ok and int(capacity[teachers].sum()) <= EXACT_MAX_EDGES else "glouton"
+    if solver == "exact" and exact_ok:
+        try:
+            return _solve_exact(students, teachers, costs, capacity, n_students), "exact"
+        except ValueError as e:
+            print(f"[DEBUG] Couplage exact impossible ({e}) : répartition gloutonne")
+    return _solve_greedy(students, teachers, costs, capacity, n_students), "glouton"
+
+
+def suggest_assignment(df_suivi: pd.DataFrame,
+                       df_profs: pd.DataFrame,
+                       candidates: pd.DataFrame | None = None,
+                       etats: str | None = ETATS_A_PLACER,
+                       capacity=None,
+                       solver: str = "auto",
+                       top_n: int = TOP_N,
+                       **matching_kwargs) -> pd.DataFrame:
+    """
+    Répartition suggérée des élèves en attente (`Etat` correspondant à
+    `etats` ; None = tous) entre les profs de `df_profs`.
+
+    `candidates` : résultat de run_matching_bulk déjà calculé ; sinon calculé
+    ici (`top_n` profs par élève, `matching_kwargs` transmis : gmaps_client,
+    travel_cache, deadline...).
+    `capacity` : places par prof (entier, ou dict {mail: places}) ; par défaut
+    colonne 'Capacité' du roster si présente, sinon DEFAULT_CAPACITY.
+    `solver` : "auto", "exact" (SciPy) ou "glouton".
+
+    Les élèves sont identifiés par leur `Id` : ceux dont l'Id est vide ou en
+    double ne sont pas répartis (statut « Id manquant ou en double »).
+
+    Retourne un DataFrame (une ligne par élève en attente, index de `df_suivi`) ;
+    `attrs` contient solveur, nb de couples évalués, coût total, durée de
+    résolution et Ids invalides.
+    """
+    pending = df_suivi
+    if etats and "Etat" in df_suivi.columns:
+        pending = df_suivi[df_suivi["Etat"].fillna("").astype(str).str.strip().str.match(etats)]
+    bad_ids = pending["Id"].isna() | pending["Id"].duplicated(keep=False)
+    rejected = pending[bad_ids]
+    if not rejected.empty:
+        print(f"❌ Répartition : {len(rejected)} élève(s) ignoré(s), Id manquant ou en double "
+              f"({', '.join(map(str, rejected['Id'].drop_duplicates().tolist()))})")
+    pending = pending[~bad_ids]
+    if candidates is None:
+        candidates = run_matching_bulk(pending, df_profs, top_n=top_n, **matching_kwargs)
+
+    eleves = pending.to_dict("records")
+    criteria = {row["Id"]: student_criteria(row) for row in eleves}
+    student_pos = {row["Id"]: i for i, row in enumerate(eleves)}
+
+    t0 = time.perf_counter()
+    chosen = np.full(len(eleves), -1, dtype=np.int64)  # ligne de `candidates` retenue par élève
+    costs = np.array([])
+    used = "aucun"
+    with span("assignment.solve", eleves=len(eleves), couples=len(candidates)) as s:
+        if not candidates.empty:
+            candidates = candidates[candidates["Id élève"].isin(student_pos)].reset_index(drop=True)
+        if not candidates.empty:
+            costs = pair_costs(candidates, criteria)
+            keys = _prof_keys(candidates).tolist()
+            teacher_pos = {}
+            teachers = np.fromiter((teacher_pos.setdefault(k, len(teacher_pos)) for k in keys),
+                                   dtype=np.int64, count=len(keys))
+            students = np.fromiter((student_pos[i] for i in candidates["Id élève"]),
+                                   dtype=np.int64, count=len(candidates))
+            caps = _capacities(df_profs, capacity)
+            capacity_arr = np.array([caps.get(k, DEFAULT_CAPACITY) for k in teacher_pos], dtype=np.int64)
+            # même prof en double dans le roster : on garde le couple le moins cher
+            order = np.lexsort((costs, teachers, students))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = (np.diff(students[order]) != 0) | (np.diff(teachers[order]) != 0)
+            best = order[first]
+            assigned, used = solve(students[best], teachers[best], costs[best], capacity_arr, len(eleves), solver)
+            pair_pos = dict(zip(zip(students[best].tolist(), teachers[best].tolist()), best.tolist()))
+            for i, t in enumerate(assigned.tolist()):
+                if t >= 0:
+                    chosen[i] = pair_pos[(i, t)]
+        s["solveur"] = used
+
+    # ---- Une ligne par élève ----
+    placed = chosen >= 0
+    result = pd.DataFrame(index=pending.index, data={
+        "Id élève": [row["Id"] for row in eleves],
+        "Nom élève": [row.get("Nom", "") for row in eleves],
+        "Prénom élève": [row.get("Prénom", "") for row in eleves],
+        "Niveau élève": [row.get("Niveau", "") for row in eleves],
+        "Matières": [row.get("Matières enseignées", "") for row in eleves],
+        "Visio": ["Oui" if criteria[row["Id"]][2] else "Non" for row in eleves],
+        "Statut": np.where(placed, "✅ Proposé", "⚠️ Aucun prof disponible"),
+    })
+    result["Prof"] = ""
+    result["Mail prof"] = ""
+    result["Durée Transport (min)"] = np.nan
+    result["Rang"] = np.nan
+    if placed.any():
+        profs = candidates.iloc[chosen[placed]]
+        result.loc[placed, "Prof"] = (profs["Prénom"].astype(str) + " " + profs["Nom"].astype(str)).str.strip().to_numpy()
+        result.loc[placed, "Mail prof"] = profs["Mail"].to_numpy()
+        result.loc[placed, "Durée Transport (min)"] = profs["Durée Transport (min)"].to_numpy()
+        result.loc[placed, "Rang"] = profs["Rang"].to_numpy()
+    result["Coût"] = np.nan
+    result.loc[placed, "Coût"] = costs[chosen[placed]].round(1)
+    if not rejected.empty:
+        invalid = pd.DataFrame(index=rejected.index, data={
+            "Id élève": rejected["Id"],
+            "Nom élève": rejected.get("Nom", ""),
+            "Prénom élève": rejected.get("Prénom", ""),
+            "Niveau élève": rejected.get("Niveau", ""),
+            "Matières": rejected.get("Matières enseignées", ""),
+            "Statut": "❌ Id manquant ou en double",
+        })
+        order = df_suivi.index[df_suivi.index.isin(pending.index.append(rejected.index))]
+        result = pd.concat([result, invalid]).reindex(index=order, columns=result.columns)
+        result[["Prof", "Mail prof"]] = result[["Prof", "Mail prof"]].fillna("")
+
+    duration = time.perf_counter() - t0
+    total = float(result["Coût"].sum())
+    result.attrs.update({"solveur": used, "couples": len(candidates), "places": int(placed.sum()),
+                         "cout_total": round(total, 1), "duree_s": round(duration, 3),
+                         "ids_invalides": rejected["Id"].drop_duplicates().tolist()})
+    print(f"✅ Répartition ({used}) : {int(placed.sum())}/{len(eleves)} élève(s) placés, "
+          f"{len(candidates)} couple(s) évalués en {duration:.2f}s")
+    return result
@@ -0,0 +1,55 @@
+# benchmarks/bench_assignment.py
+"""
+Répartition du jour sur un roster synthétique : prof le plus proche pour
+chaque élève (choix un par un, historique) vs affectation globale avec
+capacité (glouton, puis couplage exact si scipy est installé).
+
+    python benchmarks/bench_assignment.py [nb_eleves] [nb_profs]
+"""
+
+import io
+import os
+import sys
+import time
+import tempfile
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import assignment  # noqa: E402
+from matching_eml import run_matching_bulk  # noqa: E402
+from travel_cache import TravelTimeCache  # noqa: E402
+from synthetic import make_profs, make_suivi  # noqa: E402
+from fakes import FakeMapsClient  # noqa: E402
+
+
+def main(n_eleves: int = 2_000, n_profs: int = 2_000):
+    suivi = make_suivi(n_eleves)
+    profs = make_profs(n_profs)
+    pending = suivi[suivi["Etat"].str.match(assignment.ETATS_A_PLACER)]
+    cache = TravelTimeCache(os.path.join(tempfile.mkdtemp(), "travel.sqlite"))
+
+    t0 = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        candidates = run_matching_bulk(pending, profs, top_n=assignment.TOP_N, gmaps_client=FakeMapsClient(),
+                                       travel_cache=cache, deadline=None)
+    t_candidates = time.perf_counter() - t0
+
+    # historique : chacun son prof n°1, sans tenir compte des autres élèves
+    top1 = candidates[candidates["Rang"] == 1]
+    shared = top1["Mail"].duplicated(keep=False).sum()
+
+    print(f"{len(pending)} élève(s) en attente, {n_profs} profs, {len(candidates)} couples candidats "
+          f"({t_candidates:.2f}s, trajets simulés)")
+    print(f"  prof n°1 par élève     : {shared} élève(s) se voient proposer un prof déjà proposé à un autre")
+    solvers = ["glouton"] + (["exact"] if assignment.min_weight_full_bipartite_matching is not None else [])
+    for solver in solvers:
+        with redirect_stdout(io.StringIO()):
+            result = assignment.suggest_assignment(suivi, profs, candidates=candidates, solver=solver, capacity=1)
+        infos = result.attrs
+        print(f"  {solver:8s} (capacité 1) : {infos['places']:5d} placés, coût {infos['cout_total']:10.0f}, "
+              f"{infos['duree_s'] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
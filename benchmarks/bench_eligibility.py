@@ -0,0 +1,65 @@
+# benchmarks/bench_eligibility.py
+"""
+Filtres d'éligibilité de run_matching : chaîne `.str.contains` historique vs
+TeacherIndex, sur un roster synthétique (10 000 profs par défaut).
+
+    python benchmarks/bench_eligibility.py [nb_profs]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from teacher_index import TeacherIndex, NIVEAUX  # noqa: E402
+from synthetic import make_profs  # noqa: E402
+
+
+def legacy_filter(df_profs, niveau_eleve, mats, visio):
+    """Chaîne de filtres de run_matching avant TeacherIndex."""
+    df = df_profs.copy()
+    if visio:
+        df = df[df["Présentiel ou Visio ?"].str.lower().str.contains("visio", na=False)]
+    else:
+        df = df[df["Présentiel ou Visio ?"].str.lower() != "visio"]
+    df = df[df["Actif"].isin(["2.Prof OK", "4.Prof potentiellement OK"])]
+    df = df[df["Niveau"].str.contains(niveau_eleve, case=False, na=False)]
+    df = df[df["Matière"].str.lower().str.contains("|".join(mats), na=False)]
+    return df
+
+
+def main(n: int = 10_000):
+    df_profs = make_profs(n)
+    signatures = [
+        (niveau, mats, visio)
+        for niveau in NIVEAUX
+        for mats in [("maths",), ("physique",), ("svt",), ("informatique",), ("maths", "physique")]
+        for visio in (False, True)
+    ]
+
+    t0 = time.perf_counter()
+    legacy = [legacy_filter(df_profs, *sig) for sig in signatures]
+    t_legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    index = TeacherIndex(df_profs)
+    t_build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    indexed = [index.select(*sig) for sig in signatures]
+    t_query = time.perf_counter() - t0
+
+    for sig, a, b in zip(signatures, legacy, indexed):
+        assert a.index.equals(b.index), f"Résultats différents pour {sig}"
+
+    q = len(signatures)
+    print(f"Roster synthétique : {n} profs, {q} signatures élève (résultats identiques)")
+    print(f"  filtres historiques : {t_legacy / q * 1000:8.2f} ms / requête")
+    print(f"  TeacherIndex build  : {t_build * 1000:8.2f} ms (une fois par roster)")
+    print(f"  TeacherIndex select : {t_query / q * 1000:8.2f} ms / requête")
+    print(f"  accélération        : x{t_legacy / max(t_query, 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,53 @@
+# benchmarks/bench_ppt.py
+"""
+Temps par deck de profil : update_ppt élève par élève (classeur + modèle
+relus, deck écrit sur disque) vs update_ppt_batch (modèle chargé une fois,
+copie en mémoire par élève, pool de process).
+
+    python benchmarks/bench_ppt.py [nb_eleves]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from update_ppt_eml import update_ppt, update_ppt_batch  # noqa: E402
+from synthetic import make_suivi, make_profils_eleves, make_profile_template  # noqa: E402
+
+
+def main(n: int = 50):
+    work_dir = tempfile.mkdtemp()
+    excel_path = os.path.join(work_dir, "Parent_Eleve_Prof.xlsx")
+    with pd.ExcelWriter(excel_path) as writer:
+        make_profils_eleves(n).to_excel(writer, sheet_name="Profils_élèves", index=False)
+        make_suivi(n).to_excel(writer, sheet_name="Suivi", index=False)
+    template_path = make_profile_template(os.path.join(work_dir, "modele.pptx"))
+
+    suivi = make_suivi(n)
+    out_single = tempfile.mkdtemp(dir=work_dir)
+    t0 = time.perf_counter()
+    for _, row in suivi.iterrows():
+        update_ppt(row, excel_path, template_path, out_single)
+    t_single = time.perf_counter() - t0
+
+    timings = {}
+    for workers in sorted({1, os.cpu_count() or 1}):
+        out_batch = tempfile.mkdtemp(dir=work_dir)
+        t0 = time.perf_counter()
+        results = update_ppt_batch(excel_path, template_path, out_batch, max_workers=workers)
+        timings[workers] = time.perf_counter() - t0
+        assert not any(r["error"] for r in results), results
+
+    print(f"{n} élèves, modèle synthétique ({os.path.getsize(template_path) // 1024} Ko), {os.cpu_count()} cœur(s)")
+    print(f"  update_ppt par élève      : {t_single / n * 1000:8.1f} ms / deck")
+    for workers, t in timings.items():
+        print(f"  update_ppt_batch ({workers} proc.) : {t / n * 1000:8.1f} ms / deck  (x{t_single / t:.1f})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,54 @@
+# benchmarks/bench_search.py
+"""
+Recherche d'élèves de l'étape 1 : `.str.contains` sur tout le DataFrame
+(historique) vs SearchIndex, sur une feuille Suivi synthétique.
+
+    python benchmarks/bench_search.py [nb_eleves]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex  # noqa: E402
+from synthetic import make_suivi  # noqa: E402
+
+QUERIES = [("ma", ""), ("mat", ""), ("", "dup"), ("lé", "mor"), ("camille", "roux"), ("Elouise", ""), ("", "Lefevre")]
+
+
+def legacy_search(df_suivi, prenom_input, nom_input):
+    resultats = df_suivi.copy()
+    if prenom_input:
+        resultats = resultats[resultats['Prénom'].str.lower().str.contains(prenom_input.lower())]
+    if nom_input:
+        resultats = resultats[resultats['Nom'].str.upper().str.contains(nom_input.upper())]
+    return resultats
+
+
+def main(n: int = 10_000):
+    df_suivi = make_suivi(n)
+
+    t0 = time.perf_counter()
+    for prenom, nom in QUERIES:
+        legacy_search(df_suivi, prenom, nom)
+    t_legacy = (time.perf_counter() - t0) / len(QUERIES)
+
+    t0 = time.perf_counter()
+    index = SearchIndex(df_suivi, ("Prénom", "Nom"))
+    t_build = time.perf_counter() - t0
+
+    print(f"{n} élèves")
+    print(f"  .str.contains        : {t_legacy * 1000:8.3f} ms / recherche")
+    print(f"  SearchIndex build    : {t_build * 1000:8.1f} ms (une fois par chargement)")
+    for prenom, nom in QUERIES:
+        t0 = time.perf_counter()
+        positions, approche = index.search({"Prénom": prenom, "Nom": nom})
+        dt = time.perf_counter() - t0
+        label = f"{prenom!r} / {nom!r}"
+        print(f"  {label:22} : {dt * 1000:8.3f} ms  {len(positions):5d} résultat(s){' (approchés)' if approche else ''}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,91 @@
+# benchmarks/bench_templates.py
+"""
+Rendus par seconde du mail de coordonnées prof (generate_email_html) :
+f-string + relecture/encodage de la signature à chaque rendu (historique)
+vs gabarit compilé + signature en cache (email_templates).
+
+    python benchmarks/bench_templates.py [nb_rendus]
+"""
+
+import os
+import sys
+import time
+import base64
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import email_templates  # noqa: E402
+from email_prof_eml import generate_email_html  # noqa: E402
+from synthetic import make_profs, make_suivi  # noqa: E402
+
+SENDER = "idir.hadjhamou@study-success.fr"
+
+
+def legacy_render(selected_row, selected_prof, signature_path):
+    """Rendu de generate_email_html avant email_templates (corps abrégé, même coût)."""
+    with open(signature_path, "rb") as f:
+        img_data = base64.b64encode(f.read()).decode('utf-8')
+    signature_html = f"""--<br><img src="data:image/png;base64,{img_data}" style="max-width: 350px; margin-top: 10px;" alt="Signature">"""
+    is_visio = selected_row.get('Visio ?', 'Non').lower() in ['oui', 'visio']
+    adresse = 'Visio' if is_visio else selected_prof.get('adresse', 'Adresse non disponible')
+    return f"""<html><body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+    <p>Bonjour !<br><br>
+    Comme convenu, voici toutes les informations pour organiser le premier cours d'essai avec {selected_row.get('Prénom', 'N/A')} :<br><br></p>
+    <p><b>📌 Informations de l'élève</b><br>
+    • Prénom & Nom : {selected_row.get('Prénom', 'N/A')} {selected_row.get('Nom', 'N/A')}<br>
+    • Classe : {selected_row.get('Niveau', 'N/A')}<br>
+    • Dispo et profil de l'élève : {selected_row.get("Dispo & Profil de l'élève", 'N/A')}<br>
+    • Numéro de contact : {selected_row.get('Téléphone parents', 'N/A')}<br>
+    • Adresse : {adresse}<br><br></p>
+    <p><b>📌 Coordonnées du professeur</b><br>
+    • Nom du professeur : {selected_prof.get('Prénom', 'N/A')} {selected_prof.get('Nom', 'N/A')}<br>
+    • Numéro de téléphone : {selected_prof.get('Numéro', 'N/A')}<br>
+    • Adresse e-mail : {selected_prof.get('Mail', 'N/A')}<br><br></p>
+    <p>{selected_prof.get('Prénom', 'Professeur')}, ...<br><br>
+    {signature_html}</p>
+</body></html>"""
+
+
+def main(n: int = 2_000):
+    # Signature factice de ~40 Ko (taille d'une PNG de signature typique)
+    signature_dir = tempfile.mkdtemp()
+    signature_path = os.path.join(signature_dir, email_templates.SIGNATURE_FILES["idir"])
+    with open(signature_path, "wb") as f:
+        f.write(os.urandom(40_000))
+    email_templates.SIGNATURE_DIR = signature_dir
+    email_templates.clear_signature_cache()
+
+    # lignes en dict : on mesure le rendu, pas les accès Series.get de pandas
+    eleves = make_suivi(100).to_dict("records")
+    profs = make_profs(100).to_dict("records")
+    pairs = [(eleves[i % len(eleves)], profs[(i * 7) % len(profs)]) for i in range(n)]
+
+    t0 = time.perf_counter()
+    for eleve, prof in pairs:
+        legacy_render(eleve, prof, signature_path)
+    t_legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for eleve, prof in pairs:
+        generate_email_html(eleve, None, prof, SENDER)
+    t_new = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for eleve, prof in pairs:
+        email_templates.render(
+            "proposition", eleve_prenom=eleve["Prénom"], niveau=eleve["Niveau"],
+            matieres=eleve["Matières enseignées"], dispo=eleve["Dispo & Profil de l'élève"],
+            adresse=eleve["Adresse"],
+        )
+    t_proposition = time.perf_counter() - t0
+
+    print(f"{n} rendus, signature de {os.path.getsize(signature_path) // 1024} Ko")
+    print(f"  f-string + signature relue   : {n / t_legacy:10.0f} rendus/s")
+    print(f"  generate_email_html (gabarit): {n / t_new:10.0f} rendus/s")
+    print(f"  gabarit 'proposition' seul   : {n / t_proposition:10.0f} rendus/s")
+    print(f"  accélération                 : x{t_legacy / max(t_new, 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000)
@@ -0,0 +1,262 @@
+# benchmarks/fakes.py
+"""
+Faux backends en process pour les benchmarks : Google Maps (googlemaps.Client)
+et Microsoft Graph (session HTTP de graph_client, y compris un drive
+SharePoint avec requêtes delta), avec latence réglable.
+
+Les réponses sont déterministes (dérivées d'un hash des adresses) : deux
+exécutions donnent les mêmes durées, les mêmes profs, les mêmes volumes.
+"""
+
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit, parse_qs
+
+import graph_client
+
+
+def _stable_int(*parts) -> int:
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class FakeMapsClient:
+    """
+    Remplace googlemaps.Client : directions, distance_matrix, geocode.
+    `latency` : secondes d'attente par appel (aller-retour réseau simulé).
+    Compte les appels par méthode dans `calls`.
+    """
+
+    def __init__(self, latency: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.seed = seed
+        self.calls = {"directions": 0, "distance_matrix": 0, "geocode": 0}
+        self._lock = threading.Lock()
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _seconds(self, origin, destination) -> int:
+        # 10 à 90 minutes de transport
+        return 600 + _stable_int(self.seed, origin, destination) % 4800
+
+    def directions(self, origin, destination, mode=None, departure_time=None, **kwargs):
+        self._call("directions")
+        return [{"legs": [{"duration": {"value": self._seconds(origin, destination)}}]}]
+
+    def distance_matrix(self, origins, destinations, mode=None, departure_time=None, **kwargs):
+        self._call("distance_matrix")
+        return {"rows": [
+            {"elements": [{"status": "OK", "duration": {"value": self._seconds(o, d)}}
+                          for d in destinations]}
+            for o in origins
+        ]}
+
+    def geocode(self, address, **kwargs):
+        self._call("geocode")
+        h = _stable_int(self.seed, address)
+        # autour de Paris (~ 40 km x 40 km)
+        lat = 48.65 + (h % 10_000) / 10_000 * 0.4
+        lng = 2.05 + (h // 10_000 % 10_000) / 10_000 * 0.6
+        return [{"geometry": {"location": {"lat": lat, "lng": lng}}}]
+
+
+class FakeResponse:
+    """Sous-ensemble de requests.Response utilisé par le code Graph."""
+
+    def __init__(self, status_code: int, payload=None, headers=None, content: bytes = b""):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+        self.content = content
+        self.text = json.dumps(payload) if payload is not None else ""
+
+    def json(self):
+        return self._payload
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size or 1):
+            yield self.content[start:start + chunk_size]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def close(self):
+        pass
+
+
+class FakeGraphSession:
+    """
+    Remplace la requests.Session de graph_client : sendMail (202), $batch,
+    brouillons / sessions d'upload / envoi (pièces jointes > 3 Mo), DELETE,
+    et un drive SharePoint (`put_file` / `delete_file`) servi par
+    `/drive/root/delta` et `/drive/items/{id}/content`.
+    Compte les requêtes par type dans `calls` et les octets reçus dans `bytes_in`.
+    Les ids de `fail_downloads` répondent 503 au téléchargement.
+    """
+
+    DELTA_PAGE_SIZE = 200
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = {}
+        self.bytes_in = 0
+        self._ids = 0
+        self._lock = threading.Lock()
+        self.drive = {"root": {"name": "root", "parent": None, "folder": True, "seq": 0}}
+        self.fail_downloads = set()
+        self._paths = {"": "root"}  # chemin -> id
+        self._seq = 0
+        self._deleted = {}  # id -> seq de suppression
+
+    # ---- Drive simulé ----
+    def _touch(self, item_id):
+        self._seq += 1
+        self.drive[item_id]["seq"] = self._seq
+
+    def _item(self, parts, folder: bool) -> str:
+        path = "/".join(parts)
+        item_id = self._paths.get(path)
+        if item_id is None:
+            parent = self._item(parts[:-1], folder=True)
+            item_id = self._paths[path] = f"item-{len(self._paths)}"
+            self.drive[item_id] = {"name": parts[-1], "parent": parent, "folder": folder, "version": 0}
+            self._touch(item_id)
+        return item_id
+
+    def put_file(self, path: str, content: bytes) -> str:
+        """Crée ou modifie le fichier `path` ('Dossier/fichier.xlsx') ; rend son id."""
+        item_id = self._item(path.strip("/").split("/"), folder=False)
+        entry = self.drive[item_id]
+        entry["content"] = content
+        entry["version"] += 1
+        self._touch(item_id)
+        return item_id
+
+    def delete_file(self, path: str):
+        item_id = self._paths.pop(path.strip("/"), None)
+        if item_id is not None:
+            del self.drive[item_id]
+            self._seq += 1
+            self._deleted[item_id] = self._seq
+
+    def _delta(self, url):
+        query = parse_qs(urlsplit(url).query)
+        since = int(query.get("token", ["0"])[0])
+        skip = int(query.get("skip", ["0"])[0])
+        changes = sorted([(e["seq"], item_id) for item_id, e in self.drive.items() if e["seq"] > since or not since]
+                         + [(seq, item_id) for item_id, seq in self._deleted.items() if seq > since and since])
+        page = changes[skip:skip + self.DELTA_PAGE_SIZE]
+        value = []
+        for _, item_id in page:
+            entry = self.drive.get(item_id)
+            if entry is None:
+                value.append({"id": item_id, "deleted": {}})
+                continue
+            item = {"id": item_id, "name": entry["name"], "parentReference": {"id": entry["parent"]}}
+            if item_id == "root":
+                item["root"] = {}
+            elif entry["folder"]:
+                item["folder"] = {}
+            else:
+                item["file"] = {}
+                item["cTag"] = f"{item_id}#{entry['version']}"
+                item["@microsoft.graph.downloadUrl"] = f"https://download.fake.local/{item_id}"
+            value.append(item)
+        base = url.split("?", 1)[0]
+        data = {"value": value}
+        if skip + self.DELTA_PAGE_SIZE < len(changes):
+            data["@odata.nextLink"] = f"{base}?token={since}&skip={skip + self.DELTA_PAGE_SIZE}"
+        else:
+            data["@odata.deltaLink"] = f"{base}?token={self._seq}"
+        return FakeResponse(200, data)
+
+    def _content(self, item_id):
+        entry = self.drive.get(item_id)
+        if entry is None or entry["folder"]:
+            return FakeResponse(404, {"error": {"message": f"{item_id} introuvable"}})
+        if item_id in self.fail_downloads:
+            return FakeResponse(503, {"error": {"message": "service indisponible"}})
+        return FakeResponse(200, content=entry["content"])
+
+    def get(self, url, headers=None, **kwargs):
+        return self.request("GET", url, headers=headers)
+
+    def _count(self, kind, size=0):
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            self.bytes_in += size
+            self._ids += 1
+            return self._ids
+
+    def request(self, method, url, headers=None, json=None, data=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        size = len(data) if data is not None else len(_dumps(json))
+        path = url.split("/v1.0", 1)[-1]
+
+        if method == "POST" and path.endswith("/$batch"):
+            self._count("batch", size)
+            return FakeResponse(200, {"responses": [
+                {"id": sub["id"], "status": 202, "headers": {}, "body": None}
+                for sub in (json or {}).get("requests", [])
+            ]})
+        if method == "POST" and path.endswith("/sendMail"):
+            self._count("sendMail", size)
+            return FakeResponse(202)
+        if method == "POST" and path.endswith("/createUploadSession"):
+            n = self._count("createUploadSession", size)
+            return FakeResponse(201, {"uploadUrl": f"https://upload.fake.local/session/{n}"})
+        if method == "PUT":
+            self._count("upload", size)
+            return FakeResponse(200)
+        if method == "POST" and path.endswith("/send"):
+            self._count("send", size)
+            return FakeResponse(202)
+        if method == "POST" and path.endswith("/messages"):
+            n = self._count("draft", size)
+            return FakeResponse(201, {"id": f"draft-{n}"})
+        if method == "DELETE":
+            self._count("delete")
+            return FakeResponse(204)
+        if method == "GET" and "/drive/root/delta" in path:
+            self._count("delta")
+            return self._delta(path)
+        if method == "GET" and url.startswith("https://download.fake.local/"):
+            self._count("download")
+            return self._content(url.rsplit("/", 1)[-1])
+        if method == "GET" and path.endswith("/content") and "/drive/items/" in path:
+            self._count("download")
+            return self._content(path.split("/drive/items/", 1)[1][:-len("/content")])
+        self._count("other", size)
+        return FakeResponse(404, {"error": {"message": f"{method} {path} non simulé"}})
+
+
+def _dumps(payload) -> bytes:
+    return json.dumps(payload).encode() if payload is not None else b""
+
+
+@contextmanager
+def fake_graph(latency: float = 0.0):
+    """
+    Installe FakeGraphSession dans graph_client (session + token valide) le
+    temps du bloc, puis restaure l'état d'origine. Rend la fausse session.
+    """
+    saved = (graph_client._app, graph_client._token, graph_client._token_expires_at, graph_client._session)
+    session = FakeGraphSession(latency)
+    graph_client._app = object()  # get_msal_app() ne tente pas de créer une vraie app MSAL
+    graph_client._token = "fake-token"
+    graph_client._token_expires_at = time.time() + 24 * 3600
+    graph_client._session = session
+    try:
+        yield session
+    finally:
+        (graph_client._app, graph_client._token,
+         graph_client._token_expires_at, graph_client._session) = saved
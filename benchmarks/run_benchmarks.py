@@ -0,0 +1,378 @@
+# benchmarks/run_benchmarks.py
+"""
+Banc de mesure des chemins critiques sur données synthétiques, sans réseau :
+Google Maps et Microsoft Graph sont remplacés par les faux clients de
+benchmarks/fakes.py (latence réglable). Résultats en JSON, pour comparer
+deux versions.
+
+    python benchmarks/run_benchmarks.py [--sizes 100,1000,10000,100000]
+        [--scenarios run_matching,workbook,...] [--maps-latency 0.005]
+        [--graph-latency 0.005] [--no-limits] [--output resultats.json]
+        [--compare precedent.json] [--verbose]
+
+Scénarios : run_matching, workbook, generate_email_html, build_emltpl,
+update_ppt, send_mail, assignment, sharepoint_sync. Les plus coûteux sont plafonnés (cf. LIMITS) :
+écrire un classeur de 100 000 lignes ou générer 100 000 decks prendrait
+des heures sans rien apprendre de plus ; `--no-limits` lève les plafonds.
+
+`--compare` : affiche (stderr) les écarts avec un fichier de résultats
+précédent et sort en code 1 si un scénario est plus lent de plus de
+`--threshold` (défaut 1.25 = +25 %).
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import datetime as dt
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import assignment  # noqa: E402
+import workbook_cache  # noqa: E402
+import email_templates  # noqa: E402
+from travel_cache import TravelTimeCache  # noqa: E402
+from teacher_index import TeacherIndex  # noqa: E402
+from matching_eml import run_matching, run_matching_bulk, _build_emltpl  # noqa: E402
+from email_prof_eml import generate_email_html  # noqa: E402
+from update_ppt_eml import update_ppt, update_ppt_batch  # noqa: E402
+from send_mail_streamlit import send_mail, send_mail_batch  # noqa: E402
+from sharepoint_sync import SharePointMirror  # noqa: E402
+from synthetic import make_profs, make_suivi, make_profile_template, write_workbooks  # noqa: E402
+from fakes import FakeMapsClient, fake_graph  # noqa: E402
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000]
+# nb max d'éléments traités par scénario (au-delà : taille plafonnée, cf. "items")
+LIMITS = {"workbook": 10_000, "update_ppt": 100, "send_mail": 1_000, "assignment": 10_000,
+          "sharepoint_sync": 10_000}
+# élèves par mesure de run_matching (la taille porte sur le roster profs)
+MATCHING_STUDENTS = 5
+SENDER = "idir.hadjhamou@study-success.fr"
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def _result(scenario, variant, size, items, seconds, **extra):
+    return {
+        "scenario": scenario,
+        "variant": variant,
+        "size": size,
+        "items": items,
+        "seconds": round(seconds, 6),
+        "per_item_ms": round(seconds / max(items, 1) * 1000, 4),
+        **extra,
+    }
+
+
+# === Scénarios : chacun rend une liste de résultats pour une taille ===
+
+def bench_run_matching(size, ctx):
+    """Roster de `size` profs ; cache de trajets vide (froid) puis rempli (chaud)."""
+    df_profs = make_profs(size)
+    eleves = make_suivi(200, seed=1)
+    eleves = eleves[eleves["Visio ?"] != "Visio"].head(MATCHING_STUDENTS)
+    index = TeacherIndex(df_profs)
+    results = []
+    for api_mode in ("matrix", "directions"):
+        maps = FakeMapsClient(latency=ctx["maps_latency"])
+        cache = TravelTimeCache(os.path.join(ctx["work_dir"], f"travel_{api_mode}_{size}.sqlite"))
+        for phase in ("froid", "chaud"):
+            calls_before = sum(maps.calls.values())
+
+            def run():
+                return [len(run_matching(row, {}, df_profs, gmaps_client=maps, travel_cache=cache,
+                                         api_mode=api_mode, deadline=None, teacher_index=index))
+                        for _, row in eleves.iterrows()]
+            seconds, found = _timed(run)
+            results.append(_result("run_matching", f"{api_mode}/{phase}", size, len(eleves), seconds,
+                                   profs_proposes=sum(found),
+                                   appels_maps=sum(maps.calls.values()) - calls_before))
+    return results
+
+
+def bench_workbook(size, ctx):
+    """load_sheets : Excel (openpyxl), instantané Parquet, cache mémoire."""
+    n = ctx["limit"]("workbook", size)
+    directory = tempfile.mkdtemp(dir=ctx["work_dir"])
+    paths = write_workbooks(directory, n)
+    sheets = {"profs": ["Liste profs"], "suivi": ["Suivi", "Profils_élèves"]}
+
+    def load_all():
+        for key, path in paths.items():
+            workbook_cache.load_sheets(path, sheets[key])
+
+    results = []
+    workbook_cache.clear_cache()
+    seconds, _ = _timed(load_all)  # écrit aussi les instantanés Parquet
+    results.append(_result("workbook", "excel", size, n, seconds))
+    if workbook_cache.pyarrow is not None:
+        workbook_cache.clear_cache()
+        seconds, _ = _timed(load_all)
+        results.append(_result("workbook", "parquet", size, n, seconds))
+    seconds, _ = _timed(load_all)
+    results.append(_result("workbook", "memoire", size, n, seconds))
+    workbook_cache.clear_cache()
+    return results
+
+
+def bench_generate_email_html(size, ctx):
+    eleves = make_suivi(min(size, 1_000)).to_dict("records")
+    profs = make_profs(min(size, 1_000)).to_dict("records")
+    pairs = [(eleves[i % len(eleves)], profs[(i * 7) % len(profs)]) for i in range(size)]
+
+    def run():
+        for eleve, prof in pairs:
+            generate_email_html(eleve, None, prof, SENDER)
+    seconds, _ = _timed(run)
+    return [_result("generate_email_html", "signature", size, size, seconds)]
+
+
+def bench_build_emltpl(size, ctx):
+    """Mails de proposition en Cci (20 profs) ; avec et sans image inline."""
+    signature = email_templates.signature_part(SENDER)
+    bcc = [f"prof{i}@example.com" for i in range(20)]
+    html_body = email_templates.render("proposition", eleve_prenom="Jean", niveau="Seconde",
+                                       matieres="Maths et Physique", dispo="Mercredi", adresse="Paris")
+    results = []
+    for variant, images in (("texte", None), ("image_inline", [signature] if signature else None)):
+        seconds, _ = _timed(lambda: [_build_emltpl("Proposition", html_body, bcc_list=bcc, inline_images=images)
+                                     for _ in range(size)])
+        results.append(_result("build_emltpl", variant, size, size, seconds))
+    return results
+
+
+def bench_update_ppt(size, ctx):
+    """update_ppt élève par élève vs update_ppt_batch (1 process puis tous les cœurs)."""
+    n = ctx["limit"]("update_ppt", size)
+    directory = tempfile.mkdtemp(dir=ctx["work_dir"])
+    paths = write_workbooks(directory, n)
+    template = make_profile_template(os.path.join(directory, "modele.pptx"))
+    suivi = make_suivi(n)
+
+    out = tempfile.mkdtemp(dir=directory)
+    seconds, _ = _timed(lambda: [update_ppt(row, paths["suivi"], template, out) for _, row in suivi.iterrows()])
+    results = [_result("update_ppt", "par_eleve", size, n, seconds)]
+    for workers in sorted({1, os.cpu_count() or 1}):
+        out = tempfile.mkdtemp(dir=directory)
+        seconds, decks = _timed(lambda: update_ppt_batch(paths["suivi"], template, out,
+                                                          max_workers=workers))
+        results.append(_result("update_ppt", f"batch/{workers}proc", size, n, seconds,
+                               erreurs=sum(1 for d in decks if d["error"])))
+    return results
+
+
+def bench_send_mail(size, ctx):
+    """send_mail un par un vs send_mail_batch ($batch de 20), Graph simulé."""
+    n = ctx["limit"]("send_mail", size)
+    eleves = make_suivi(min(n, 1_000)).to_dict("records")
+    profs = make_profs(min(n, 1_000)).to_dict("records")
+    messages = []
+    for i in range(n):
+        email = generate_email_html(eleves[i % len(eleves)], None, profs[(i * 7) % len(profs)], SENDER)
+        messages.append({
+            "to_email": email["to_email"], "subject": email["subject"], "html_body": email["html_body"],
+            "from_email": SENDER, "cc": email["cc_email"], "inline_images": email["inline_images"],
+        })
+
+    results = []
+    with fake_graph(ctx["graph_latency"]) as session:
+        seconds, sent = _timed(lambda: [send_mail(**msg) for msg in messages])
+        results.append(_result("send_mail", "unitaire", size, n, seconds,
+                               requetes=sum(session.calls.values()),
+                               echecs=sum(1 for r in sent if not r["success"])))
+    with fake_graph(ctx["graph_latency"]) as session:
+        seconds, sent = _timed(lambda: send_mail_batch(messages))
+        results.append(_result("send_mail", "batch", size, n, seconds,
+                               requetes=sum(session.calls.values()),
+                               echecs=sum(1 for r in sent if not r["success"])))
+    return results
+
+
+def bench_assignment(size, ctx):
+    """Répartition du jour : `size` élèves et `size` profs ; candidats (run_matching_bulk) puis résolution."""
+    n = ctx["limit"]("assignment", size)
+    suivi, profs = make_suivi(n), make_profs(n)
+    pending = suivi[suivi["Etat"].str.match(assignment.ETATS_A_PLACER)]
+    maps = FakeMapsClient(latency=ctx["maps_latency"])
+    cache = TravelTimeCache(os.path.join(ctx["work_dir"], f"travel_assignment_{n}.sqlite"))
+    seconds, candidates = _timed(lambda: run_matching_bulk(pending, profs, top_n=assignment.TOP_N,
+                                                           gmaps_client=maps, travel_cache=cache, deadline=None))
+    results = [_result("assignment", "candidats", size, len(pending), seconds, couples=len(candidates),
+                       appels_maps=sum(maps.calls.values()))]
+    solvers = ["glouton"] + (["exact"] if assignment.min_weight_full_bipartite_matching is not None else [])
+    for solver in solvers:
+        seconds, out = _timed(lambda: assignment.suggest_assignment(suivi, profs, candidates=candidates,
+                                                                    solver=solver, capacity=1))
+        results.append(_result("assignment", solver, size, len(pending), seconds,
+                               places=out.attrs["places"], cout_total=out.attrs["cout_total"]))
+    return results
+
+
+def bench_sharepoint_sync(size, ctx):
+    """Miroir SharePoint (drive Graph simulé) : synchro initiale, sans changement, 1 % modifié."""
+    n = ctx["limit"]("sharepoint_sync", size)
+    content = os.urandom(20_000)
+    results = []
+    with fake_graph(ctx["graph_latency"]) as session:
+        paths = [f"GESTION QUOTIDIENNE/eleves/{i:06d}.xlsx" for i in range(n)]
+        for path in paths:
+            session.put_file(path, content)
+        mirror = SharePointMirror(mirror_dir=tempfile.mkdtemp(dir=ctx["work_dir"]),
+                                  folders=["GESTION QUOTIDIENNE"], token_provider=lambda: "fake-token",
+                                  session=session)
+        for variant in ("initiale", "inchangee", "1pct_modifie"):
+            if variant == "1pct_modifie":
+                for path in paths[::100]:
+                    session.put_file(path, content[::-1])
+            requests_before = sum(session.calls.values())
+            seconds, summary = _timed(mirror.sync)
+            results.append(_result("sharepoint_sync", variant, size, n, seconds,
+                                   requetes=sum(session.calls.values()) - requests_before,
+                                   mis_a_jour=summary["updated"], echecs=summary["failed"]))
+    return results
+
+
+SCENARIOS = {
+    "run_matching": bench_run_matching,
+    "workbook": bench_workbook,
+    "generate_email_html": bench_generate_email_html,
+    "build_emltpl": bench_build_emltpl,
+    "update_ppt": bench_update_ppt,
+    "send_mail": bench_send_mail,
+    "assignment": bench_assignment,
+    "sharepoint_sync": bench_sharepoint_sync,
+}
+
+
+# === Exécution, contexte, comparaison ===
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _install_signature(work_dir):
+    """Signature factice (~40 Ko) : les rendus incluent l'image, comme en production."""
+    signature_dir = os.path.join(work_dir, "signatures")
+    os.makedirs(signature_dir, exist_ok=True)
+    for file_name in set(email_templates.SIGNATURE_FILES.values()):
+        with open(os.path.join(signature_dir, file_name), "wb") as f:
+            f.write(os.urandom(40_000))
+    email_templates.SIGNATURE_DIR = signature_dir
+    email_templates.clear_signature_cache()
+
+
+def run(sizes, scenarios, maps_latency=0.005, graph_latency=0.005, limits=True, verbose=False) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    ctx = {
+        "work_dir": work_dir,
+        "maps_latency": maps_latency,
+        "graph_latency": graph_latency,
+        "limit": (lambda scenario, size: min(size, LIMITS.get(scenario, size))) if limits else (lambda s, size: size),
+    }
+    _install_signature(work_dir)
+    results = []
+    # les modules mesurés impriment leurs traces ([DEBUG], ✅) : hors du JSON
+    noise = sys.stderr if verbose else io.StringIO()
+    try:
+        for name in scenarios:
+            for size in sizes:
+                print(f"⏱️ {name} ({size})...", file=sys.stderr)
+                try:
+                    with redirect_stdout(noise):
+                        results.extend(SCENARIOS[name](size, ctx))
+                except Exception as e:
+                    print(f"❌ {name} ({size}) : {e}", file=sys.stderr)
+                    results.append({"scenario": name, "size": size, "error": str(e)})
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "date": dt.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "maps_latency_s": maps_latency,
+            "graph_latency_s": graph_latency,
+            "limits": LIMITS if limits else None,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, previous: dict, threshold: float = 1.25) -> list:
+    """Scénarios plus lents que `threshold` x le précédent : [(clé, avant_s, après_s)]."""
+    def key(r):
+        return r["scenario"], r.get("variant"), r["size"]
+
+    before = {key(r): r for r in previous.get("results", []) if "seconds" in r}
+    regressions = []
+    for r in current["results"]:
+        old = before.get(key(r))
+        if "seconds" not in r or old is None:
+            continue
+        ratio = r["seconds"] / max(old["seconds"], 1e-9)
+        flag = "⚠️" if ratio > threshold else "  "
+        print(f"{flag} {'/'.join(map(str, key(r))):45s} {old['seconds']:10.4f}s -> {r['seconds']:10.4f}s "
+              f"(x{ratio:.2f})", file=sys.stderr)
+        if ratio > threshold:
+            regressions.append((key(r), old["seconds"], r["seconds"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--maps-latency", type=float, default=0.005, help="secondes par appel Google Maps simulé")
+    parser.add_argument("--graph-latency", type=float, default=0.005, help="secondes par requête Graph simulée")
+    parser.add_argument("--no-limits", action="store_true", help="ne pas plafonner les scénarios coûteux")
+    parser.add_argument("--output", help="fichier JSON de sortie (défaut : stdout)")
+    parser.add_argument("--compare", help="résultats précédents (JSON) à comparer")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--verbose", action="store_true", help="traces des modules mesurés sur stderr")
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"scénario(s) inconnu(s) : {', '.join(unknown)} (disponibles : {', '.join(SCENARIOS)})")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    report = run(sizes, scenarios, args.maps_latency, args.graph_latency,
+                 limits=not args.no_limits, verbose=args.verbose)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ Résultats : {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} régression(s) au-delà de x{args.threshold}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
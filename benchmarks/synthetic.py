@@ -0,0 +1,119 @@
+# benchmarks/synthetic.py
+"""
+Générateurs de données synthétiques au format des classeurs SharePoint
+(Contact_Profs.xlsx / Parent_Eleve_Prof.xlsx), reproductibles via `seed`.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+PRENOMS = ["Jean", "Marie", "Léa", "Hugo", "Chloé", "Lucas", "Inès", "Noé", "Zoé", "Éloïse",
+           "Mathis", "Camille", "Gabriel", "Manon", "Raphaël", "Sarah", "Adam", "Jade"]
+NOMS = ["DUPONT", "MARTIN", "BERNARD", "PETIT", "DURAND", "LEROY", "MOREAU", "SIMON",
+        "LAURENT", "LEFÈVRE", "MICHEL", "GARCIA", "DAVID", "BERTRAND", "ROUX", "FOURNIER"]
+VILLES = ["Paris", "Boulogne-Billancourt", "Neuilly-sur-Seine", "Levallois-Perret",
+          "Saint-Denis", "Versailles", "Vincennes", "Montreuil", "Issy-les-Moulineaux"]
+NIVEAUX_PROFS = ["Primaire", "Collège", "Lycée", "Supérieur", "Collège, Lycée",
+                 "Primaire, Collège", "Lycée, Supérieur", "Collège, Lycée, Supérieur", None]
+MATIERES_PROFS = ["Maths", "Physique", "SVT", "Informatique", "Maths; Physique",
+                  "Maths; Informatique", "Physique; SVT", "Français", "Anglais", None]
+MODALITES = ["Présentiel", "Visio", "Présentiel ou Visio", "visio uniquement", None]
+ACTIFS = ["1.Nouveau", "2.Prof OK", "3.Prof KO", "4.Prof potentiellement OK", None]
+NIVEAUX_ELEVES = ["Primaire", "6e", "5e", "4e", "3e", "Seconde", "Première", "Terminale", "Licence"]
+MATIERES_ELEVES = ["Maths", "Physique", "SVT", "Biologie", "Informatique", "Maths; Physique",
+                   "Maths; SVT", "Français"]
+
+
+def _adresses(rng, n):
+    numeros = rng.integers(1, 200, n)
+    villes = rng.choice(VILLES, n)
+    return [f"{num} rue de la Paix, {ville}" for num, ville in zip(numeros, villes)]
+
+
+def make_profs(n: int, seed: int = 0) -> pd.DataFrame:
+    """Roster 'Liste profs' de `n` lignes."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Nom": rng.choice(NOMS, n),
+        "Prénom": rng.choice(PRENOMS, n),
+        "Mail": [f"prof{i}@example.com" for i in range(n)],
+        "Numéro": [f"06{i:08d}" for i in range(n)],
+        "Niveau": rng.choice(np.array(NIVEAUX_PROFS, dtype=object), n),
+        "Matière": rng.choice(np.array(MATIERES_PROFS, dtype=object), n),
+        "Actif": rng.choice(np.array(ACTIFS, dtype=object), n),
+        "Précisions sur la situation": "",
+        "adresse": _adresses(rng, n),
+        "Présentiel ou Visio ?": rng.choice(np.array(MODALITES, dtype=object), n),
+    })
+
+
+def make_suivi(n: int, seed: int = 0) -> pd.DataFrame:
+    """Feuille 'Suivi' de `n` élèves."""
+    rng = np.random.default_rng(seed + 1)
+    return pd.DataFrame({
+        "Id": np.arange(1, n + 1),
+        "Nom": rng.choice(NOMS, n),
+        "Prénom": rng.choice(PRENOMS, n),
+        "Adresse": _adresses(rng, n),
+        "Niveau": rng.choice(NIVEAUX_ELEVES, n),
+        "Matières enseignées": rng.choice(MATIERES_ELEVES, n),
+        "Visio ?": rng.choice(["Visio", "Présentiel", ""], n),
+        "Dispo & Profil de l'élève": "Mercredi après-midi",
+        "Téléphone parents": [f"07{i:08d}" for i in range(n)],
+        "Mail": [f"parent{i}@example.com" for i in range(n)],
+        "Etat": rng.choice(["0. Nouveau", "1. En recherche", "2. Proposé", "3. En cours"], n),
+        "Professeur": "",
+        "Gérant": "",
+        "Tps attente": "",
+    })
+
+
+def make_profils_eleves(n: int, seed: int = 0) -> pd.DataFrame:
+    """Feuille 'Profils_élèves' (scores du test de profil) pour les élèves 1..n."""
+    rng = np.random.default_rng(seed + 2)
+    scores = {col: rng.integers(0, 12, n) for col in
+              ["Visuel", "Verbal", "Sensoriel", "Intuitif", "Actif", "Réflexif", "Séquentiel", "Global"]}
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "Prénom": rng.choice(PRENOMS, n),
+        "Nom": rng.choice(NOMS, n),
+        **scores,
+    })
+
+
+def make_profile_template(path: str, nb_shapes: int = 11, named: bool = False):
+    """
+    Modèle PPTX minimal : une slide avec `nb_shapes` zones de texte, aux mêmes
+    index que le vrai modèle. `named=True` : formes nommées d'après fill_plan.SLOTS.
+    """
+    from pptx import Presentation
+    from pptx.util import Inches
+    from fill_plan import SLOTS
+
+    names = {index: slot for slot, index in SLOTS.items()} if named else {}
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[6])  # slide vide
+    for i in range(nb_shapes):
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(0.3 + 0.6 * i), Inches(8), Inches(0.5))
+        box.text_frame.text = f"Zone {i}"
+        if i in names:
+            box.name = names[i]
+    prs.save(path)
+    return path
+
+
+def write_workbooks(directory: str, n: int, seed: int = 0) -> dict:
+    """
+    Écrit Contact_Profs.xlsx ('Liste profs') et Parent_Eleve_Prof.xlsx
+    ('Suivi', 'Profils_élèves') de `n` lignes dans `directory`.
+    Retourne {"profs": chemin, "suivi": chemin}.
+    """
+    profs_path = os.path.join(directory, "Contact_Profs.xlsx")
+    suivi_path = os.path.join(directory, "Parent_Eleve_Prof.xlsx")
+    make_profs(n, seed).to_excel(profs_path, sheet_name="Liste profs", index=False)
+    with pd.ExcelWriter(suivi_path) as writer:
+        make_suivi(n, seed).to_excel(writer, sheet_name="Suivi", index=False)
+        make_profils_eleves(n, seed).to_excel(writer, sheet_name="Profils_élèves", index=False)
+    return {"profs": profs_path, "suivi": suivi_path}
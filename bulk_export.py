@@ -0,0 +1,101 @@
+# bulk_export.py
+"""
+Export groupé de modèles de mails (.emltpl) dans une archive ZIP.
+
+Chaque message est généré puis écrit aussitôt dans l'archive, sur disque
+dans le dossier de la session : rien ne s'accumule en mémoire, et les
+contenus communs (PDF du mandat) sont lus une seule fois pour tous les élèves.
+"""
+
+import os
+import re
+import time
+import zipfile
+
+from mandat import build_mandat_email
+from email_prof_eml import build_email
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", str(name)).strip("_") or "message"
+
+
+def _unique_name(name: str, used: set) -> str:
+    """Nom de fichier unique dans l'archive (Prénom_Nom peut se répéter)."""
+    base, ext = os.path.splitext(_safe_name(name))
+    candidate, n = f"{base}{ext}", 2
+    while candidate in used:
+        candidate, n = f"{base}_{n}{ext}", n + 1
+    used.add(candidate)
+    return candidate
+
+
+def _row_label(row) -> str:
+    return f"{row.get('Prénom', '')} {row.get('Nom', '')}".strip() or str(row.get('Id', '?'))
+
+
+def export_zip(rows, build, zip_path: str, progress_callback=None) -> dict:
+    """
+    Génère un message par ligne avec `build(row) -> (nom, bytes) | None`
+    et l'écrit directement dans `zip_path`.
+
+    Args:
+        rows: lignes élèves (DataFrame ou liste de Series / dicts)
+        build: fabrique du message d'une ligne
+        zip_path: archive à créer (chemin propre à la session)
+        progress_callback: appelé avec (nb_traités, nb_total)
+
+    Returns:
+        dict: {"path", "count", "errors": [(élève, message)], "duration_s"}
+    """
+    if hasattr(rows, "iterrows"):
+        rows = [row for _, row in rows.iterrows()]
+    total = len(rows)
+    used, errors = set(), []
+    count = 0
+    start = time.perf_counter()
+
+    tmp_path = f"{zip_path}.part"
+    # .emltpl = texte + PDF en base64 : une compression rapide suffit
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for i, row in enumerate(rows, start=1):
+            try:
+                built = build(row)
+                if built is None:
+                    errors.append((_row_label(row), "Message non généré"))
+                else:
+                    file_name, data = built
+                    zf.writestr(_unique_name(file_name, used), data)
+                    count += 1
+            except Exception as e:
+                errors.append((_row_label(row), str(e)))
+            if progress_callback:
+                progress_callback(i, total)
+    os.replace(tmp_path, zip_path)
+
+    duration = time.perf_counter() - start
+    print(f"📦 Export {os.path.basename(zip_path)} : {count}/{total} message(s) en {duration:.1f}s")
+    return {"path": zip_path, "count": count, "errors": errors, "duration_s": round(duration, 2)}
+
+
+def mandat_builder(mandat_pdf_bytes):
+    """Fabrique des mandats : le PDF (bytes) est partagé par tous les messages."""
+    if not mandat_pdf_bytes:
+        raise FileNotFoundError("PDF du mandat indisponible")
+
+    def build(row):
+        file_name = f"Mandat_{row.get('Prénom', '')}_{row.get('Nom', '')}.emltpl"
+        return file_name, build_mandat_email(row, mandat_pdf_bytes)
+    return build
+
+
+def coordonnees_builder(excel_file_path, pdf_file_path, df_profs, sender_email=None):
+    """Fabrique des mails de coordonnées prof (cf. email_prof_eml.build_email)."""
+    def build(row):
+        return build_email(row, excel_file_path, pdf_file_path, df_profs, sender_email)
+    return build
+
+
+def export_mandats_zip(rows, mandat_pdf_bytes, zip_path: str, progress_callback=None) -> dict:
+    """Mandats de plusieurs élèves dans une seule archive."""
+    return export_zip(rows, mandat_builder(mandat_pdf_bytes), zip_path, progress_callback)
@@ -2,41 +2,26 @@
 
 import os
 import tempfile
-import pandas as pd
-import base64
 from email.message import EmailMessage
 
+from workbook_cache import load_sheets
+from email_templates import render, signature_html, signature_part, attach_inline_images, SafeHtml
+
 
 def get_signature_html(sender_email):
     """
-    Retourne le HTML de la signature avec l'image encodée en base64
+    Retourne le HTML de la signature ; l'image est référencée par cid:
+    et doit être jointe en partie inline (cf. get_signature_part)
     """
-    if not sender_email:
-        return ""
-    
-    # Déterminer le fichier de signature
-    email_prefix = sender_email.split('.')[0].lower()
-    signature_map = {
-        "idir": "Signature_idir.png",
-        "manon": "Signature_manon.png",
-        "lucas": "Signature_lucas.png",
-        "mathilde": "Signature_mathilde.png",
-    }
-    
-    signature_file = signature_map.get(email_prefix, "")
-    
-    # Si le fichier existe, l'encoder en base64
-    if signature_file and os.path.exists(signature_file):
-        try:
-            with open(signature_file, "rb") as f:
-                img_data = base64.b64encode(f.read()).decode('utf-8')
-            # Retourner une image encodée en base64 intégrée avec tirets avant
-            return f"""--<br><img src="data:image/png;base64,{img_data}" style="max-width: 350px; margin-top: 10px;" alt="Signature">"""
-        except Exception as e:
-            print(f"Erreur lecture signature {signature_file}: {e}")
-            return ""
-    
-    return ""
+    return signature_html(sender_email)
+
+
+def get_signature_part(sender_email):
+    """
+    Image de signature à joindre en partie inline (cid:), ou None.
+    Lue et encodée une seule fois par expéditeur (cf. email_templates)
+    """
+    return signature_part(sender_email)
 
 
 def generate_email_html(selected_row, df_profs, selected_prof, sender_email=None):
@@ -51,8 +36,9 @@ def generate_email_html(selected_row, df_profs, selected_prof, sender_email=None
         sender_email: Email du sender (pour ajouter la bonne signature)
     
     Returns:
-        dict avec subject, html_body, to_email, cc_email, prof_name
-        ou None si erreur
+        dict avec subject, html_body, to_email, cc_email, prof_name,
+        inline_images (signature à joindre en cid:), preview_html (corps sans
+        l'image, pour l'aperçu) ; ou None si erreur
     """
     try:
         # Récupérer les emails
@@ -63,37 +49,23 @@ def generate_email_html(selected_row, df_profs, selected_prof, sender_email=None
         is_visio = selected_row.get('Visio ?', 'Non').lower() in ['oui', 'visio']
         adresse = 'Visio' if is_visio else selected_prof.get('adresse', 'Adresse non disponible')
         
-        # Obtenir la signature en base64
-        signature_html = get_signature_html(sender_email)
-
-        # Corps du message HTML
-        html_body = f"""<html><body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-    <p>Bonjour !<br><br>
-    Comme convenu, voici toutes les informations pour organiser le premier cours d'essai avec {selected_row.get('Prénom', 'N/A')} :<br><br></p>
-    
-    <p><b>📌 Informations de l'élève</b><br>
-    • Prénom & Nom : {selected_row.get('Prénom', 'N/A')} {selected_row.get('Nom', 'N/A')}<br>
-    • Classe : {selected_row.get('Niveau', 'N/A')}<br>
-    • Dispo et profil de l'élève : {selected_row.get("Dispo & Profil de l'élève", 'N/A')}<br>
-    • Numéro de contact : {selected_row.get('Téléphone parents', 'N/A')}<br>
-    • Adresse : {adresse}<br><br></p>
-    
-    <p><b>📌 Coordonnées du professeur</b><br>
-    • Nom du professeur : {selected_prof.get('Prénom', 'N/A')} {selected_prof.get('Nom', 'N/A')}<br>
-    • Numéro de téléphone : {selected_prof.get('Numéro', 'N/A')}<br>
-    • Adresse e-mail : {selected_prof.get('Mail', 'N/A')}<br><br></p>
-    
-    <p><b>📌 Organisation du premier échange</b><br>
-    {selected_prof.get('Prénom', 'Professeur')}, je t'invite à contacter la famille afin de convenir ensemble d'un créneau pour le premier cours. Une fois l'échange téléphonique fait, merci de m'envoyer un SMS ou un mail pour me confirmer la date et l'heure du cours.<br><br></p>
-    
-    <p><b>📌 Rappels importants</b><br>
-    • Le cours d'essai ne doit pas excéder 1h.<br>
-    • Après ce premier cours, nous allons vous contacter pour un rapide point par téléphone afin d'échanger sur ce cours d'essai.<br><br></p>
-    
-    <p>N'hésitez surtout pas à me solliciter pour toute question.<br><br>
-    A très bientôt !<br><br>
-    {signature_html}</p>
-</body></html>"""
+        fields = dict(
+            eleve_prenom=selected_row.get('Prénom', 'N/A'),
+            eleve_nom=selected_row.get('Nom', 'N/A'),
+            niveau=selected_row.get('Niveau', 'N/A'),
+            dispo=selected_row.get("Dispo & Profil de l'élève", 'N/A'),
+            telephone=selected_row.get('Téléphone parents', 'N/A'),
+            adresse=adresse,
+            prof_prenom=selected_prof.get('Prénom', 'N/A'),
+            prof_nom=selected_prof.get('Nom', 'N/A'),
+            prof_numero=selected_prof.get('Numéro', 'N/A'),
+            prof_mail=selected_prof.get('Mail', 'N/A'),
+            prof_salutation=selected_prof.get('Prénom', 'Professeur'),
+        )
+        signature = get_signature_part(sender_email)
+        html_body = render("prof_contact", signature=get_signature_html(sender_email), **fields)
+        # Aperçu : l'image cid: ne s'affiche pas dans Streamlit, elle est montrée à part
+        preview_html = render("prof_contact", signature=SafeHtml("--" if signature else ""), **fields)
 
         return {
             "subject": f"Coordonnées Elèves: {selected_row.get('Prénom', 'N/A')} {selected_row.get('Nom', 'N/A')}",
@@ -101,7 +73,9 @@ def generate_email_html(selected_row, df_profs, selected_prof, sender_email=None
             "to_email": prof_email,
             "cc_email": parent_email,
             "prof_name": f"{selected_prof.get('Prénom', 'N/A')} {selected_prof.get('Nom', 'N/A')}",
-            "sender_email": sender_email
+            "sender_email": sender_email,
+            "inline_images": [signature] if signature else [],
+            "preview_html": preview_html,
         }
 
     except Exception as e:
@@ -109,9 +83,13 @@ def generate_email_html(selected_row, df_profs, selected_prof, sender_email=None
         return None
 
 
-def generate_email(selected_row, excel_file_path, pdf_file_path, df_profs):
-    # Lecture du fichier Excel
-    df = pd.read_excel(excel_file_path, sheet_name=None)
+def build_email(selected_row, excel_file_path, pdf_file_path, df_profs, sender_email=None):
+    """
+    Message .emltpl de coordonnées prof pour un élève, sans l'écrire sur disque.
+    Retourne (nom de fichier, bytes) ou None si l'élève / le prof est introuvable.
+    """
+    # Lecture du fichier Excel (seulement les feuilles utiles, cf. workbook_cache)
+    df = load_sheets(excel_file_path, ["Profils_élèves", "Suivi"])
     selected_id = selected_row['Id']
 
     # Récupération des infos élève
@@ -146,33 +124,20 @@ def generate_email(selected_row, excel_file_path, pdf_file_path, df_profs):
 
     adresse = selected_row['Adresse'] if selected_row['Visio ?'].lower() != 'visio' else 'Visio'
 
-    # Corps du message HTML
-    html_body = f"""<html><body>
-    Bonjour !<br><br>
-    Comme convenu, voici toutes les informations pour organiser le premier cours d'essai avec {selected_row['Prénom']} :<br><br>
-    
-    <b>📌 Informations de l'élève</b><br>
-    • Prénom & Nom : {selected_row['Prénom']} {selected_row['Nom']}<br>
-    • Classe : {selected_row['Niveau']}<br>
-    • Dispo et profil de l'élève : {selected_row["Dispo & Profil de l'élève"]}<br>
-    • Numéro de contact : {selected_row['Téléphone parents']}<br>
-    • Adresse : {adresse}<br><br>
-    
-    <b>📌 Coordonnées du professeur</b><br>
-    • Nom du professeur : {selected_prof['Prénom']} {selected_prof['Nom']}<br>
-    • Numéro de téléphone : {selected_prof['Numéro']}<br>
-    • Adresse e-mail : {selected_prof['Mail']}<br><br>
-    
-    <b>📌 Organisation du premier échange</b><br>
-    {selected_prof['Prénom']}, je t'invite à contacter la famille afin de convenir ensemble d'un créneau pour le premier cours. Une fois l'échange téléphonique fait, merci de m'envoyer un SMS ou un mail pour me confirmer la date et l'heure du cours.<br><br>
-    
-    <b>📌 Rappels importants</b><br>
-    • Le cours d'essai ne doit pas excéder 1h.<br>
-    • Après ce premier cours, nous allons vous contacter pour un rapide point par téléphone afin d'échanger sur ce cours d'essai.<br><br>
-    
-    N'hésitez surtout pas à me solliciter pour toute question.<br><br>
-    A très bientôt !
-    </body></html>"""
+    html_body = render(
+        "prof_contact_eml",
+        eleve_prenom=selected_row['Prénom'],
+        eleve_nom=selected_row['Nom'],
+        niveau=selected_row['Niveau'],
+        dispo=selected_row["Dispo & Profil de l'élève"],
+        telephone=selected_row['Téléphone parents'],
+        adresse=adresse,
+        prof_prenom=selected_prof['Prénom'],
+        prof_nom=selected_prof['Nom'],
+        prof_numero=selected_prof['Numéro'],
+        prof_mail=selected_prof['Mail'],
+        signature=get_signature_html(sender_email),
+    )
 
     # Création de l'email
     msg = EmailMessage()
@@ -182,6 +147,9 @@ def generate_email(selected_row, excel_file_path, pdf_file_path, df_profs):
     msg['Bcc'] = ''
     msg.set_content("Ce message contient un contenu HTML.")
     msg.add_alternative(html_body, subtype='html')
+    signature = get_signature_part(sender_email)
+    if signature:
+        attach_inline_images(msg, [signature])
 
     if os.path.exists(pdf_path):
         with open(pdf_path, 'rb') as f:
@@ -192,10 +160,19 @@ def generate_email(selected_row, excel_file_path, pdf_file_path, df_profs):
                 filename=os.path.basename(pdf_path)
             )
 
-    # Sauvegarde au format .emltpl
-    temp_eml_path = os.path.join(tempfile.gettempdir(), "email_coordonnees_prof.emltpl")
-    with open(temp_eml_path, "wb") as f:
-        f.write(bytes(msg))
+    file_name = f"Coordonnees_{selected_row['Prénom']}_{selected_row['Nom']}.emltpl".replace(" ", "_")
+    return file_name, bytes(msg)
+
+
+def generate_email(selected_row, excel_file_path, pdf_file_path, df_profs, sender_email=None, output_dir=None):
+    built = build_email(selected_row, excel_file_path, pdf_file_path, df_profs, sender_email)
+    if built is None:
+        return None
+
+    # Sauvegarde au format .emltpl, sous un nom unique (plusieurs sessions en parallèle)
+    with tempfile.NamedTemporaryFile(delete=False, dir=output_dir, prefix="email_coordonnees_prof_",
+                                     suffix=".emltpl", mode="wb") as f:
+        f.write(built[1])
 
     print("✅ Fichier .emltpl généré !")
-    return temp_eml_path
+    return f.name
@@ -0,0 +1,228 @@
+# email_templates.py
+"""
+Gabarits HTML des mails, compilés une fois à l'import.
+
+Chaque gabarit (syntaxe `string.Template` : $champ / ${champ}) est découpé
+en segments littéraux et en emplacements ; un rendu se résume à un
+`"".join` des segments avec les valeurs échappées (html.escape). Seules les
+valeurs marquées `SafeHtml` (signature, références cid) sont insérées telles
+quelles. Les signatures sont lues une fois par expéditeur et jointes en
+partie inline, référencée par cid: dans le corps (plus de data: URI).
+"""
+
+import os
+import html
+import base64
+from string import Template
+from email.utils import make_msgid
+from functools import lru_cache
+
+# Dossier des images de signature ("" = répertoire courant, comme avant)
+SIGNATURE_DIR = os.getenv("SIGNATURE_DIR", "")
+SIGNATURE_FILES = {
+    "idir": "Signature_idir.png",
+    "manon": "Signature_manon.png",
+    "lucas": "Signature_lucas.png",
+    "mathilde": "Signature_mathilde.png",
+}
+
+
+class SafeHtml(str):
+    """Valeur déjà au format HTML, insérée sans échappement."""
+
+
+class CompiledTemplate:
+    """Gabarit pré-découpé : segments littéraux aux positions paires, noms de champs aux positions impaires."""
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.parts = []
+        literal = []
+        last = 0
+        for m in Template.pattern.finditer(text):
+            literal.append(text[last:m.start()])
+            last = m.end()
+            if m.group("escaped") is not None:
+                literal.append("$")
+                continue
+            field = m.group("named") or m.group("braced")
+            if field is None:
+                raise ValueError(f"Gabarit '{name}' : emplacement invalide à la position {m.start()}")
+            self.parts.append("".join(literal))
+            self.parts.append(field)
+            literal = []
+        literal.append(text[last:])
+        self.parts.append("".join(literal))
+        self.fields = frozenset(self.parts[1::2])
+
+    def render(self, **values) -> str:
+        missing = self.fields.difference(values)
+        if missing:
+            raise KeyError(f"Gabarit '{self.name}' : champs manquants {sorted(missing)}")
+        out = list(self.parts)
+        for i in range(1, len(out), 2):
+            value = values[out[i]]
+            out[i] = value if isinstance(value, SafeHtml) else html.escape("" if value is None else str(value))
+        return "".join(out)
+
+
+# ---- Gabarits ----
+
+_TEMPLATES = {
+    # email_prof_eml.generate_email_html (aperçu + envoi Graph)
+    "prof_contact": """<html><body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+    <p>Bonjour !<br><br>
+    Comme convenu, voici toutes les informations pour organiser le premier cours d'essai avec ${eleve_prenom} :<br><br></p>
+
+    <p><b>📌 Informations de l'élève</b><br>
+    • Prénom & Nom : ${eleve_prenom} ${eleve_nom}<br>
+    • Classe : ${niveau}<br>
+    • Dispo et profil de l'élève : ${dispo}<br>
+    • Numéro de contact : ${telephone}<br>
+    • Adresse : ${adresse}<br><br></p>
+
+    <p><b>📌 Coordonnées du professeur</b><br>
+    • Nom du professeur : ${prof_prenom} ${prof_nom}<br>
+    • Numéro de téléphone : ${prof_numero}<br>
+    • Adresse e-mail : ${prof_mail}<br><br></p>
+
+    <p><b>📌 Organisation du premier échange</b><br>
+    ${prof_salutation}, je t'invite à contacter la famille afin de convenir ensemble d'un créneau pour le premier cours. Une fois l'échange téléphonique fait, merci de m'envoyer un SMS ou un mail pour me confirmer la date et l'heure du cours.<br><br></p>
+
+    <p><b>📌 Rappels importants</b><br>
+    • Le cours d'essai ne doit pas excéder 1h.<br>
+    • Après ce premier cours, nous allons vous contacter pour un rapide point par téléphone afin d'échanger sur ce cours d'essai.<br><br></p>
+
+    <p>N'hésitez surtout pas à me solliciter pour toute question.<br><br>
+    A très bientôt !<br><br>
+    ${signature}</p>
+</body></html>""",
+
+    # email_prof_eml.generate_email (.emltpl)
+    "prof_contact_eml": """<html><body>
+    Bonjour !<br><br>
+    Comme convenu, voici toutes les informations pour organiser le premier cours d'essai avec ${eleve_prenom} :<br><br>
+
+    <b>📌 Informations de l'élève</b><br>
+    • Prénom & Nom : ${eleve_prenom} ${eleve_nom}<br>
+    • Classe : ${niveau}<br>
+    • Dispo et profil de l'élève : ${dispo}<br>
+    • Numéro de contact : ${telephone}<br>
+    • Adresse : ${adresse}<br><br>
+
+    <b>📌 Coordonnées du professeur</b><br>
+    • Nom du professeur : ${prof_prenom} ${prof_nom}<br>
+    • Numéro de téléphone : ${prof_numero}<br>
+    • Adresse e-mail : ${prof_mail}<br><br>
+
+    <b>📌 Organisation du premier échange</b><br>
+    ${prof_prenom}, je t'invite à contacter la famille afin de convenir ensemble d'un créneau pour le premier cours. Une fois l'échange téléphonique fait, merci de m'envoyer un SMS ou un mail pour me confirmer la date et l'heure du cours.<br><br>
+
+    <b>📌 Rappels importants</b><br>
+    • Le cours d'essai ne doit pas excéder 1h.<br>
+    • Après ce premier cours, nous allons vous contacter pour un rapide point par téléphone afin d'échanger sur ce cours d'essai.<br><br>
+
+    N'hésitez surtout pas à me solliciter pour toute question.<br><br>
+    A très bientôt !<br><br>
+    ${signature}
+    </body></html>""",
+
+    # matching_eml.run_matching (proposition d'élève aux profs, en Cci)
+    "proposition": """<html><body>
+        Hello !<br><br>
+        C'est Idir de Study Success, j'espère que tu vas bien ! 😊<br>
+        Si tu reçois ce mail, c'est parce que tu corresponds parfaitement au profil recherché pour un(e) de nos élèves.<br><br>
+        📌 <b>Élève : ${eleve_prenom}</b><br>
+        • Classe : ${niveau}<br>
+        • Matière : ${matieres}<br>
+        • Dispos : ${dispo}<br>
+        • Adresse : ${adresse}<br><br>
+        Réponds simplement à ce mail si tu es dispo !<br><br>
+        À très vite,<br>Idir
+        </body></html>""",
+
+    # update_ppt_eml.update_ppt (résultats du test de profil)
+    "profil_results": """
+    <html>
+      <body>
+        Bonjour,<br><br>
+        Merci d'avoir complété le test de profil d'apprentissage de Study Success, voici les résultats :<br><br>
+        Voici les prochaines étapes :<br><br>
+        <img src="cid:${image_cid}"><br><br>
+        Merci pour votre confiance,<br>
+        Excellente journée,
+      </body>
+    </html>
+    """,
+}
+
+TEMPLATES = {name: CompiledTemplate(name, text) for name, text in _TEMPLATES.items()}
+
+
+def render(template_name: str, **values) -> str:
+    """Rendu d'un gabarit ; toutes les valeurs sont échappées sauf les `SafeHtml`."""
+    return TEMPLATES[template_name].render(**values)
+
+
+# ---- Signatures ----
+
+def signature_file(sender_email):
+    """Chemin de l'image de signature de l'expéditeur, ou None."""
+    if not sender_email:
+        return None
+    file_name = SIGNATURE_FILES.get(sender_email.split('.')[0].lower())
+    if not file_name:
+        return None
+    path = os.path.join(SIGNATURE_DIR, file_name)
+    return path if os.path.exists(path) else None
+
+
+@lru_cache(maxsize=None)
+def _signature_part_for_file(path: str):
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+    except Exception as e:
+        print(f"Erreur lecture signature {path}: {e}")
+        return None
+    return {
+        "name": os.path.basename(path),
+        "content_id": make_msgid(domain="studysuccess.local")[1:-1],
+        "content_type": "image/png",
+        "content": content,
+        "content_b64": base64.b64encode(content).decode('utf-8'),
+    }
+
+
+def signature_part(sender_email):
+    """
+    Image de signature de l'expéditeur, à joindre en partie inline (cid:),
+    ou None. Lue et encodée une fois par fichier ; le dict est partagé,
+    ne pas le modifier.
+    Clés : name, content_id, content_type, content (bytes), content_b64.
+    """
+    path = signature_file(sender_email)
+    return _signature_part_for_file(path) if path else None
+
+
+def signature_html(sender_email) -> SafeHtml:
+    """HTML de la signature, qui référence l'image jointe (signature_part) par son cid."""
+    part = signature_part(sender_email)
+    if not part:
+        return SafeHtml("")
+    # Image référencée par cid avec tirets avant
+    return SafeHtml(f"""--<br><img src="cid:{part['content_id']}" style="max-width: 350px; margin-top: 10px;" alt="Signature">""")
+
+
+def attach_inline_images(msg, images):
+    """Ajoute des images (dicts au format de signature_part) en parties liées du corps HTML d'un EmailMessage."""
+    body = msg.get_body(preferencelist=("html",))
+    for image in images or []:
+        maintype, subtype = image["content_type"].split("/")
+        body.add_related(image["content"], maintype=maintype, subtype=subtype,
+                         cid=f"<{image['content_id']}>", filename=image["name"])
+
+
+def clear_signature_cache():
+    """À appeler si une image de signature est remplacée sur disque."""
+    _signature_part_for_file.cache_clear()
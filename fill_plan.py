@@ -0,0 +1,130 @@
+# fill_plan.py
+"""
+Plan de remplissage du modèle PPTX de profil.
+
+Les zones à remplir sont repérées une fois par fichier modèle (hash SHA-256) :
+- par le nom de la forme (volet Sélection de PowerPoint) = nom de la zone ;
+- ou par une balise dans son texte, ex. « {{nom_eleve}} ».
+Un modèle sans aucun nom ni balise est lu avec les index historiques
+(slide 1, formes 1..10), après contrôle que ces formes existent et portent
+du texte. Un modèle partiellement balisé est refusé : mieux vaut une erreur
+qu'un deck rempli au mauvais endroit.
+"""
+
+import io
+import re
+import hashlib
+import threading
+
+from pptx import Presentation
+
+# zones du modèle -> index historique de la forme sur la 1re slide
+SLOTS = {
+    "nom_eleve": 10,
+    "style_visuel_verbal": 1,
+    "style_sensoriel_intuitif": 2,
+    "style_actif_reflexif": 3,
+    "style_sequentiel_global": 7,
+    "desc_visuel_verbal": 4,
+    "desc_sensoriel_intuitif": 5,
+    "desc_sequentiel_global": 6,
+    "desc_actif_reflexif": 9,
+}
+
+TAG_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+_lock = threading.Lock()
+_plans = {}  # sha256 du modèle -> FillPlan
+
+
+class FillPlan:
+    """Zone -> (index de slide, index de forme), résolu une fois par modèle."""
+
+    def __init__(self, targets: dict, source: str):
+        self.targets = targets
+        self.source = source  # "noms", "balises" ou "index"
+        self.slides = sorted({slide for slide, _ in targets.values()})
+
+    def apply(self, prs, texts: dict):
+        """Écrit `texts` ({zone: texte}) dans une copie du modèle."""
+        unknown = set(texts) - set(self.targets)
+        if unknown:
+            raise KeyError(f"Zones absentes du plan : {sorted(unknown)}")
+        # une seule énumération des formes par slide, puis accès direct
+        shapes = {i: list(prs.slides[i].shapes) for i in self.slides}
+        for slot, text in texts.items():
+            slide, index = self.targets[slot]
+            _set_text(shapes[slide][index], text)
+
+
+def _set_text(shape, text):
+    """Remplace le texte en gardant la mise en forme du premier run de chaque paragraphe."""
+    for paragraph in shape.text_frame.paragraphs:
+        runs = paragraph.runs
+        if runs:
+            runs[0].text = text
+            for run in runs[1:]:
+                run.text = ''
+        else:
+            paragraph.text = text
+
+
+def compile_plan(prs) -> FillPlan:
+    """
+    Résout les zones de SLOTS dans une présentation ouverte ; lève ValueError si
+    incohérent, ou si une forme nommée comme une zone ne porte pas de texte
+    (image, tableau...).
+    """
+    by_name, by_tag, not_text = {}, {}, []
+    for s, slide in enumerate(prs.slides):
+        for i, shape in enumerate(slide.shapes):
+            if shape.name in SLOTS:
+                if not shape.has_text_frame:
+                    not_text.append(f"{shape.name} (slide {s + 1})")
+                    continue
+                by_name.setdefault(shape.name, []).append((s, i))
+            if shape.has_text_frame:
+                for tag in TAG_PATTERN.findall(shape.text_frame.text):
+                    if tag in SLOTS:
+                        by_tag.setdefault(tag, []).append((s, i))
+
+    if not_text:
+        raise ValueError(f"Modèle PPTX incohérent : formes sans texte nommées comme des zones {not_text}")
+
+    for source, found in (("noms", by_name), ("balises", by_tag)):
+        if not found:
+            continue
+        missing = sorted(set(SLOTS) - set(found))
+        duplicated = sorted(slot for slot, where in found.items() if len(where) > 1)
+        if missing or duplicated:
+            raise ValueError(
+                f"Modèle PPTX incohérent (repérage par {source}) : "
+                f"zones manquantes {missing}, zones en double {duplicated}"
+            )
+        return FillPlan({slot: where[0] for slot, where in found.items()}, source)
+
+    # Modèle historique : index fixes, vérifiés
+    shapes = list(prs.slides[0].shapes) if len(prs.slides) else []
+    bad = sorted(slot for slot, index in SLOTS.items()
+                 if index >= len(shapes) or not shapes[index].has_text_frame)
+    if bad:
+        raise ValueError(
+            f"Modèle PPTX non reconnu : ni noms ni balises de zones, et les index historiques "
+            f"ne correspondent pas ({len(shapes)} forme(s) sur la 1re slide ; zones {bad})"
+        )
+    print("[DEBUG] Modèle PPTX sans noms de zones : index historiques utilisés")
+    return FillPlan({slot: (0, index) for slot, index in SLOTS.items()}, "index")
+
+
+def get_fill_plan(template_bytes: bytes, prs=None) -> FillPlan:
+    """Plan du modèle, mis en cache par hash de son contenu. `prs` : le modèle déjà ouvert, si dispo."""
+    digest = hashlib.sha256(template_bytes).hexdigest()
+    with _lock:
+        plan = _plans.get(digest)
+    if plan is None:
+        if prs is None:
+            prs = Presentation(io.BytesIO(template_bytes))
+        plan = compile_plan(prs)
+        with _lock:
+            _plans[digest] = plan
+    return plan
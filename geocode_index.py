@@ -0,0 +1,188 @@
+# geocode_index.py
+"""
+Index des coordonnées (lat, lng) des adresses profs, persisté en JSON.
+
+Construit au chargement de Contact_Profs.xlsx (build_geocode_index), puis
+rafraîchi seulement quand les adresses du roster changent (empreinte de
+l'ensemble des adresses). run_matching ne fait que le lire.
+Sert au préfiltre à vol d'oiseau de run_matching : seuls les K profs les plus
+proches partent en calcul de trajet Google Maps.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from travel_cache import normalize_address
+from tracing import span
+
+EARTH_RADIUS_KM = 6371.0088
+# erreur temporaire (réseau, quota...) : rien n'est mémorisé, l'adresse sera redemandée
+GEOCODE_ERROR = object()
+
+
+def haversine_km(origin, coords: np.ndarray) -> np.ndarray:
+    """Distances (km) entre `origin` (lat, lng) et un tableau (n, 2) de coordonnées."""
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    lat1, lng1 = np.radians(origin[0]), np.radians(origin[1])
+    lat2, lng2 = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _geocode(gmaps_client, address: str):
+    """
+    [lat, lng] ; None si l'adresse est introuvable (ZERO_RESULTS : liste vide) ;
+    GEOCODE_ERROR si l'appel a échoué (réseau, OVER_QUERY_LIMIT...).
+    """
+    try:
+        with span("maps.geocode"):
+            results = gmaps_client.geocode(address)
+    except Exception as e:
+        print(f"[DEBUG] Géocodage impossible pour '{address}': {e}")
+        return GEOCODE_ERROR
+    if results:
+        loc = results[0]["geometry"]["location"]
+        return [float(loc["lat"]), float(loc["lng"])]
+    return None
+
+
+class GeocodeIndex:
+    """
+    Coordonnées des adresses profs (`teachers`) et des adresses élèves déjà
+    rencontrées (`origins`). Une adresse introuvable est mémorisée à None pour
+    ne pas être redemandée tant qu'elle ne change pas ; une adresse en erreur
+    n'est pas mémorisée et sera redemandée au prochain appel.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fingerprint = ""
+        self.teachers = {}
+        self.origins = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.fingerprint = data.get("fingerprint", "")
+                self.teachers = data.get("teachers", {})
+                self.origins = data.get("origins", {})
+            except Exception as e:
+                print(f"[DEBUG] Index géocodage illisible, reconstruction: {e}")
+
+    @staticmethod
+    def roster_fingerprint(addresses) -> str:
+        keys = sorted({normalize_address(a) for a in addresses if pd.notna(a) and str(a).strip()})
+        return hashlib.sha1("\n".join(keys).encode("utf-8")).hexdigest()
+
+    def refresh(self, addresses, gmaps_client, max_workers: int = 8) -> int:
+        """
+        Met l'index à jour pour les adresses du roster.
+        Ne fait rien si l'ensemble des adresses n'a pas changé ; sinon ne
+        géocode que les nouvelles adresses et oublie celles qui ont disparu.
+        Si des géocodages échouent, l'empreinte n'est pas enregistrée : les
+        adresses manquantes sont redemandées au prochain appel.
+        Retourne le nombre d'adresses géocodées.
+        """
+        addresses = [str(a).strip() for a in addresses if pd.notna(a) and str(a).strip()]
+        fingerprint = self.roster_fingerprint(addresses)
+        if fingerprint == self.fingerprint:
+            return 0
+
+        by_key = {normalize_address(a): a for a in addresses}
+        missing = [k for k in by_key if k not in self.teachers]
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            coords = list(executor.map(lambda k: _geocode(gmaps_client, by_key[k]), missing))
+
+        done = {k: c for k, c in zip(missing, coords) if c is not GEOCODE_ERROR}
+        failed = len(missing) - len(done)
+        with self._lock:
+            self.teachers = {k: self.teachers.get(k) for k in by_key if k in self.teachers}
+            self.teachers.update(done)
+            self.fingerprint = fingerprint if not failed else ""
+        self.save()
+        print(f"[DEBUG] Index géocodage: {len(done)} adresse(s) géocodée(s), {len(by_key)} au total"
+              + (f", {failed} en erreur (à retenter)" if failed else ""))
+        return len(done)
+
+    def locate(self, address: str, gmaps_client=None):
+        """Coordonnées d'une adresse (prof ou élève) ; géocode et mémorise si besoin."""
+        key = normalize_address(address)
+        if key in self.teachers:
+            return self.teachers[key]
+        if key in self.origins:
+            return self.origins[key]
+        if gmaps_client is None:
+            return None
+        coords = _geocode(gmaps_client, address)
+        if coords is GEOCODE_ERROR:
+            return None
+        with self._lock:
+            self.origins[key] = coords
+        self.save()
+        return coords
+
+    def coordinates(self, addresses) -> np.ndarray:
+        """Tableau (n, 2) aligné sur `addresses` ; NaN si coordonnées inconnues."""
+        out = np.full((len(addresses), 2), np.nan)
+        for i, a in enumerate(addresses):
+            if pd.notna(a):
+                coords = self.teachers.get(normalize_address(a))
+                if coords:
+                    out[i] = coords
+        return out
+
+    def pending(self, addresses) -> np.ndarray:
+        """Masque des adresses pas encore géocodées (index pas à jour, ou erreur temporaire)."""
+        return np.array([pd.notna(a) and normalize_address(a) not in self.teachers for a in addresses], dtype=bool)
+
+    def save(self):
+        with self._lock:
+            data = {"fingerprint": self.fingerprint, "teachers": self.teachers, "origins": self.origins}
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                print(f"[DEBUG] Sauvegarde index géocodage impossible: {e}")
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_geocode_index() -> GeocodeIndex:
+    """Index partagé par le process (chemin : GEOCODE_INDEX_PATH, sinon dossier temporaire)."""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            path = os.getenv("GEOCODE_INDEX_PATH") or os.path.join(
+                tempfile.gettempdir(), "study_success_geocode_index.json"
+            )
+            _default_index = GeocodeIndex(path)
+        return _default_index
+
+
+def build_geocode_index(profs, gmaps_client, index: GeocodeIndex | None = None,
+                        address_col: str = "adresse", sheet_name: str = "Liste profs") -> GeocodeIndex:
+    """
+    Construit / rafraîchit l'index à partir du roster : DataFrame déjà chargé,
+    ou chemin de Contact_Profs.xlsx (feuille `sheet_name`). À appeler au
+    chargement du roster ; run_matching ne fait que lire l'index.
+    """
+    index = index or get_geocode_index()
+    if isinstance(profs, pd.DataFrame):
+        addresses = profs[address_col]
+    else:
+        addresses = pd.read_excel(profs, sheet_name=sheet_name, usecols=[address_col])[address_col]
+    index.refresh(addresses, gmaps_client)
+    return index
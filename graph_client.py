@@ -0,0 +1,271 @@
+# graph_client.py
+"""
+Client Microsoft Graph partagé par Graph_Api (SharePoint) et
+send_mail_streamlit (envoi de mails).
+
+- une seule app MSAL, avec cache de tokens en mémoire + sérialisé sur disque ;
+  le token est renouvelé juste avant son expiration ;
+- une `requests.Session` poolée (keep-alive, pas de nouvelle poignée de
+  main TLS à chaque appel) ;
+- retries avec backoff sur 429 / 5xx, en respectant l'en-tête Retry-After.
+"""
+
+import os
+import time
+import random
+import tempfile
+import threading
+
+import msal
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from dotenv import load_dotenv
+
+from tracing import span, count
+
+load_dotenv()
+
+GRAPH_URL = "https://graph.microsoft.com/v1.0"
+SCOPES = ["https://graph.microsoft.com/.default"]
+
+# Identifiants Azure AD - variables d'environnement
+TENANT_ID = os.getenv("TENANT_ID", "")
+CLIENT_ID = os.getenv("CLIENT_ID", "")
+CERT_THUMBPRINT = os.getenv("CERT_THUMBPRINT", "")
+CLIENT_SECRET = os.getenv("CLIENT_SECRET", "")
+
+
+def _read_private_key():
+    """Clé privée du certificat : CERT_PRIVATE_KEY, PRIVATE_KEY, ou fichier CERT_PRIVATE_KEY_PATH."""
+    key = os.getenv("CERT_PRIVATE_KEY") or os.getenv("PRIVATE_KEY")
+    if key:
+        return key
+    try:
+        with open(os.getenv("CERT_PRIVATE_KEY_PATH", "mailer.key"), "r") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+PRIVATE_KEY = _read_private_key()
+
+TOKEN_CACHE_PATH = os.getenv("GRAPH_TOKEN_CACHE_PATH") or os.path.join(
+    tempfile.gettempdir(), "study_success_msal_cache.json"
+)
+# Renouveler le token quand il expire dans moins de ... secondes
+TOKEN_REFRESH_MARGIN = 300
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# POST non idempotent (sendMail) : on ne retente que ce que Graph n'a pas traité
+RETRY_STATUSES_POST = {429, 503}
+
+_lock = threading.Lock()
+_token_cache = msal.SerializableTokenCache()
+_app = None
+_token = None
+_token_expires_at = 0.0
+_session = None
+
+
+def _load_token_cache():
+    try:
+        with open(TOKEN_CACHE_PATH, "r") as f:
+            _token_cache.deserialize(f.read())
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[DEBUG] Cache de tokens illisible: {e}")
+
+
+def _save_token_cache():
+    if not _token_cache.has_state_changed:
+        return
+    try:
+        tmp_path = f"{TOKEN_CACHE_PATH}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(_token_cache.serialize())
+        os.replace(tmp_path, TOKEN_CACHE_PATH)
+        _token_cache.has_state_changed = False
+    except Exception as e:
+        print(f"[DEBUG] Sauvegarde du cache de tokens impossible: {e}")
+
+
+def create_msal_app():
+    """Crée une app MSAL avec certificat ou, à défaut, secret client."""
+    if not (TENANT_ID and CLIENT_ID):
+        print("[DEBUG] TENANT_ID / CLIENT_ID manquants")
+        return None
+
+    authority = f"https://login.microsoftonline.com/{TENANT_ID}"
+    _load_token_cache()
+
+    if PRIVATE_KEY and CERT_THUMBPRINT:
+        try:
+            app = msal.ConfidentialClientApplication(
+                client_id=CLIENT_ID,
+                authority=authority,
+                client_credential={
+                    "thumbprint": CERT_THUMBPRINT,
+                    "private_key": PRIVATE_KEY,
+                },
+                token_cache=_token_cache,
+            )
+            print("[DEBUG] App MSAL créée avec certificat")
+            return app
+        except Exception as e:
+            print(f"[DEBUG] Erreur avec certificat: {e}")
+
+    if CLIENT_SECRET:
+        try:
+            app = msal.ConfidentialClientApplication(
+                client_id=CLIENT_ID,
+                authority=authority,
+                client_credential=CLIENT_SECRET,
+                token_cache=_token_cache,
+            )
+            print("[DEBUG] App MSAL créée avec secret")
+            return app
+        except Exception as e:
+            print(f"[DEBUG] Erreur avec secret: {e}")
+
+    print("[DEBUG] Impossible de créer une app MSAL")
+    return None
+
+
+def get_msal_app():
+    """App MSAL partagée (créée au premier appel)."""
+    global _app
+    with _lock:
+        if _app is None:
+            _app = create_msal_app()
+        return _app
+
+
+def get_token(force_refresh: bool = False):
+    """Token d'accès Microsoft Graph, servi depuis la mémoire tant qu'il est valide."""
+    global _token, _token_expires_at
+    app = get_msal_app()
+    if not app:
+        return None
+
+    with _lock:
+        now = time.time()
+        if not force_refresh and _token and now < _token_expires_at - TOKEN_REFRESH_MARGIN:
+            count("graph.token_memoire")
+            return _token
+        try:
+            with span("graph.token", renouvellement=bool(_token), force=force_refresh):
+                if _token:
+                    # le token en cache MSAL expire bientôt : on force un renouvellement
+                    app.remove_tokens_for_client()
+                result = app.acquire_token_for_client(scopes=SCOPES)
+        except Exception as e:
+            print(f"❌ Erreur lors de l'acquisition du token: {e}")
+            return None
+        if "access_token" not in result:
+            print(f"❌ Erreur d'authentification: {result.get('error_description', 'Unknown error')}")
+            return None
+        _token = result["access_token"]
+        _token_expires_at = now + int(result.get("expires_in", 3599))
+        _save_token_cache()
+        return _token
+
+
+def get_session() -> requests.Session:
+    """Session HTTP poolée partagée (keep-alive)."""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+class NotSentError(RuntimeError):
+    """Échec survenu avant l'envoi effectif : rien n'est parti, renvoi sans risque de doublon."""
+
+
+class TokenError(NotSentError):
+    """Pas de token Microsoft Graph : la requête n'a pas été envoyée."""
+
+
+def not_sent(exc: Exception) -> bool:
+    """
+    True si `exc` (levée par `request`) est survenue avant l'envoi de la
+    requête (pas de token, connexion impossible) : un POST peut être renvoyé
+    sans risque de doublon. Sinon (timeout de lecture, connexion coupée),
+    Graph a pu le traiter.
+    """
+    if isinstance(exc, (NotSentError, requests.ConnectTimeout)):
+        return True
+    if isinstance(exc, requests.ConnectionError):
+        reason = getattr(exc.args[0], "reason", None) if exc.args else None
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+def _retry_delay(response, attempt: int) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * (0.5 + random.random() / 2)
+
+
+def request(method: str, url: str, auth: bool = True, retries: int = MAX_RETRIES, **kwargs):
+    """
+    Requête Graph via la session partagée.
+    `url` absolue ou relative à GRAPH_URL ; `auth=False` pour les URL
+    pré-authentifiées (téléchargement, session d'upload).
+    Retourne la dernière `requests.Response` ; lève sur erreur réseau persistante.
+    """
+    if not url.startswith("http"):
+        url = f"{GRAPH_URL}/{url.lstrip('/')}"
+    method = method.upper()
+    retry_statuses = RETRY_STATUSES_POST if method == "POST" else RETRY_STATUSES
+    headers = dict(kwargs.pop("headers", None) or {})
+    kwargs.setdefault("timeout", 60)
+    session = get_session()
+    refreshed = False
+
+    for attempt in range(retries + 1):
+        if auth:
+            token = get_token()
+            if not token:
+                raise TokenError("Impossible d'obtenir un token Microsoft Graph")
+            headers["Authorization"] = f"Bearer {token}"
+        count("graph.requetes")
+        try:
+            response = session.request(method, url, headers=headers, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retries or method == "POST":
+                raise
+            delay = _retry_delay(None, attempt)
+            print(f"[DEBUG] {method} {url} : {e} — nouvel essai dans {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if response.status_code == 401 and auth and not refreshed:
+            response.close()  # rend la connexion au pool (stream=True)
+            get_token(force_refresh=True)  # token révoqué / expiré côté serveur
+            refreshed = True
+            continue
+        if response.status_code in retry_statuses and attempt < retries:
+            count(f"graph.http_{response.status_code}")
+            delay = _retry_delay(response, attempt)
+            response.close()
+            print(f"[DEBUG] {method} {url} : HTTP {response.status_code} — nouvel essai dans {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        return response
+    return response
@@ -0,0 +1,324 @@
+# mail_outbox.py
+"""
+File d'envoi durable (SQLite) pour les mails Microsoft Graph.
+
+`enqueue_mail` écrit le message sur disque et rend la main tout de suite ;
+un worker en arrière-plan vide la file avec une concurrence bornée, un débit
+limité par expéditeur et des renvois à backoff exponentiel. Le statut de
+chaque message (queued / sending / sent / failed / uncertain) peut être
+interrogé par l'UI.
+
+Ne sont renvoyés automatiquement que les échecs sans risque de doublon :
+429 / 503 (Graph n'a pas traité la requête) et les erreurs survenues avant
+l'envoi (token, connexion impossible). Une erreur pendant l'envoi (timeout,
+connexion coupée) ou un message resté « sending » après un redémarrage passe
+en « uncertain » : le mail a pu partir, seul l'utilisateur peut décider de
+le renvoyer (`requeue`).
+
+Le worker envoie message par message (send_mail) plutôt que par $batch : le
+débit par expéditeur (SENDER_MIN_INTERVAL) espace de toute façon les envois
+d'une même boîte, et la file ne reçoit que les mails envoyés un à un depuis
+l'app. Les envois groupés de l'app (mandats, coordonnées aux profs de la
+répartition du jour) passent par send_mail_batch, avec barre de progression.
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+OUTBOX_PATH = os.getenv("MAIL_OUTBOX_PATH") or os.path.join(
+    tempfile.gettempdir(), "study_success_outbox.sqlite"
+)
+MAX_CONCURRENCY = int(os.getenv("MAIL_OUTBOX_CONCURRENCY", "4"))
+# Exchange Online : ~30 messages / minute / boîte d'envoi
+SENDER_MIN_INTERVAL = float(os.getenv("MAIL_OUTBOX_SENDER_INTERVAL", "2.0"))
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 5.0
+BACKOFF_MAX = 600.0
+POLL_INTERVAL = 1.0
+# statuts HTTP à renvoyer plus tard : Graph n'a pas traité le POST
+# (None : erreur avant l'envoi, token ou connexion ; cf. "uncertain" sinon)
+RETRYABLE_STATUSES = {None, 429, 503}
+
+
+def _connect(path: str):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+_initialized = set()
+
+
+def init_outbox(path: str = OUTBOX_PATH):
+    if path in _initialized:
+        return
+    with _connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS outbox (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   from_email TEXT NOT NULL,
+                   to_email TEXT NOT NULL,
+                   subject TEXT NOT NULL,
+                   html_body TEXT NOT NULL,
+                   cc TEXT,
+                   bcc TEXT,
+                   status TEXT NOT NULL DEFAULT 'queued',
+                   attempts INTEGER NOT NULL DEFAULT 0,
+                   next_attempt_at REAL NOT NULL,
+                   last_error TEXT,
+                   created_at REAL NOT NULL,
+                   updated_at REAL NOT NULL
+               )"""
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS outbox_attachments (
+                   message_id INTEGER NOT NULL REFERENCES outbox(id),
+                   position INTEGER NOT NULL,
+                   name TEXT NOT NULL,
+                   content BLOB NOT NULL,
+                   content_id TEXT,
+                   content_type TEXT,
+                   PRIMARY KEY (message_id, position)
+               )"""
+        )
+        # files créées avant les images inline (cid:)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(outbox_attachments)")}
+        for column in ("content_id", "content_type"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE outbox_attachments ADD COLUMN {column} TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+    _initialized.add(path)
+
+
+def _attachment_bytes(content) -> bytes:
+    """Contenu d'une pièce jointe (bytes, ou chemin d'un fichier à copier dans la file)."""
+    if isinstance(content, (bytes, bytearray)):
+        return bytes(content)
+    with open(content, "rb") as f:
+        return f.read()
+
+
+def enqueue_mail(to_email, subject, html_body, from_email, cc=None, bcc=None, attachments=None,
+                 path: str = OUTBOX_PATH, inline_images=None) -> int:
+    """
+    Ajoute un message à la file ; retourne son identifiant.
+    Les images inline (cid:) sont stockées avec les pièces jointes, avec leur content_id.
+    """
+    init_outbox(path)
+    now = time.time()
+    with _connect(path) as conn:
+        cur = conn.execute(
+            """INSERT INTO outbox (from_email, to_email, subject, html_body, cc, bcc,
+                                   status, attempts, next_attempt_at, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, 'queued', 0, ?, ?, ?)""",
+            (from_email, to_email, subject, html_body, json.dumps(cc), json.dumps(bcc), now, now, now),
+        )
+        message_id = cur.lastrowid
+        position = 0
+        for position, (filename, content) in enumerate(attachments or [], start=1):
+            conn.execute(
+                "INSERT INTO outbox_attachments VALUES (?, ?, ?, ?, NULL, NULL)",
+                (message_id, position, filename, sqlite3.Binary(_attachment_bytes(content))),
+            )
+        for offset, image in enumerate(inline_images or [], start=position + 1):
+            conn.execute(
+                "INSERT INTO outbox_attachments VALUES (?, ?, ?, ?, ?, ?)",
+                (message_id, offset, image["name"], sqlite3.Binary(image["content"]),
+                 image["content_id"], image["content_type"]),
+            )
+    return message_id
+
+
+def get_status(message_id: int, path: str = OUTBOX_PATH):
+    """Statut d'un message : dict (id, status, attempts, last_error, ...) ou None."""
+    init_outbox(path)
+    with _connect(path) as conn:
+        row = conn.execute(
+            """SELECT id, from_email, to_email, subject, status, attempts, last_error,
+                      created_at, updated_at FROM outbox WHERE id=?""",
+            (message_id,),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def get_statuses(message_ids, path: str = OUTBOX_PATH) -> list:
+    """Statuts de plusieurs messages, dans l'ordre des identifiants."""
+    return [s for s in (get_status(i, path) for i in message_ids) if s]
+
+
+def requeue(message_id: int, path: str = OUTBOX_PATH) -> bool:
+    """Remet en file un message « uncertain » ou « failed » (renvoi décidé par l'utilisateur)."""
+    init_outbox(path)
+    now = time.time()
+    with _connect(path) as conn:
+        updated = conn.execute(
+            """UPDATE outbox SET status='queued', next_attempt_at=?, updated_at=?
+               WHERE id=? AND status IN ('uncertain', 'failed')""",
+            (now, now, message_id),
+        ).rowcount
+    return bool(updated)
+
+
+class OutboxWorker:
+    """Vide la file en arrière-plan (thread démon)."""
+
+    def __init__(self, send_func, path: str = OUTBOX_PATH, max_concurrency: int = MAX_CONCURRENCY,
+                 sender_min_interval: float = SENDER_MIN_INTERVAL):
+        self.send_func = send_func
+        self.path = path
+        self.max_concurrency = max(1, max_concurrency)
+        self.sender_min_interval = sender_min_interval
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="outbox")
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._next_slot = {}  # expéditeur -> prochain envoi autorisé
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        init_outbox(self.path)
+        with _connect(self.path) as conn:  # arrêt brutal pendant l'envoi : le mail a pu partir
+            conn.execute(
+                """UPDATE outbox SET status='uncertain', last_error=?, updated_at=? WHERE status='sending'""",
+                ("⚠️ Interrompu pendant l'envoi (redémarrage) : le mail a pu partir", time.time()),
+            )
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="mail-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def notify(self):
+        """Réveille le worker (nouveau message en file)."""
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._dispatch()
+            except Exception as e:
+                print(f"❌ Erreur file d'envoi: {e}")
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def _claim(self, limit: int) -> list:
+        """Passe en 'sending' au plus `limit` messages dus, en respectant le débit par expéditeur."""
+        now = time.time()
+        claimed = []
+        with _connect(self.path) as conn:
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE status='queued' AND next_attempt_at<=? ORDER BY next_attempt_at, id",
+                (now,),
+            ).fetchall()
+            for row in rows:
+                if len(claimed) >= limit:
+                    break
+                sender = row["from_email"]
+                if self._next_slot.get(sender, 0) > now:
+                    continue
+                updated = conn.execute(
+                    "UPDATE outbox SET status='sending', updated_at=? WHERE id=? AND status='queued'",
+                    (now, row["id"]),
+                ).rowcount
+                if updated:
+                    self._next_slot[sender] = now + self.sender_min_interval
+                    claimed.append(dict(row))
+        return claimed
+
+    def _dispatch(self):
+        with self._in_flight_lock:
+            free = self.max_concurrency - self._in_flight
+        if free <= 0:
+            return
+        for row in self._claim(free):
+            with self._in_flight_lock:
+                self._in_flight += 1
+            self._executor.submit(self._deliver, row)
+
+    def _deliver(self, row: dict):
+        try:
+            attachments, inline_images = [], []
+            with _connect(self.path) as conn:
+                for a in conn.execute(
+                    """SELECT name, content, content_id, content_type FROM outbox_attachments
+                       WHERE message_id=? ORDER BY position""",
+                    (row["id"],),
+                ):
+                    if a["content_id"]:
+                        inline_images.append({"name": a["name"], "content": bytes(a["content"]),
+                                              "content_id": a["content_id"], "content_type": a["content_type"]})
+                    else:
+                        attachments.append((a["name"], bytes(a["content"])))
+            try:
+                result = self.send_func(
+                    row["to_email"], row["subject"], row["html_body"], row["from_email"],
+                    cc=json.loads(row["cc"]), bcc=json.loads(row["bcc"]), attachments=attachments or None,
+                    inline_images=inline_images or None,
+                )
+            except Exception as e:
+                result = {"success": False, "message": f"⚠️ Envoi incertain: {e}", "status_code": None,
+                          "uncertain": True}
+            self._record(row, result)
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+            self._wake.set()
+
+    def _record(self, row: dict, result: dict):
+        now = time.time()
+        attempts = row["attempts"] + 1
+        with _connect(self.path) as conn:
+            if result.get("success"):
+                conn.execute(
+                    "UPDATE outbox SET status='sent', attempts=?, last_error=NULL, updated_at=? WHERE id=?",
+                    (attempts, now, row["id"]),
+                )
+                return
+            if result.get("uncertain"):
+                conn.execute(
+                    "UPDATE outbox SET status='uncertain', attempts=?, last_error=?, updated_at=? WHERE id=?",
+                    (attempts, result.get("message"), now, row["id"]),
+                )
+                return
+            retryable = result.get("status_code") in RETRYABLE_STATUSES and attempts < MAX_ATTEMPTS
+            if retryable:
+                delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX) * (0.5 + random.random() / 2)
+                conn.execute(
+                    """UPDATE outbox SET status='queued', attempts=?, last_error=?, next_attempt_at=?,
+                              updated_at=? WHERE id=?""",
+                    (attempts, result.get("message"), now + delay, now, row["id"]),
+                )
+                print(f"[DEBUG] Mail {row['id']} : nouvel essai dans {delay:.0f}s ({result.get('message')})")
+            else:
+                conn.execute(
+                    "UPDATE outbox SET status='failed', attempts=?, last_error=?, updated_at=? WHERE id=?",
+                    (attempts, result.get("message"), now, row["id"]),
+                )
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_worker(send_func=None) -> OutboxWorker:
+    """Worker partagé par le process, démarré au premier appel."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            if send_func is None:
+                from send_mail_streamlit import send_mail as send_func
+            _worker = OutboxWorker(send_func)
+        _worker.start()
+        return _worker
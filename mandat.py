@@ -1,18 +1,13 @@
 import os
+import html
 import tempfile
 import pandas as pd
 from email.message import EmailMessage
 import mimetypes
 
-def generate_mandat_email(selected_row, mandat_pdf_path):
-    email = selected_row.get('Mail')
-    if not email or pd.isna(email):
-        raise ValueError("Adresse e-mail invalide ou manquante pour l'élève.")
-
-    msg = EmailMessage()
-    msg['To'] = email
-    msg['Subject'] = "📄 Signature du mandat - Study Success"
-    msg.set_content("""Bonjour,
+MANDAT_PDF_NAME = "Mandat Study Success_ Particulier Employeur.pdf"
+MANDAT_SUBJECT = "📄 Signature du mandat - Study Success"
+MANDAT_BODY = """Bonjour,
 
 J'espère que vous allez bien.  
 Pour commencer les cours de manière légale, nous avons besoin que vous remplissiez et signiez le mandat ci-joint.
@@ -21,24 +16,61 @@ Comme expliqué, il ne vous engage à rien après cette première heure de cours
 
 Bien à vous,  
 L'équipe Study Success
-""")
+"""
+
+
+def build_mandat_email(selected_row, mandat_pdf_bytes, pdf_mime_type=None):
+    """
+    Message .emltpl (bytes) du mandat pour un élève.
+    `mandat_pdf_bytes` : contenu du PDF, lu une fois par l'appelant et
+    réutilisé pour tous les élèves (export groupé).
+    """
+    email = selected_row.get('Mail')
+    if not email or pd.isna(email):
+        raise ValueError("Adresse e-mail invalide ou manquante pour l'élève.")
+
+    msg = EmailMessage()
+    msg['To'] = email
+    msg['Subject'] = MANDAT_SUBJECT
+    msg.set_content(MANDAT_BODY)
 
     # Joindre le PDF avec nom personnalisé
-    if os.path.isfile(mandat_pdf_path):
-        with open(mandat_pdf_path, 'rb') as f:
-            file_data = f.read()
-            mime_type, _ = mimetypes.guess_type(mandat_pdf_path)
-            maintype, subtype = mime_type.split('/') if mime_type else ('application', 'pdf')
-            msg.add_attachment(
-                file_data,
-                maintype=maintype,
-                subtype=subtype,
-                filename="Mandat Study Success_ Particulier Employeur.pdf"
-            )
-    else:
+    maintype, subtype = pdf_mime_type.split('/') if pdf_mime_type else ('application', 'pdf')
+    msg.add_attachment(
+        mandat_pdf_bytes,
+        maintype=maintype,
+        subtype=subtype,
+        filename=MANDAT_PDF_NAME
+    )
+    return bytes(msg)
+
+
+def mandat_message(selected_row, mandat_pdf_bytes, from_email):
+    """Mandat d'un élève au format de send_mail / send_mail_batch (envoi direct, sans .emltpl)."""
+    email = selected_row.get('Mail')
+    if not email or pd.isna(email):
+        raise ValueError("Adresse e-mail invalide ou manquante pour l'élève.")
+    return {
+        "to_email": email,
+        "subject": MANDAT_SUBJECT,
+        "html_body": html.escape(MANDAT_BODY, quote=False).replace("\n", "<br>\n"),
+        "from_email": from_email,
+        "attachments": [(MANDAT_PDF_NAME, mandat_pdf_bytes)],
+    }
+
+
+def generate_mandat_email(selected_row, mandat_pdf_path):
+    email = selected_row.get('Mail')
+    if not email or pd.isna(email):
+        raise ValueError("Adresse e-mail invalide ou manquante pour l'élève.")
+
+    if not os.path.isfile(mandat_pdf_path):
         raise FileNotFoundError(f"Fichier non trouvé : {mandat_pdf_path}")
+    with open(mandat_pdf_path, 'rb') as f:
+        file_data = f.read()
+    mime_type, _ = mimetypes.guess_type(mandat_pdf_path)
 
-    # Enregistrement du fichier .emltpl
+    # Enregistrement du fichier .emltpl (nom unique : pas d'écrasement entre sessions)
     with tempfile.NamedTemporaryFile(delete=False, suffix=".emltpl", mode='wb') as f:
-        f.write(bytes(msg))
+        f.write(build_mandat_email(selected_row, file_data, mime_type))
         return f.name
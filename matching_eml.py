@@ -1,11 +1,19 @@
 # matching_eml.py
 import os
+import time
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor, wait
 import numpy as np
 import pandas as pd
 from email.message import EmailMessage
 from email.utils import make_msgid
 
+from travel_cache import get_travel_cache, NO_ROUTE
+from geocode_index import get_geocode_index, haversine_km
+from teacher_index import TeacherIndex, student_criteria
+from email_templates import render, attach_inline_images
+from tracing import span, count
+
 # googlemaps est optionnel : on ne bloque pas si non installé
 try:
     import googlemaps
@@ -24,22 +32,177 @@ def _next_departure_18h() -> dt.datetime:
     return dt.datetime(target.year, target.month, target.day, 18, 0)
 
 
-def _calc_duration_minutes(gmaps_client, source: str, destination: str):
+def _calc_duration_minutes(gmaps_client, source: str, destination: str, cache=None):
     try:
         if not source or not destination:
             return None
-        directions = gmaps_client.directions(
-            origin=str(source),
-            destination=str(destination),
-            mode="transit",
-            departure_time=_next_departure_18h(),
-        )
-        if directions:
-            leg = directions[0]["legs"][0]
-            return int(leg["duration"]["value"] // 60)
+        departure = _next_departure_18h()
+        if cache is not None:
+            cached = cache.get(source, destination, departure)
+            if cached is not None:
+                count("maps.cache_trajets")
+                return None if cached == NO_ROUTE else cached
+        try:
+            with span("maps.directions"):
+                directions = gmaps_client.directions(
+                    origin=str(source),
+                    destination=str(destination),
+                    mode="transit",
+                    departure_time=departure,
+                )
+        except Exception as e:
+            # NOT_FOUND : adresse introuvable, réponse définitive -> mise en cache
+            if getattr(e, "status", None) in _MATRIX_FINAL_STATUSES and cache is not None:
+                cache.set(source, destination, departure, None)
+            return None
+        minutes = int(directions[0]["legs"][0]["duration"]["value"] // 60) if directions else None
+        if cache is not None:
+            cache.set(source, destination, departure, minutes)  # None : aucun itinéraire
+        return minutes
     except Exception:
         return None
-    return None
+
+
+# Distance Matrix : 25 destinations max par requête pour une origine
+MATRIX_MAX_DESTINATIONS = 25
+# statuts d'élément définitifs : inutile de retenter en Directions
+_MATRIX_FINAL_STATUSES = ("ZERO_RESULTS", "NOT_FOUND")
+
+
+def _matrix_durations(gmaps_client, source: str, destinations: list, cache=None) -> dict:
+    """
+    Un appel Distance Matrix (une origine, <= 25 destinations).
+    Retourne {destination: minutes} ; None pour un trajet inexistant.
+    Les destinations absentes du dict sont à retenter en Directions.
+    """
+    departure = _next_departure_18h()
+    # lecture du cache en une requête pour tout le lot
+    found = cache.get_many(source, destinations, departure) if cache is not None else {}
+    found = {dest: None if minutes == NO_ROUTE else minutes for dest, minutes in found.items()}
+    todo = [dest for dest in destinations if dest not in found]
+    count("maps.cache_trajets", len(found))
+    if not todo:
+        return found
+
+    with span("maps.distance_matrix", destinations=len(todo)):
+        resp = gmaps_client.distance_matrix(
+            origins=[str(source)],
+            destinations=todo,
+            mode="transit",
+            departure_time=departure,
+        )
+    elements = resp["rows"][0]["elements"]
+    fetched = {}
+    for dest, element in zip(todo, elements):
+        status = element.get("status")
+        if status == "OK" and "duration" in element:
+            fetched[dest] = int(element["duration"]["value"] // 60)
+        elif status in _MATRIX_FINAL_STATUSES:
+            fetched[dest] = None
+    if cache is not None:
+        cache.set_many(source, fetched, departure)
+    found.update(fetched)
+    return found
+
+
+def _compute_durations(gmaps_client, source: str, destinations, cache=None,
+                       max_workers: int = 8, deadline: float | None = 30.0,
+                       api_mode: str = "directions") -> list:
+    """
+    Durées (minutes) pour chaque destination, dans l'ordre de `destinations`.
+    Les appels partent en parallèle (au plus `max_workers`) ; les adresses en
+    double ne sont demandées qu'une fois. Passé `deadline` secondes, les
+    requêtes non terminées sont abandonnées et valent NaN.
+
+    `api_mode="matrix"` : Distance Matrix par lots de 25 destinations, puis
+    Directions pour les paires en échec.
+    """
+    destinations = list(destinations)
+    uniques = list(dict.fromkeys(
+        str(d).strip() for d in destinations if pd.notna(d) and str(d).strip()
+    ))
+    results = {}
+    if uniques:
+        deadline_at = None if deadline is None else time.monotonic() + deadline
+
+        def remaining():
+            return None if deadline_at is None else max(0.0, deadline_at - time.monotonic())
+
+        executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)))
+        todo = uniques
+        pending = 0
+
+        if api_mode == "matrix":
+            chunks = [todo[i:i + MATRIX_MAX_DESTINATIONS]
+                      for i in range(0, len(todo), MATRIX_MAX_DESTINATIONS)]
+            futures = {
+                executor.submit(_matrix_durations, gmaps_client, source, chunk, cache): chunk
+                for chunk in chunks
+            }
+            done, not_done = wait(futures, timeout=remaining())
+            for fut in done:
+                try:
+                    results.update(fut.result())
+                except Exception as e:
+                    print(f"[DEBUG] Distance Matrix en échec ({len(futures[fut])} destinations): {e}")
+            in_flight = {d for fut in not_done for d in futures[fut]}
+            pending += len(in_flight)
+            todo = [d for d in uniques if d not in results and d not in in_flight]
+
+        futures = {
+            executor.submit(_calc_duration_minutes, gmaps_client, source, dest, cache): dest
+            for dest in todo
+        }
+        done, not_done = wait(futures, timeout=remaining())
+        # on ne bloque pas l'UI : les requêtes en vol finissent en arrière-plan
+        executor.shutdown(wait=False, cancel_futures=True)
+        for fut in done:
+            try:
+                results[futures[fut]] = fut.result()
+            except Exception:
+                results[futures[fut]] = None
+        pending += len(not_done)
+        if pending:
+            print(f"[DEBUG] Délai dépassé : {pending}/{len(uniques)} trajets sans réponse")
+
+    out = []
+    for d in destinations:
+        minutes = results.get(str(d).strip()) if pd.notna(d) else None
+        out.append(np.nan if minutes is None else minutes)
+    return out
+
+
+def _detect_adresse_col(columns):
+    """Colonne d'adresse prof (la plus “complète”), ou None."""
+    candidates = [c for c in columns if "adresse" in c.lower()]
+    # privilégier une colonne qui n'a pas "code postal" dans le nom si dispo
+    for c in candidates:
+        if "code" not in c.lower():
+            return c
+    return candidates[0] if candidates else None  # à défaut
+
+
+def _nearest_mask(df: pd.DataFrame, adresse_prof_col: str, origine: str, gmaps_client, index,
+                  k: int) -> np.ndarray:
+    """
+    Préfiltre à vol d'oiseau : masque des `k` profs de `df` les plus proches de
+    `origine` (haversine vectorisé). Ajoute la colonne 'Distance (km)' à `df`.
+    L'index est seulement lu (construit au chargement du roster, cf.
+    build_geocode_index) : seule l'adresse de l'élève peut être géocodée ici.
+    Sans coordonnées pour l'élève, aucun préfiltre n'est appliqué ; les profs
+    pas encore géocodés sont gardés.
+    """
+    origin_coords = index.locate(origine, gmaps_client)
+    if not origin_coords:
+        return np.ones(len(df), dtype=bool)
+
+    addresses = df[adresse_prof_col].tolist()
+    dist = haversine_km(origin_coords, index.coordinates(addresses))
+    df["Distance (km)"] = np.round(dist, 1)
+    order = np.argsort(np.where(np.isnan(dist), np.inf, dist), kind="stable")
+    mask = np.zeros(len(df), dtype=bool)
+    mask[order[:k]] = True
+    return (mask & ~np.isnan(dist)) | index.pending(addresses)
 
 
 def _format_matieres(matieres_str: str) -> str:
@@ -50,7 +213,9 @@ def _format_matieres(matieres_str: str) -> str:
     return parts[0] if parts else ""
 
 
-def _build_emltpl(subject: str, html_body: str, bcc_list=None, to_list=None, cc_list=None) -> bytes:
+def _build_emltpl(subject: str, html_body: str, bcc_list=None, to_list=None, cc_list=None,
+                  inline_images=None) -> bytes:
+    """`inline_images` : images référencées par cid: dans le corps (format email_templates.signature_part)."""
     bcc_list = bcc_list or []
     to_list = to_list or []
     cc_list = cc_list or []
@@ -69,6 +234,7 @@ def _build_emltpl(subject: str, html_body: str, bcc_list=None, to_list=None, cc_
     msg["X-Priority"] = "3"
     msg.set_content("Version texte : ce message contient un corps HTML.")
     msg.add_alternative(html_body, subtype="html")
+    attach_inline_images(msg, inline_images)
     return msg.as_bytes()
 
 
@@ -76,7 +242,16 @@ def run_matching(selected_row: pd.Series,
                  sheets: dict,
                  df_profs: pd.DataFrame,
                  selected_emails=None,
-                 google_api_key: str | None = None):
+                 google_api_key: str | None = None,
+                 travel_cache=None,
+                 max_workers: int = 8,
+                 request_timeout: float = 10.0,
+                 deadline: float | None = 30.0,
+                 api_mode: str = "directions",
+                 gmaps_client=None,
+                 max_candidates: int | None = None,
+                 geocode_index=None,
+                 teacher_index: TeacherIndex | None = None):
     """
     - Sans `selected_emails` : retourne le DataFrame des profs proposés trié par 'Durée Transport (min)'.
     - Avec  `selected_emails` : retourne (file_name, eml_bytes).
@@ -84,73 +259,69 @@ def run_matching(selected_row: pd.Series,
     `google_api_key` :
       - passe la clé directement (recommandé via st.secrets)
       - sinon lue dans l'env: GOOGLE_API_KEY
+
+    `travel_cache` : cache des temps de trajet (défaut : cache disque partagé,
+    cf. travel_cache.get_travel_cache).
+
+    Appels Google Maps : `max_workers` requêtes en parallèle, `request_timeout`
+    secondes par requête et `deadline` secondes au total ; au-delà, les profs
+    restants gardent une durée NaN (résultat partiel, trié en bas).
+
+    `api_mode` : "directions" (un appel par prof) ou "matrix" (Distance Matrix
+    par lots de 25, repli sur Directions pour les paires en échec).
+    `gmaps_client` : client à utiliser à la place de googlemaps.Client
+    (ex. un faux client local pour travailler hors ligne).
+
+    `max_candidates` : si renseigné, seuls les K profs les plus proches à vol
+    d'oiseau (index de géocodage `geocode_index`, défaut : index partagé,
+    construit au chargement du roster) ont un calcul de trajet ; une colonne
+    'Distance (km)' est ajoutée.
+
+    `teacher_index` : index d'éligibilité construit une fois par chargement du
+    roster (défaut : TeacherIndex.for_roster(df_profs)).
     """
     try:
         # ---- Déduction niveau / matières / visio ----
-        niveau_raw = str(selected_row.get("Niveau", "")).strip().lower()
-        matieres_str = str(selected_row.get("Matières enseignées", ""))
-        visio = str(selected_row.get("Visio ?", "")).strip().lower() == "visio"
-
-        niveau_map = {
-            "primaire": "primaire",
-            "6e": "collège", "5e": "collège", "4e": "collège", "3e": "collège",
-            "seconde": "lycée", "première": "lycée", "terminale": "lycée",
-        }
-        niveau_eleve = niveau_map.get(niveau_raw, "supérieur")
-
-        mats = []
-        low = matieres_str.lower()
-        if "maths" in low: mats.append("maths")
-        if "physique" in low: mats.append("physique")
-        if "svt" in low or "biologie" in low: mats.append("svt")
-        if "informatique" in low: mats.append("informatique")
+        niveau_eleve, mats, visio = student_criteria(selected_row)
         if not mats:
             return pd.DataFrame() if selected_emails is None else ("", b"")
 
-        # ---- Filtres profs (identiques à ta version) ----
-        df = df_profs.copy()
-        if visio:
-            df = df[df["Présentiel ou Visio ?"].str.lower().str.contains("visio", na=False)]
-        else:
-            df = df[df["Présentiel ou Visio ?"].str.lower() != "visio"]
-
-        df = df[df["Actif"].isin(["2.Prof OK", "4.Prof potentiellement OK"])]
-        df = df[df["Niveau"].str.contains(niveau_eleve, case=False, na=False)]
-
-        # matières
-        mats_regex = "|".join(mats)
-        df = df[df["Matière"].str.lower().str.contains(mats_regex, na=False)]
+        # ---- Filtres profs (masques précalculés, cf. teacher_index) ----
+        index = teacher_index or TeacherIndex.for_roster(df_profs)
+        df = index.select(niveau_eleve, mats, visio)
 
         # ---- Durée transport (présentiel + clé) ----
         df["Durée Transport (min)"] = np.nan
         origine = str(selected_row.get("Adresse", "")).strip()
 
-        # détecter la colonne d'adresse prof (la plus “complète”)
-        adresse_prof_col = None
-        candidates = [c for c in df.columns if "adresse" in c.lower()]
-        # privilégier une colonne qui n'a pas "code postal" dans le nom si dispo
-        for c in candidates:
-            if "code" not in c.lower():
-                adresse_prof_col = c
-                break
-        if not adresse_prof_col and candidates:
-            adresse_prof_col = candidates[0]  # à défaut
+        adresse_prof_col = _detect_adresse_col(df.columns)
 
         # clé : param > env
         api_key = google_api_key or os.getenv("GOOGLE_API_KEY", "")
 
-        if not visio and api_key and googlemaps and adresse_prof_col and origine:
+        has_client = gmaps_client is not None or (api_key and googlemaps)
+        if not visio and has_client and adresse_prof_col and origine:
+            cache = travel_cache if travel_cache is not None else get_travel_cache()
             try:
-                gmaps = googlemaps.Client(key=api_key)
-                df["Durée Transport (min)"] = df[adresse_prof_col].apply(
-                    lambda dest: _calc_duration_minutes(gmaps, origine, dest)
+                gmaps = gmaps_client or googlemaps.Client(key=api_key, timeout=request_timeout,
+                                                          retry_timeout=request_timeout)
+                to_query = np.ones(len(df), dtype=bool)
+                if max_candidates:
+                    to_query = _nearest_mask(df, adresse_prof_col, origine, gmaps,
+                                             geocode_index or get_geocode_index(), max_candidates)
+                df.loc[to_query, "Durée Transport (min)"] = _compute_durations(
+                    gmaps, origine, df.loc[to_query, adresse_prof_col], cache,
+                    max_workers=max_workers, deadline=deadline, api_mode=api_mode,
                 )
             except Exception:
                 pass  # on laisse à NaN si l’API plante
+            if cache is not None:
+                print(f"[DEBUG] Cache trajets: {cache.stats()}")
 
-        # ---- Tri (NaN en bas) ----
+        # ---- Tri stable (NaN en bas, ordre du roster à durée égale) ----
         df["_dur_tri"] = df["Durée Transport (min)"].fillna(10**9)
-        df = df.sort_values("_dur_tri", ascending=True).drop(columns=["_dur_tri"]).reset_index(drop=True)
+        tri = ["_dur_tri", "Distance (km)"] if "Distance (km)" in df.columns else ["_dur_tri"]
+        df = df.sort_values(tri, ascending=True, kind="mergesort").drop(columns=["_dur_tri"]).reset_index(drop=True)
 
         if selected_emails is None:
             return df
@@ -163,19 +334,8 @@ def run_matching(selected_row: pd.Series,
         matieres_aff = _format_matieres(selected_row.get("Matières enseignées", ""))
 
         subject = f"Proposition d'élève - Niveau {niveau_aff} pour des cours de {matieres_aff}"
-        html_body = f"""
-        <html><body>
-        Hello !<br><br>
-        C'est Idir de Study Success, j'espère que tu vas bien ! 😊<br>
-        Si tu reçois ce mail, c'est parce que tu corresponds parfaitement au profil recherché pour un(e) de nos élèves.<br><br>
-        📌 <b>Élève : {prenom_eleve}</b><br>
-        • Classe : {niveau_aff}<br>
-        • Matière : {matieres_aff}<br>
-        • Dispos : {dispo}<br>
-        • Adresse : {adresse}<br><br>
-        Réponds simplement à ce mail si tu es dispo !<br><br>
-        À très vite,<br>Idir
-        </body></html>""".strip()
+        html_body = render("proposition", eleve_prenom=prenom_eleve, niveau=niveau_aff,
+                           matieres=matieres_aff, dispo=dispo, adresse=adresse)
 
         eml_bytes = _build_emltpl(subject=subject, html_body=html_body, bcc_list=selected_emails)
         file_name = f"Proposition_{prenom_eleve}_{niveau_aff}.emltpl".replace(" ", "_")
@@ -184,3 +344,114 @@ def run_matching(selected_row: pd.Series,
     except Exception as e:
         print(f"[ERREUR MATCHING] {e}")
         return pd.DataFrame() if selected_emails is None else ("", b"")
+
+
+def run_matching_bulk(df_suivi: pd.DataFrame,
+                      df_profs: pd.DataFrame,
+                      google_api_key: str | None = None,
+                      top_n: int | None = 20,
+                      output_path: str | None = None,
+                      travel_cache=None,
+                      max_workers: int = 8,
+                      request_timeout: float = 10.0,
+                      deadline: float | None = 120.0,
+                      api_mode: str = "matrix",
+                      gmaps_client=None,
+                      teacher_index: TeacherIndex | None = None) -> pd.DataFrame:
+    """
+    Classement des profs pour tous les élèves de `df_suivi` en une passe.
+
+    - les masques d'éligibilité sont partagés entre élèves de même signature
+      (niveau, matières, visio) ;
+    - les temps de trajet sont dédoublonnés sur tout le lot : une seule série
+      de requêtes par adresse élève, sur l'union des profs à évaluer ;
+    - `deadline` borne la durée totale des appels Google Maps du lot.
+
+    Retourne un DataFrame long (une ligne par couple élève / prof, `top_n`
+    profs max par élève) ; écrit aussi un Parquet si `output_path` est donné.
+    """
+    try:
+        index = teacher_index or TeacherIndex.for_roster(df_profs)
+        adresse_prof_col = _detect_adresse_col(df_profs.columns)
+
+        # ---- Éligibilité : un masque par signature ----
+        eleves = []
+        for _, row in df_suivi.iterrows():
+            niveau_eleve, mats, visio = student_criteria(row)
+            if not mats:
+                continue
+            origine = "" if visio else str(row.get("Adresse", "")).strip()
+            if origine.lower() == "nan":
+                origine = ""
+            eleves.append((row, index.mask(niveau_eleve, mats, visio), origine))
+
+        # ---- Trajets : dédoublonnage par adresse élève ----
+        durees = {}  # origine -> {adresse prof: minutes}
+        api_key = google_api_key or os.getenv("GOOGLE_API_KEY", "")
+        has_client = gmaps_client is not None or (api_key and googlemaps)
+        if has_client and adresse_prof_col:
+            cache = travel_cache if travel_cache is not None else get_travel_cache()
+            gmaps = gmaps_client or googlemaps.Client(key=api_key, timeout=request_timeout,
+                                                      retry_timeout=request_timeout)
+            par_origine = {}
+            for _, mask, origine in eleves:
+                if origine:
+                    par_origine[origine] = par_origine.get(origine, np.zeros(len(mask), dtype=bool)) | mask
+            deadline_at = None if deadline is None else time.monotonic() + deadline
+            for origine, mask in par_origine.items():
+                dests = list(dict.fromkeys(df_profs.loc[mask, adresse_prof_col].dropna().astype(str)))
+                remaining = None if deadline_at is None else max(0.0, deadline_at - time.monotonic())
+                try:
+                    minutes = _compute_durations(gmaps, origine, dests, cache, max_workers=max_workers,
+                                                 deadline=remaining, api_mode=api_mode)
+                except Exception as e:
+                    print(f"[DEBUG] Trajets indisponibles depuis '{origine}': {e}")
+                    continue
+                durees[origine] = dict(zip(dests, minutes))
+            if cache is not None:
+                print(f"[DEBUG] Cache trajets: {cache.stats()}")
+
+        # ---- Format long : positions (élève, prof) puis un seul take sur df_profs ----
+        adresses = df_profs[adresse_prof_col].to_numpy(dtype=object) if adresse_prof_col else None
+        lignes_eleves, lignes_profs, rangs, minutes_list = [], [], [], []
+        for e, (row, mask, origine) in enumerate(eleves):
+            positions = np.flatnonzero(mask)
+            if not len(positions):
+                continue
+            trajets = durees.get(origine, {})
+            if adresses is not None and trajets:
+                minutes = np.array([trajets.get(a, np.nan) if pd.notna(a) else np.nan
+                                    for a in adresses[positions]], dtype=float)
+            else:
+                minutes = np.full(len(positions), np.nan)
+            # tri stable : NaN en bas, ordre du roster à durée égale
+            order = np.argsort(np.nan_to_num(minutes, nan=10**9), kind="stable")
+            if top_n:
+                order = order[:top_n]
+            lignes_eleves.append(np.full(len(order), e))
+            lignes_profs.append(positions[order])
+            rangs.append(np.arange(1, len(order) + 1))
+            minutes_list.append(minutes[order])
+
+        if lignes_profs:
+            lignes_eleves = np.concatenate(lignes_eleves)
+            result = df_profs.iloc[np.concatenate(lignes_profs)].reset_index(drop=True)
+            result["Durée Transport (min)"] = np.concatenate(minutes_list)
+            result.insert(0, "Rang", np.concatenate(rangs))
+            for col, src in (("Niveau élève", "Niveau"), ("Prénom élève", "Prénom"),
+                             ("Nom élève", "Nom"), ("Id élève", "Id")):
+                values = pd.Series([row.get(src, "") for row, _, _ in eleves])
+                result.insert(0, col, values.take(lignes_eleves).reset_index(drop=True))
+        else:
+            result = pd.DataFrame()
+        if output_path and not result.empty:
+            try:
+                result.to_parquet(output_path, index=False)  # nécessite pyarrow
+                print(f"✅ Propositions écrites: {output_path}")
+            except Exception as e:
+                print(f"❌ Écriture Parquet impossible ({output_path}): {e}")
+        return result
+
+    except Exception as e:
+        print(f"[ERREUR MATCHING BULK] {e}")
+        return pd.DataFrame()
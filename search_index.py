@@ -0,0 +1,164 @@
+# search_index.py
+"""
+Index de recherche des noms (élèves, profs) pour l'interface Streamlit.
+
+Construit une fois par chargement de données :
+- valeurs normalisées (minuscules, sans accents ni ponctuation) ;
+- index inversé des trigrammes : une recherche « contient » ne vérifie que
+  les lignes qui partagent tous les trigrammes de la requête ;
+- index des sous-chaînes de 1-2 caractères pour les requêtes courtes, qui
+  n'ont pas de trigramme (même sémantique « contient »).
+Si rien ne correspond, les lignes sont classées par similarité de bigrammes
+avec leurs mots (coefficient de Dice), ce qui tolère les fautes de frappe
+(« Elouise » → Éloïse, « Jaen » → Jean).
+"""
+
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+# similarité minimale (Dice sur bigrammes) pour un résultat approché
+FUZZY_MIN_SCORE = 0.4
+FUZZY_MAX_RESULTS = 20
+
+
+def normalize(text) -> str:
+    """'  Éloïse-Marie ' -> 'eloise marie'."""
+    if text is None or (isinstance(text, float) and text != text):
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _short_grams(text: str) -> set:
+    """Sous-chaînes de 1 et 2 caractères."""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _bigrams(token: str) -> set:
+    token = f" {token} "
+    return {token[i:i + 2] for i in range(len(token) - 1)}
+
+
+class FieldIndex:
+    """Index d'une colonne (liste de valeurs, positions 0..n-1)."""
+
+    def __init__(self, values):
+        self.values = [normalize(v) for v in values]
+        self.trigrams = {}
+        self._short = {}  # sous-chaîne de 1-2 caractères -> lignes
+        token_ids = {}
+        self._token_rows = []  # mot distinct -> lignes qui le contiennent
+        for i, value in enumerate(self.values):
+            for gram in _trigrams(f" {value} "):
+                self.trigrams.setdefault(gram, []).append(i)
+            for gram in _short_grams(value):
+                self._short.setdefault(gram, []).append(i)
+            for token in value.split():
+                if token not in token_ids:
+                    token_ids[token] = len(self._token_rows)
+                    self._token_rows.append([])
+                self._token_rows[token_ids[token]].append(i)
+
+        # bigrammes des mots distincts (les prénoms / noms se répètent beaucoup)
+        self._bigrams = {}
+        self._token_sizes = np.zeros(len(token_ids))
+        for token, t in token_ids.items():
+            grams = _bigrams(token)
+            self._token_sizes[t] = len(grams)
+            for gram in grams:
+                self._bigrams.setdefault(gram, []).append(t)
+        # couples (ligne, mot distinct) pour reporter les scores des mots sur les lignes
+        self._pair_rows = np.fromiter((i for rows in self._token_rows for i in rows), dtype=np.int64)
+        self._pair_tokens = np.repeat(np.arange(len(self._token_rows)), [len(r) for r in self._token_rows])
+
+    def __len__(self):
+        return len(self.values)
+
+    def contains(self, query: str) -> set:
+        """
+        Lignes dont la valeur normalisée contient `query` (déjà normalisée).
+        """
+        if len(query) < 3:
+            # la posting list d'une sous-chaîne de 1-2 caractères est exacte
+            return set(self._short.get(query, ()))
+        postings = sorted((self.trigrams.get(g, ()) for g in _trigrams(query)), key=len)
+        if not postings or not postings[0]:
+            return set()
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return candidates
+        return {i for i in candidates if query in self.values[i]}
+
+    def similarity(self, query: str) -> np.ndarray:
+        """
+        Score de chaque ligne avec `query` (déjà normalisée) : pour chaque mot
+        de la requête, meilleur Dice (bigrammes) avec un mot de la ligne ; moyenne.
+        """
+        words = query.split()
+        scores = np.zeros(len(self.values))
+        for word in words:
+            grams = _bigrams(word)
+            shared = Counter()
+            for gram in grams:
+                shared.update(self._bigrams.get(gram, ()))
+            token_scores = np.zeros(len(self._token_rows))
+            if shared:
+                ids = np.fromiter(shared.keys(), dtype=np.int64, count=len(shared))
+                counts = np.fromiter(shared.values(), dtype=np.float64, count=len(shared))
+                token_scores[ids] = 2 * counts / (len(grams) + self._token_sizes[ids])
+            word_scores = np.zeros(len(self.values))
+            np.maximum.at(word_scores, self._pair_rows, token_scores[self._pair_tokens])
+            scores += word_scores
+        return scores / max(len(words), 1)
+
+
+class SearchIndex:
+    """Recherche multi-colonnes sur un DataFrame (positions dans l'ordre du DataFrame)."""
+
+    def __init__(self, df, columns):
+        self.size = len(df)
+        self.fields = {col: FieldIndex(df[col].tolist()) for col in columns}
+
+    def search(self, queries: dict, fuzzy: bool = True):
+        """
+        `queries` : {colonne: texte saisi} ; les champs vides sont ignorés.
+        Retourne (positions, approché) : positions des lignes trouvées et
+        booléen indiquant qu'il s'agit de résultats approchés (fautes de frappe).
+        Sans faute : toutes les lignes qui contiennent chaque texte, dans l'ordre d'origine.
+        """
+        queries = {col: normalize(q) for col, q in queries.items() if q and normalize(q)}
+        if not queries:
+            return np.arange(self.size), False
+
+        exact = None
+        for col, query in queries.items():
+            found = self.fields[col].contains(query)
+            exact = found if exact is None else exact & found
+            if not exact:
+                break
+        if exact or not fuzzy:
+            return np.array(sorted(exact or ()), dtype=np.int64), False
+
+        # Résultats approchés : chaque champ doit être proche, classement par score moyen
+        total = np.zeros(self.size)
+        ok = np.ones(self.size, dtype=bool)
+        for col, query in queries.items():
+            field = self.fields[col]
+            scores = np.zeros(self.size)
+            scores[list(field.contains(query))] = 1.0
+            scores = np.maximum(scores, field.similarity(query))
+            ok &= scores >= FUZZY_MIN_SCORE
+            total += scores
+        candidates = np.flatnonzero(ok)
+        order = np.argsort(-total[candidates], kind="stable")
+        return candidates[order][:FUZZY_MAX_RESULTS], True
@@ -4,33 +4,14 @@ Fonction d'envoi de mail via Office 365 (MSAL) compatible Mac/Windows
 Utilise les variables d'environnement pour l'authentification
 """
 
+import io
 import os
-import requests
+import json
+import time
 import base64
-from msal import ConfidentialClientApplication
-from dotenv import load_dotenv
-
-# Charger les variables d'environnement
-load_dotenv()
-
-# Configuration MSAL (Microsoft Authentication Library)
-TENANT_ID = os.environ.get("TENANT_ID")
-CLIENT_ID = os.environ.get("CLIENT_ID")
-CERT_THUMBPRINT = os.environ.get("CERT_THUMBPRINT")
-
-# Lire le certificat depuis variable d'environnement OU fichier
-if "CERT_PRIVATE_KEY" in os.environ:
-    PRIVATE_KEY = os.environ["CERT_PRIVATE_KEY"]
-else:
-    CERT_PRIVATE_KEY_PATH = os.environ.get("CERT_PRIVATE_KEY_PATH", "mailer.key")
-    try:
-        with open(CERT_PRIVATE_KEY_PATH, "r") as f:
-            PRIVATE_KEY = f.read()
-    except FileNotFoundError:
-        PRIVATE_KEY = None
 
-AUTHORITY = f"https://login.microsoftonline.com/{TENANT_ID}"
-SCOPE = ["https://graph.microsoft.com/.default"]
+import graph_client
+from tracing import span, count
 
 # Configuration des expéditeurs
 SENDERS = {
@@ -40,39 +21,169 @@ SENDERS = {
     "mathilde.boher@study-success.fr": "Agathe BOHER",
 }
 
-# Instance MSAL
-app = None
-if TENANT_ID and CLIENT_ID and PRIVATE_KEY and CERT_THUMBPRINT:
+
+def get_token():
+    """Récupère un token d'accès Microsoft Graph (cache partagé, cf. graph_client)"""
+    return graph_client.get_token()
+
+
+# Au-delà de 3 Mo (encodés en base64 dans le JSON, requête Graph plafonnée à
+# 4 Mo), les pièces jointes passent par une session d'upload
+INLINE_ATTACHMENTS_MAX_BYTES = 3 * 1024 * 1024
+# Taille des morceaux envoyés : multiple de 320 Kio, < 4 Mo
+UPLOAD_CHUNK_SIZE = 10 * 320 * 1024
+
+
+def _attachment_size(content):
+    """Taille d'une pièce jointe : contenu en bytes ou chemin de fichier."""
+    if isinstance(content, (bytes, bytearray)):
+        return len(content)
+    return os.path.getsize(content)
+
+
+def _read_attachment(content):
+    if isinstance(content, (bytes, bytearray)):
+        return bytes(content)
+    with open(content, "rb") as f:
+        return f.read()
+
+
+def _base64_size(size: int) -> int:
+    return 4 * ((size + 2) // 3)
+
+
+def _split_attachments(attachments):
+    """Sépare les pièces jointes en (inline, upload) selon le plafond de 3 Mo cumulés, une fois encodées."""
+    inline, upload = [], []
+    inline_bytes = 0
+    for filename, content in attachments or []:
+        size = _attachment_size(content)
+        if inline_bytes + _base64_size(size) <= INLINE_ATTACHMENTS_MAX_BYTES:
+            inline.append((filename, content))
+            inline_bytes += _base64_size(size)
+        else:
+            upload.append((filename, content, size))
+    return inline, upload
+
+
+def _upload_attachment(from_email, message_id, filename, content, size):
+    """Pièce jointe volumineuse : createUploadSession puis envoi par morceaux depuis le disque."""
+    session = graph_client.request(
+        "POST",
+        f"users/{from_email}/messages/{message_id}/attachments/createUploadSession",
+        json={"AttachmentItem": {"attachmentType": "file", "name": filename, "size": size}},
+    )
+    if session.status_code not in (200, 201):
+        raise RuntimeError(f"createUploadSession ({session.status_code}): {session.text[:300]}")
+    upload_url = session.json()["uploadUrl"]
+
+    stream = io.BytesIO(content) if isinstance(content, (bytes, bytearray)) else open(content, "rb")
+    with stream:
+        start = 0
+        while start < size:
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                raise RuntimeError(f"Upload {filename} : fichier tronqué ({start}/{size} octets lus)")
+            end = start + len(chunk) - 1
+            # URL d'upload pré-authentifiée : pas d'en-tête Authorization
+            response = graph_client.request(
+                "PUT", upload_url, auth=False, data=chunk,
+                headers={"Content-Length": str(len(chunk)), "Content-Range": f"bytes {start}-{end}/{size}"},
+            )
+            if response.status_code not in (200, 201):
+                raise RuntimeError(f"Upload {filename} ({response.status_code}): {response.text[:300]}")
+            start = end + 1
+
+
+def _send_with_upload_session(from_email, message, large_attachments):
+    """
+    Brouillon + pièces jointes uploadées par morceaux + envoi du brouillon.
+    Un échec avant l'envoi supprime le brouillon et lève NotSentError (renvoi
+    sans risque) ; une erreur sur /send remonte telle quelle, sans toucher au
+    brouillon : le mail a pu partir.
+    """
+    draft = graph_client.request("POST", f"users/{from_email}/messages", json=message)
+    if draft.status_code not in (200, 201):
+        return draft
+    message_id = draft.json()["id"]
     try:
-        app = ConfidentialClientApplication(
-            client_id=CLIENT_ID,
-            authority=AUTHORITY,
-            client_credential={
-                "private_key": PRIVATE_KEY,
-                "thumbprint": CERT_THUMBPRINT,
-            },
-        )
+        for filename, content, size in large_attachments:
+            _upload_attachment(from_email, message_id, filename, content, size)
     except Exception as e:
-        print(f"⚠️ Erreur MSAL: {e}")
-        app = None
+        # on ne laisse pas de brouillon orphelin dans la boîte de l'expéditeur
+        try:
+            graph_client.request("DELETE", f"users/{from_email}/messages/{message_id}")
+        except Exception as cleanup_error:
+            print(f"[DEBUG] Brouillon {message_id} non supprimé: {cleanup_error}")
+        raise graph_client.NotSentError(f"Pièce jointe non envoyée: {e}") from e
+    return graph_client.request("POST", f"users/{from_email}/messages/{message_id}/send")
 
 
-def get_token():
-    """Récupère un token d'accès Microsoft Graph"""
-    if not app:
-        return None
+def _inline_image_attachment(image):
+    """Image référencée par cid: dans le corps (format email_templates.signature_part)"""
+    return {
+        "@odata.type": "#microsoft.graph.fileAttachment",
+        "name": image["name"],
+        "contentType": image["content_type"],
+        "contentId": image["content_id"],
+        "isInline": True,
+        # base64 déjà calculé pour les signatures (mis en cache par expéditeur)
+        "contentBytes": image.get("content_b64") or base64.b64encode(image["content"]).decode('utf-8'),
+    }
+
+
+def _build_message(to_email, subject, html_body, cc=None, bcc=None, attachments=None, inline_images=None):
+    """Construit la ressource `message` Graph (destinataires, corps HTML, pièces jointes, images inline)"""
+    # Préparer les destinataires
+    to_recipients = [{"emailAddress": {"address": to_email}}]
+    cc_recipients = []
+    bcc_recipients = []
     
-    try:
-        result = app.acquire_token_for_client(scopes=SCOPE)
-        if "access_token" not in result:
-            return None
-        return result["access_token"]
-    except Exception as e:
-        print(f"❌ Erreur authentification: {e}")
-        return None
+    if cc:
+        if isinstance(cc, list):
+            cc_recipients = [{"emailAddress": {"address": email}} for email in cc]
+        else:
+            cc_recipients = [{"emailAddress": {"address": cc}}]
+    
+    if bcc:
+        if isinstance(bcc, list):
+            bcc_recipients = [{"emailAddress": {"address": email}} for email in bcc]
+        else:
+            bcc_recipients = [{"emailAddress": {"address": bcc}}]
+    
+    # Construire le payload
+    message = {
+        "subject": subject,
+        "bodyPreview": subject,
+        "body": {
+            "contentType": "HTML",
+            "content": html_body
+        },
+        "toRecipients": to_recipients,
+        "ccRecipients": cc_recipients,
+        "bccRecipients": bcc_recipients,
+    }
+    
+    # Ajouter les attachments s'il y en a
+    if attachments:
+        message["attachments"] = []
+        for filename, file_content in attachments:
+            # Convertir le contenu en base64
+            encoded_content = base64.b64encode(_read_attachment(file_content)).decode('utf-8')
+            message["attachments"].append({
+                "@odata.type": "#microsoft.graph.fileAttachment",
+                "name": filename,
+                "contentBytes": encoded_content
+            })
+    
+    if inline_images:
+        message.setdefault("attachments", []).extend(_inline_image_attachment(image) for image in inline_images)
+    
+    return message
 
 
-def send_mail(to_email, subject, html_body, from_email, cc=None, bcc=None, attachments=None):
+def send_mail(to_email, subject, html_body, from_email, cc=None, bcc=None, attachments=None,
+              inline_images=None, deferred=False):
     """
     Envoie un email via Microsoft Graph API
     
@@ -83,99 +194,284 @@ def send_mail(to_email, subject, html_body, from_email, cc=None, bcc=None, attac
         from_email (str): Email expéditeur (doit être dans SENDERS)
         cc (str ou list): Email(s) en copie conforme
         bcc (str ou list): Email(s) en copie cachée
-        attachments (list): Liste de tuples (nom_fichier, contenu_bytes)
+        attachments (list): Liste de tuples (nom_fichier, contenu_bytes ou chemin)
+            Au-delà de 3 Mo, les pièces jointes passent par une session d'upload
+            (brouillon + envoi par morceaux lus depuis le disque)
+        inline_images (list): images référencées par cid: dans le corps
+            (dicts name / content_id / content_type / content, cf. email_templates.signature_part)
+        deferred (bool): met le mail dans la file d'envoi durable (mail_outbox)
+            et rend la main immédiatement
     
     Returns:
         dict: {"success": True/False, "message": str}
+              + "status_code" en cas d'échec (None si erreur réseau / token)
+              + "uncertain": True si l'erreur est survenue pendant l'envoi
+                (timeout, connexion coupée) : le mail a pu partir
+              + "outbox_id" si deferred
     """
     
     if from_email not in SENDERS:
         return {
             "success": False,
-            "message": f"❌ Expéditeur non reconnu: {from_email}"
+            "message": f"❌ Expéditeur non reconnu: {from_email}",
+            "status_code": 400
+        }
+    
+    if deferred:
+        from mail_outbox import enqueue_mail, get_worker
+        try:
+            outbox_id = enqueue_mail(to_email, subject, html_body, from_email, cc, bcc, attachments,
+                                     inline_images=inline_images)
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"❌ Impossible de mettre le mail en file d'attente: {e}",
+                "status_code": None
+            }
+        get_worker(send_mail).notify()
+        return {
+            "success": True,
+            "message": f"📨 Email mis en file d'envoi ({SENDERS[from_email]} → {to_email})",
+            "outbox_id": outbox_id
         }
     
     token = get_token()
     if not token:
         return {
             "success": False,
-            "message": "❌ Impossible d'obtenir un token d'authentification\nVérifiez les variables d'environnement: TENANT_ID, CLIENT_ID, CERT_THUMBPRINT"
+            "message": "❌ Impossible d'obtenir un token d'authentification\nVérifiez les variables d'environnement: TENANT_ID, CLIENT_ID, CERT_THUMBPRINT",
+            "status_code": None
         }
     
-    try:
-        # Préparer les destinataires
-        to_recipients = [{"emailAddress": {"address": to_email}}]
-        cc_recipients = []
-        bcc_recipients = []
+    with span("graph.send_mail", pieces_jointes=len(attachments or []),
+              images=len(inline_images or [])) as s:
+        try:
+            inline_attachments, large_attachments = _split_attachments(attachments)
+            message = _build_message(to_email, subject, html_body, cc, bcc, inline_attachments, inline_images)
         
-        if cc:
-            if isinstance(cc, list):
-                cc_recipients = [{"emailAddress": {"address": email}} for email in cc]
+            if large_attachments:
+                response = _send_with_upload_session(from_email, message, large_attachments)
             else:
-                cc_recipients = [{"emailAddress": {"address": cc}}]
+                # URL Microsoft Graph pour envoyer depuis le compte
+                url = f"users/{from_email}/sendMail"
+            
+                payload = {
+                    "message": message,
+                    "saveToSentItems": True
+                }
+            
+                # Session poolée + retries 429/503 (Retry-After), cf. graph_client
+                response = graph_client.request("POST", url, json=payload, timeout=30)
         
-        if bcc:
-            if isinstance(bcc, list):
-                bcc_recipients = [{"emailAddress": {"address": email}} for email in bcc]
+            s["upload"] = bool(large_attachments)
+            s["statut"] = response.status_code
+            if response.status_code in [200, 202]:
+                count("graph.mails_envoyes")
+                return {
+                    "success": True,
+                    "message": f"✅ Email envoyé avec succès de {SENDERS[from_email]} vers {to_email}"
+                }
             else:
-                bcc_recipients = [{"emailAddress": {"address": bcc}}]
-        
-        # Construire le payload
-        message = {
-            "subject": subject,
-            "bodyPreview": subject,
-            "body": {
-                "contentType": "HTML",
-                "content": html_body
-            },
-            "toRecipients": to_recipients,
-            "ccRecipients": cc_recipients,
-            "bccRecipients": bcc_recipients,
-        }
-        
-        # Ajouter les attachments s'il y en a
-        if attachments:
-            message["attachments"] = []
-            for filename, file_content in attachments:
-                # Convertir le contenu en base64
-                encoded_content = base64.b64encode(file_content).decode('utf-8')
-                message["attachments"].append({
-                    "@odata.type": "#microsoft.graph.fileAttachment",
-                    "name": filename,
-                    "contentBytes": encoded_content
-                })
-        
-        # URL Microsoft Graph pour envoyer depuis le compte
-        url = f"https://graph.microsoft.com/v1.0/users/{from_email}/sendMail"
-        
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "message": message,
-            "saveToSentItems": True
-        }
-        
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
-        
-        if response.status_code in [200, 202]:
-            return {
-                "success": True,
-                "message": f"✅ Email envoyé avec succès de {SENDERS[from_email]} vers {to_email}"
-            }
-        else:
+                return {
+                    "success": False,
+                    "message": f"❌ Erreur Microsoft Graph ({response.status_code}): {response.text}",
+                    "status_code": response.status_code
+                }
+    
+        except Exception as e:
+            s["statut"] = f"erreur: {e}"
+            if graph_client.not_sent(e):
+                return {
+                    "success": False,
+                    "message": f"❌ Erreur lors de l'envoi: {str(e)}",
+                    "status_code": None
+                }
             return {
                 "success": False,
-                "message": f"❌ Erreur Microsoft Graph ({response.status_code}): {response.text}"
+                "message": f"⚠️ Envoi incertain (le mail a pu partir): {str(e)}",
+                "status_code": None,
+                "uncertain": True
             }
+
+
+# Graph JSON batching : 20 sous-requêtes max et 4 Mo max par appel $batch
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_BYTES = 3 * 1024 * 1024  # marge sous les 4 Mo (enveloppe JSON, en-têtes)
+BATCH_MAX_RETRIES = 4
+
+
+def _sub_request_error(response):
+    body = response.get("body") or {}
+    error = body.get("error", {}) if isinstance(body, dict) else {}
+    return error.get("message") or str(body)[:300]
+
+
+def _chunks(pending, sizes):
+    """Découpe `pending` en lots d'au plus BATCH_MAX_REQUESTS messages et BATCH_MAX_BYTES octets."""
+    chunk, chunk_bytes = [], 0
+    for i in pending:
+        if chunk and (len(chunk) >= BATCH_MAX_REQUESTS or chunk_bytes + sizes[i] > BATCH_MAX_BYTES):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(i)
+        chunk_bytes += sizes[i]
+    if chunk:
+        yield chunk
+
+
+def send_mail_batch(messages, progress_callback=None):
+    """
+    Envoie plusieurs emails via Microsoft Graph `$batch` (20 sendMail et
+    ~3 Mo max par appel ; un message plus gros part seul via send_mail).
+    Seules les sous-requêtes en échec temporaire (429 / 503) et les appels
+    qui n'ont pas pu partir (connexion impossible) sont renvoyés, avec
+    backoff (Retry-After respecté). Une erreur pendant l'appel $batch
+    (timeout, connexion coupée) laisse les messages du lot en échec
+    « incertain » : Graph a pu les envoyer, on ne les renvoie pas.
     
-    except Exception as e:
-        return {
-            "success": False,
-            "message": f"❌ Erreur lors de l'envoi: {str(e)}"
+    Args:
+        messages (list): dicts avec les arguments de send_mail
+            (to_email, subject, html_body, from_email, cc, bcc, attachments, inline_images)
+        progress_callback (callable): appelé avec (nb_traités, nb_total)
+    
+    Returns:
+        list: un résultat par message, dans l'ordre, comme send_mail :
+              {"success": True/False, "message": str} + "status_code" en cas
+              d'échec, + "uncertain": True si l'envoi a peut-être eu lieu
+    """
+    total = len(messages)
+    results = [None] * total
+    requests_ = {}  # index -> sous-requête $batch
+    sizes = {}  # index -> taille JSON de la sous-requête
+    pending = []
+    for i, msg in enumerate(messages):
+        if msg.get("from_email") not in SENDERS:
+            results[i] = {"success": False, "message": f"❌ Expéditeur non reconnu: {msg.get('from_email')}",
+                          "status_code": 400}
+            continue
+        if _split_attachments(msg.get("attachments"))[1]:
+            # pièces jointes > 3 Mo : session d'upload, hors $batch
+            results[i] = send_mail(**msg)
+            continue
+        sub = {
+            "id": str(i),
+            "method": "POST",
+            "url": f"/users/{msg['from_email']}/sendMail",
+            "headers": {"Content-Type": "application/json"},
+            "body": {
+                "message": _build_message(msg["to_email"], msg["subject"], msg["html_body"],
+                                          msg.get("cc"), msg.get("bcc"), msg.get("attachments"),
+                                          msg.get("inline_images")),
+                "saveToSentItems": True,
+            },
         }
+        size = len(json.dumps(sub))
+        if size > BATCH_MAX_BYTES:
+            results[i] = send_mail(**msg)
+            continue
+        requests_[i], sizes[i] = sub, size
+        pending.append(i)
+
+    if pending and not get_token():
+        for i in pending:
+            results[i] = {
+                "success": False,
+                "message": "❌ Impossible d'obtenir un token d'authentification\nVérifiez les variables d'environnement: TENANT_ID, CLIENT_ID, CERT_THUMBPRINT",
+                "status_code": None
+            }
+        pending = []
+
+    def report():
+        if progress_callback:
+            progress_callback(sum(r is not None for r in results), total)
+
+    report()
+    last_errors = {}  # index -> (message, status_code)
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        if not pending:
+            break
+        retry = []
+        retry_after = 0.0
+        for chunk in _chunks(pending, sizes):
+            try:
+                with span("graph.batch", messages=len(chunk), octets=sum(sizes[i] for i in chunk)) as s:
+                    payload = {"requests": [requests_[i] for i in chunk]}
+                    response = graph_client.request("POST", "$batch", json=payload, timeout=60)
+                    s["statut"] = response.status_code
+            except Exception as e:
+                if graph_client.not_sent(e):
+                    for i in chunk:
+                        last_errors[i] = (f"❌ Erreur lors de l'envoi: {e}", None)
+                    retry.extend(chunk)
+                    continue
+                for i in chunk:
+                    results[i] = {
+                        "success": False,
+                        "message": f"⚠️ Envoi incertain (le mail a pu partir): {e}",
+                        "status_code": None,
+                        "uncertain": True
+                    }
+                report()
+                continue
+
+            if response.status_code != 200:
+                for i in chunk:
+                    results[i] = {
+                        "success": False,
+                        "message": f"❌ Erreur Microsoft Graph ({response.status_code}): {response.text}",
+                        "status_code": response.status_code
+                    }
+                report()
+                continue
+
+            answered = set()
+            for sub in response.json().get("responses", []):
+                i = int(sub["id"])
+                answered.add(i)
+                status = sub.get("status", 0)
+                msg = messages[i]
+                if status in (200, 202):
+                    count("graph.mails_envoyes")
+                    results[i] = {
+                        "success": True,
+                        "message": f"✅ Email envoyé avec succès de {SENDERS[msg['from_email']]} vers {msg['to_email']}"
+                    }
+                elif status in graph_client.RETRY_STATUSES_POST:
+                    last_errors[i] = (f"❌ Erreur Microsoft Graph ({status}): {_sub_request_error(sub)}", status)
+                    header = (sub.get("headers") or {}).get("Retry-After")
+                    try:
+                        if header:
+                            retry_after = max(retry_after, min(float(header), graph_client.BACKOFF_MAX))
+                    except ValueError:
+                        pass
+                    retry.append(i)
+                else:
+                    results[i] = {
+                        "success": False,
+                        "message": f"❌ Erreur Microsoft Graph ({status}): {_sub_request_error(sub)}",
+                        "status_code": status
+                    }
+            # sous-requête absente de la réponse : sort inconnu, pas de renvoi
+            for i in set(chunk) - answered:
+                results[i] = {
+                    "success": False,
+                    "message": "⚠️ Envoi incertain : pas de réponse $batch pour ce message",
+                    "status_code": None,
+                    "uncertain": True
+                }
+            report()
+
+        pending = sorted(retry)
+        if pending and attempt < BATCH_MAX_RETRIES:
+            delay = retry_after or min(graph_client.BACKOFF_BASE * 2 ** attempt, graph_client.BACKOFF_MAX)
+            print(f"[DEBUG] $batch : {len(pending)} envoi(s) à retenter dans {delay:.1f}s")
+            time.sleep(delay)
+
+    for i in pending:
+        message, status = last_errors.get(i, ("❌ Envoi abandonné après plusieurs essais", None))
+        results[i] = {"success": False, "message": message, "status_code": status}
+    report()
+    return results
 
 
 def get_sender_list():
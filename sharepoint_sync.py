@@ -0,0 +1,248 @@
+# sharepoint_sync.py
+"""
+Miroir local des dossiers SharePoint utiles, synchronisé par requêtes delta
+Microsoft Graph (`/drive/root/delta`).
+
+Le jeton delta est conservé sur disque : chaque synchronisation ne rapporte
+que les éléments modifiés depuis la précédente, et seuls les fichiers des
+dossiers suivis dont le cTag a changé sont retéléchargés. Un téléchargement
+en échec laisse l'élément marqué « à retélécharger » (`pending`) : il est
+retenté aux synchronisations suivantes même si le delta ne le renvoie plus.
+`base_url` et `session` sont injectables (ex. faux serveur Graph local).
+"""
+
+import os
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+import graph_client
+from Graph_Api import SITE_ID
+
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", graph_client.GRAPH_URL)
+MIRROR_DIR = Path(os.getenv("SHAREPOINT_MIRROR_DIR") or Path(tempfile.gettempdir()) / "study_success_mirror")
+SYNC_FOLDERS = [f.strip() for f in os.getenv("SHAREPOINT_SYNC_FOLDERS", "GESTION QUOTIDIENNE").split(";") if f.strip()]
+SYNC_INTERVAL_SECONDS = int(os.getenv("SHAREPOINT_SYNC_INTERVAL", "300"))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class SharePointMirror:
+    """Copie locale des fichiers de `folders` (chemins relatifs à la racine du drive)."""
+
+    def __init__(self, mirror_dir=MIRROR_DIR, folders=None, base_url: str = GRAPH_BASE_URL,
+                 token_provider=graph_client.get_token, session=None):
+        self.mirror_dir = Path(mirror_dir)
+        self.folders = [f.strip("/") for f in (folders or SYNC_FOLDERS)]
+        self.base_url = base_url.rstrip("/")
+        self.token_provider = token_provider
+        self.session = session or graph_client.get_session()
+        self.state_path = self.mirror_dir / "_delta_state.json"
+        self.delta_link = None
+        self.items = {}  # id -> {name, parent, folder, ctag, local, pending}
+        self.last_sync = None
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._load_state()
+
+    # ---- État persistant ----
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.delta_link = state.get("delta_link")
+            self.items = state.get("items", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[DEBUG] État delta illisible, resynchronisation complète: {e}")
+
+    def _save_state(self):
+        self.mirror_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"delta_link": self.delta_link, "items": self.items}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def reset(self):
+        """Oublie le jeton delta : la prochaine synchronisation repart de zéro."""
+        self.delta_link = None
+        self.items = {}
+
+    # ---- Arborescence ----
+    def _drive_path(self, item_id: str):
+        """Chemin 'Dossier/Sous-dossier/fichier' reconstruit par les parents, ou None."""
+        parts = []
+        current = self.items.get(item_id)
+        while current is not None:
+            if current.get("root"):
+                return "/".join(reversed(parts))
+            parts.append(current["name"])
+            current = self.items.get(current.get("parent"))
+        return None
+
+    def _is_tracked(self, drive_path: str) -> bool:
+        return any(drive_path == f or drive_path.startswith(f + "/") for f in self.folders)
+
+    def local_path(self, drive_path: str):
+        """Fichier du miroir pour `drive_path`, ou None s'il n'est pas (encore) synchronisé."""
+        path = self.mirror_dir / drive_path.strip("/")
+        return str(path) if path.is_file() else None
+
+    # ---- Synchronisation ----
+    def _get(self, url: str, token: str, **kwargs):
+        return self.session.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=60, **kwargs)
+
+    def _download(self, item_id: str, download_url: str | None, target: Path, token: str):
+        """Écrit le fichier par blocs dans un .part, renommé seulement une fois complet."""
+        if download_url:  # URL pré-authentifiée fournie par le delta
+            response = self.session.get(download_url, timeout=120, stream=True)
+        else:
+            response = self._get(f"{self.base_url}/sites/{SITE_ID}/drive/items/{item_id}/content", token,
+                                 stream=True)
+        try:
+            response.raise_for_status()
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(delete=False, dir=target.parent, suffix=".part") as tmp:
+                try:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        tmp.write(chunk)
+                except BaseException:
+                    tmp.close()
+                    os.remove(tmp.name)
+                    raise
+            os.replace(tmp.name, target)
+        finally:
+            response.close()
+
+    def _remove_local(self, entry: dict):
+        local = entry.get("local") if entry else None
+        if local:
+            try:
+                os.remove(self.mirror_dir / local)
+            except FileNotFoundError:
+                pass
+
+    def sync(self) -> dict:
+        """Applique les changements depuis le dernier jeton delta. Retourne un résumé."""
+        with self._sync_lock:
+            token = self.token_provider()
+            if not token:
+                print("❌ Synchronisation SharePoint impossible: pas de token")
+                return {"updated": 0, "deleted": 0, "error": "token"}
+
+            initial_url = f"{self.base_url}/sites/{SITE_ID}/drive/root/delta"
+            url = self.delta_link or initial_url
+            changed = {}  # id -> (cTag, downloadUrl éventuelle)
+            deleted = 0
+
+            while url:
+                response = self._get(url, token)
+                if response.status_code == 410:  # jeton expiré : resynchronisation complète
+                    print("[DEBUG] Jeton delta expiré, resynchronisation complète")
+                    self.reset()
+                    changed.clear()
+                    url = initial_url
+                    continue
+                response.raise_for_status()
+                data = response.json()
+
+                for item in data.get("value", []):
+                    item_id = item["id"]
+                    if "deleted" in item:
+                        self._remove_local(self.items.pop(item_id, None))
+                        changed.pop(item_id, None)
+                        deleted += 1
+                        continue
+                    previous = self.items.get(item_id, {})
+                    entry = {
+                        "name": item.get("name", ""),
+                        "parent": (item.get("parentReference") or {}).get("id"),
+                        "root": "root" in item,
+                        "folder": "folder" in item or "root" in item,
+                        "ctag": previous.get("ctag"),
+                        "local": previous.get("local"),
+                        "pending": previous.get("pending"),
+                    }
+                    self.items[item_id] = entry
+                    if "file" in item and item.get("cTag") != previous.get("ctag"):
+                        changed[item_id] = (item.get("cTag"), item.get("@microsoft.graph.downloadUrl"))
+
+                url = data.get("@odata.nextLink")
+                if not url:
+                    self.delta_link = data.get("@odata.deltaLink")
+
+            updated = failed = 0
+            for item_id, entry in self.items.items():
+                if entry["folder"]:
+                    continue
+                drive_path = self._drive_path(item_id)
+                if not drive_path or not self._is_tracked(drive_path):
+                    if entry.get("local"):
+                        self._remove_local(entry)
+                        entry["local"] = None
+                    continue
+                target = self.mirror_dir / drive_path
+                previous_local = entry.get("local")
+                if item_id not in changed and previous_local and previous_local != drive_path:
+                    # renommé / déplacé sans changement de contenu
+                    if (self.mirror_dir / previous_local).exists():
+                        target.parent.mkdir(parents=True, exist_ok=True)
+                        os.replace(self.mirror_dir / previous_local, target)
+                    entry["local"] = drive_path
+                if item_id in changed or entry.get("pending") or not target.exists():
+                    ctag, download_url = changed.get(item_id, (entry.get("pending") or entry.get("ctag"), None))
+                    try:
+                        self._download(item_id, download_url, target, token)
+                    except Exception as e:
+                        print(f"❌ Téléchargement miroir impossible pour {drive_path}: {e}")
+                        # le cTag n'avance pas : retenté à la prochaine synchronisation
+                        entry["pending"] = ctag or entry.get("ctag") or "?"
+                        failed += 1
+                        continue
+                    if entry.get("local") and entry["local"] != drive_path:
+                        self._remove_local(entry)
+                    entry["ctag"], entry["local"], entry["pending"] = ctag, drive_path, None
+                    updated += 1
+
+            self._save_state()
+            self.last_sync = {"updated": updated, "deleted": deleted, "failed": failed}
+            if updated or deleted or failed:
+                print(f"🔄 Miroir SharePoint: {updated} fichier(s) mis à jour, {deleted} supprimé(s)"
+                      + (f", {failed} en échec (à retenter)" if failed else ""))
+            return self.last_sync
+
+    # ---- Tâche de fond ----
+    def start(self, interval: int = SYNC_INTERVAL_SECONDS):
+        """Lance la synchronisation périodique dans un thread démon (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"❌ Erreur synchronisation SharePoint: {e}")
+                self._stop.wait(interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="sharepoint-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror() -> SharePointMirror:
+    """Miroir partagé par le process."""
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = SharePointMirror()
+        return _mirror
@@ -0,0 +1,125 @@
+# teacher_index.py
+"""
+Index d'éligibilité des profs pour run_matching.
+
+Les filtres texte (modalité visio, Actif, Niveau, Matière) sont évalués une
+seule fois par chargement du roster et stockés en masques booléens NumPy ;
+une requête d'éligibilité se réduit ensuite à quelques ET logiques.
+Résultats identiques aux filtres `.str.contains(...)` historiques.
+"""
+
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from workbook_cache import frame_fingerprint
+
+NIVEAU_MAP = {
+    "primaire": "primaire",
+    "6e": "collège", "5e": "collège", "4e": "collège", "3e": "collège",
+    "seconde": "lycée", "première": "lycée", "terminale": "lycée",
+}
+NIVEAUX = ("primaire", "collège", "lycée", "supérieur")
+MATIERES = ("maths", "physique", "svt", "informatique")
+ACTIFS_OK = ["2.Prof OK", "4.Prof potentiellement OK"]
+
+
+def student_criteria(selected_row: pd.Series):
+    """
+    Signature d'un élève : (niveau, matières, visio).
+    `matières` est un tuple vide si aucune matière n'est couverte.
+    """
+    niveau_raw = str(selected_row.get("Niveau", "")).strip().lower()
+    matieres_str = str(selected_row.get("Matières enseignées", ""))
+    visio = str(selected_row.get("Visio ?", "")).strip().lower() == "visio"
+
+    niveau_eleve = NIVEAU_MAP.get(niveau_raw, "supérieur")
+
+    mats = []
+    low = matieres_str.lower()
+    if "maths" in low: mats.append("maths")
+    if "physique" in low: mats.append("physique")
+    if "svt" in low or "biologie" in low: mats.append("svt")
+    if "informatique" in low: mats.append("informatique")
+    return niveau_eleve, tuple(mats), visio
+
+
+def _as_text(s: pd.Series) -> pd.Series:
+    # une colonne entièrement vide est lue en float : on garde l'accès .str
+    return s if s.dtype != float else s.astype(object)
+
+
+class TeacherIndex:
+    """Masques d'éligibilité précalculés pour un DataFrame `df_profs` donné."""
+
+    def __init__(self, df_profs: pd.DataFrame):
+        self.df_profs = df_profs
+        self.size = len(df_profs)
+
+        modalite = _as_text(df_profs["Présentiel ou Visio ?"]).str.lower()
+        self.visio_ok = modalite.str.contains("visio", na=False).to_numpy(dtype=bool)
+        self.presentiel_ok = (modalite != "visio").to_numpy(dtype=bool)
+        self.actif_ok = df_profs["Actif"].isin(ACTIFS_OK).to_numpy(dtype=bool)
+
+        niveau = _as_text(df_profs["Niveau"])
+        self.niveau = {
+            n: niveau.str.contains(n, case=False, na=False).to_numpy(dtype=bool)
+            for n in NIVEAUX
+        }
+        matiere = _as_text(df_profs["Matière"]).str.lower()
+        self.matiere = {
+            m: matiere.str.contains(m, na=False).to_numpy(dtype=bool)
+            for m in MATIERES
+        }
+        self._masks = {}
+
+    def mask(self, niveau_eleve: str, mats, visio: bool) -> np.ndarray:
+        """Masque booléen des profs éligibles (mémorisé par signature)."""
+        key = (niveau_eleve, tuple(mats), bool(visio))
+        cached = self._masks.get(key)
+        if cached is not None:
+            return cached
+
+        m = (self.visio_ok if visio else self.presentiel_ok) & self.actif_ok
+        niveau_mask = self.niveau.get(niveau_eleve)
+        if niveau_mask is None:
+            niveau_mask = _as_text(self.df_profs["Niveau"]).str.contains(
+                niveau_eleve, case=False, na=False).to_numpy(dtype=bool)
+        m = m & niveau_mask
+
+        mats_mask = np.zeros(self.size, dtype=bool)
+        for mat in mats:
+            mats_mask |= self.matiere[mat]
+        m = m & mats_mask
+
+        self._masks[key] = m
+        return m
+
+    def select(self, niveau_eleve: str, mats, visio: bool) -> pd.DataFrame:
+        """Sous-ensemble (copie) des profs éligibles, index d'origine conservé."""
+        return self.df_profs[self.mask(niveau_eleve, mats, visio)].copy()
+
+    @classmethod
+    def for_roster(cls, df_profs: pd.DataFrame) -> "TeacherIndex":
+        """
+        Index du roster `df_profs`, réutilisé tant que son contenu ne change
+        pas (empreinte frame_fingerprint), même si le DataFrame est relu à
+        chaque rerun Streamlit.
+        """
+        global _last_index
+        if _last_index is not None:
+            ref, fingerprint, index = _last_index
+            if ref() is df_profs and index.size == len(df_profs):
+                return index
+        fingerprint = frame_fingerprint(df_profs)
+        if (_last_index is not None and _last_index[1] == fingerprint
+                and _last_index[2].df_profs.index.equals(df_profs.index)):
+            index = _last_index[2]
+        else:
+            index = cls(df_profs)
+        _last_index = (weakref.ref(df_profs), fingerprint, index)
+        return index
+
+
+_last_index = None
@@ -0,0 +1,110 @@
+# tracing.py
+"""
+Traces légères des chemins coûteux (SharePoint, lecture Excel, Google Maps,
+token et envois Microsoft Graph), pour savoir où part le temps quand l'app
+rame.
+
+- `span(nom, **attributs)` : mesure un bloc (durée, erreur éventuelle) ;
+- `count(nom)` : compteur (appels API, hits de cache...) ;
+- `stats()` / `counters()` / `recent()` : agrégats pour le panneau
+  Diagnostics de l'app.
+
+Les agrégats sont partagés par le process (toutes sessions Streamlit
+confondues). Si TRACE_EXPORT_PATH est défini, chaque span est aussi ajouté
+en une ligne JSON à ce fichier, pour analyse hors ligne.
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+RECENT_SPANS = 200
+
+_lock = threading.Lock()
+_stats = {}  # nom -> {"count", "errors", "total_ms", "max_ms"}
+_counters = {}  # nom -> valeur
+_recent = deque(maxlen=RECENT_SPANS)
+_export_file = None
+
+
+def _export(record: dict):
+    global _export_file
+    try:
+        if _export_file is None:
+            _export_file = open(TRACE_EXPORT_PATH, "a", encoding="utf-8")
+        _export_file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        _export_file.flush()
+    except Exception as e:
+        print(f"[DEBUG] Export des traces impossible ({TRACE_EXPORT_PATH}): {e}")
+
+
+def _record(name: str, start: float, duration_ms: float, attrs: dict, error):
+    record = {"name": name, "start": round(start, 3), "duration_ms": round(duration_ms, 2), **attrs}
+    if error:
+        record["error"] = error
+    with _lock:
+        agg = _stats.get(name)
+        if agg is None:
+            agg = _stats[name] = {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+        agg["count"] += 1
+        agg["errors"] += 1 if error else 0
+        agg["total_ms"] += duration_ms
+        agg["max_ms"] = max(agg["max_ms"], duration_ms)
+        _recent.append(record)
+        if TRACE_EXPORT_PATH:
+            _export(record)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Mesure le bloc. Rend le dict des attributs, complétable dans le bloc
+    (ex. `s["resultat"] = "cache"`). Une exception est notée puis relancée.
+    """
+    start = time.time()
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _record(name, start, (time.perf_counter() - t0) * 1000, attrs, error)
+
+
+def count(name: str, n: int = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def stats() -> dict:
+    """{nom du span: {count, errors, total_ms, avg_ms, max_ms}}."""
+    with _lock:
+        return {
+            name: {**agg, "total_ms": round(agg["total_ms"], 1), "max_ms": round(agg["max_ms"], 1),
+                   "avg_ms": round(agg["total_ms"] / agg["count"], 1)}
+            for name, agg in sorted(_stats.items())
+        }
+
+
+def counters() -> dict:
+    with _lock:
+        return dict(sorted(_counters.items()))
+
+
+def recent(n: int = 50) -> list:
+    """Derniers spans terminés, du plus récent au plus ancien."""
+    with _lock:
+        return list(_recent)[-n:][::-1]
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _counters.clear()
+        _recent.clear()
@@ -0,0 +1,252 @@
+# travel_cache.py
+"""
+Cache disque des temps de trajet Google Maps (SQLite).
+
+Clé = (origine normalisée, destination normalisée, créneau de départ).
+Le créneau est dérivé de `_next_departure_18h` (jour de semaine + heure) :
+un trajet « lundi 18h » reste valable d'une semaine sur l'autre, la TTL
+borne la fraîcheur des horaires de transport.
+
+Les trajets inexistants (ZERO_RESULTS / NOT_FOUND) sont mémorisés aussi,
+sous la valeur NO_ROUTE et avec une TTL plus courte : sans cela une adresse
+introuvable repartirait vers l'API à chaque matching.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+import datetime as dt
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_NEGATIVE_TTL_SECONDS = 24 * 3600
+NO_ROUTE = -1  # valeur stockée (et renvoyée) pour un trajet inexistant
+DEFAULT_MAX_ENTRIES = 50_000
+_EVICT_EVERY = 100  # vérification de la taille toutes les N écritures
+_SQL_MAX_PARAMS = 500  # destinations par requête IN (...)
+
+
+def normalize_address(address) -> str:
+    """Normalise une adresse libre : casse, espaces, ponctuation de bord."""
+    s = unicodedata.normalize("NFKC", str(address or ""))
+    s = " ".join(s.lower().replace(",", " , ").split())
+    return s.replace(" ,", ",").strip(" ,")
+
+
+def departure_slot(departure: dt.datetime) -> str:
+    """Créneau de départ : '<jour de semaine>-HH:MM' (0 = lundi)."""
+    return f"{departure.weekday()}-{departure:%H:%M}"
+
+
+class TravelTimeCache:
+    """
+    Cache persistant des durées (minutes) avec TTL et éviction LRU par taille.
+    Utilisable depuis plusieurs threads (une connexion protégée par un verrou).
+    `minutes=None` à l'écriture enregistre un trajet inexistant, relu comme
+    NO_ROUTE et conservé `negative_ttl_seconds` seulement.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 negative_ttl_seconds: int = DEFAULT_NEGATIVE_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = min(negative_ttl_seconds, ttl_seconds)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS travel_times (
+                       origin TEXT NOT NULL,
+                       destination TEXT NOT NULL,
+                       slot TEXT NOT NULL,
+                       minutes INTEGER NOT NULL,
+                       created_at REAL NOT NULL,
+                       accessed_at REAL NOT NULL,
+                       PRIMARY KEY (origin, destination, slot)
+                   )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_travel_accessed ON travel_times(accessed_at)"
+            )
+            self._conn.commit()
+        self.purge()
+
+    def _key(self, origin, destination, departure: dt.datetime):
+        return normalize_address(origin), normalize_address(destination), departure_slot(departure)
+
+    def _expired(self, minutes, created_at, now) -> bool:
+        ttl = self.negative_ttl_seconds if minutes == NO_ROUTE else self.ttl_seconds
+        return now - created_at > ttl
+
+    @staticmethod
+    def _stored(minutes) -> int:
+        return NO_ROUTE if minutes is None else int(minutes)
+
+    def get(self, origin, destination, departure: dt.datetime):
+        """
+        Retourne la durée en minutes, NO_ROUTE pour un trajet inexistant,
+        ou None (absente ou expirée).
+        """
+        key = self._key(origin, destination, departure)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT minutes, created_at FROM travel_times WHERE origin=? AND destination=? AND slot=?",
+                key,
+            ).fetchone()
+            if row is None or self._expired(row[0], row[1], now):
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE travel_times SET accessed_at=? WHERE origin=? AND destination=? AND slot=?",
+                (now, *key),
+            )
+            self._conn.commit()
+            self.hits += 1
+            return int(row[0])
+
+    def get_many(self, origin, destinations, departure: dt.datetime) -> dict:
+        """
+        Durées depuis `origin` vers plusieurs destinations : {destination: minutes}
+        pour celles en cache (NO_ROUTE si trajet inexistant). Une requête par
+        paquet et un seul commit.
+        """
+        slot = departure_slot(departure)
+        src = normalize_address(origin)
+        keys = {}
+        for dest in destinations:
+            keys.setdefault(normalize_address(dest), []).append(dest)
+        now = time.time()
+        found = {}
+        with self._lock:
+            normalized = list(keys)
+            for start in range(0, len(normalized), _SQL_MAX_PARAMS):
+                chunk = normalized[start:start + _SQL_MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT destination, minutes, created_at FROM travel_times "
+                    f"WHERE origin=? AND slot=? AND destination IN ({','.join('?' * len(chunk))})",
+                    (src, slot, *chunk),
+                ).fetchall()
+                for dest, minutes, created_at in rows:
+                    if not self._expired(minutes, created_at, now):
+                        found[dest] = int(minutes)
+            if found:
+                self._conn.executemany(
+                    "UPDATE travel_times SET accessed_at=? WHERE origin=? AND destination=? AND slot=?",
+                    [(now, src, dest, slot) for dest in found],
+                )
+                self._conn.commit()
+            hits = sum(len(keys[dest]) for dest in found)
+            self.hits += hits
+            self.misses += sum(len(v) for v in keys.values()) - hits
+        return {original: minutes for dest, minutes in found.items() for original in keys[dest]}
+
+    def set_many(self, origin, durations: dict, departure: dt.datetime):
+        """
+        Enregistre {destination: minutes} depuis `origin` en un seul commit
+        (minutes=None : trajet inexistant).
+        """
+        if not durations:
+            return
+        slot = departure_slot(departure)
+        src = normalize_address(origin)
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO travel_times VALUES (?, ?, ?, ?, ?, ?)",
+                [(src, normalize_address(dest), slot, self._stored(minutes), now, now)
+                 for dest, minutes in durations.items()],
+            )
+            self._conn.commit()
+            before = self._writes
+            self._writes += len(durations)
+            if self._writes // _EVICT_EVERY != before // _EVICT_EVERY:
+                self._evict_locked()
+
+    def set(self, origin, destination, departure: dt.datetime, minutes: int):
+        key = self._key(origin, destination, departure)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO travel_times VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, self._stored(minutes), now, now),
+            )
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict_locked()
+
+    def purge(self):
+        """Supprime les entrées expirées puis applique la limite de taille."""
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "DELETE FROM travel_times WHERE created_at < ? OR (minutes = ? AND created_at < ?)",
+                (now - self.ttl_seconds, NO_ROUTE, now - self.negative_ttl_seconds),
+            )
+            self._conn.commit()
+            self._evict_locked()
+
+    def _evict_locked(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM travel_times").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                """DELETE FROM travel_times WHERE rowid IN (
+                       SELECT rowid FROM travel_times ORDER BY accessed_at ASC LIMIT ?
+                   )""",
+                (excess,),
+            )
+            self._conn.commit()
+            self.evictions += excess
+
+    def stats(self) -> dict:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM travel_times").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "size": size,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_travel_cache():
+    """
+    Cache partagé par le process (toutes sessions Streamlit confondues).
+    Chemin : TRAVEL_CACHE_PATH, sinon le dossier temporaire du système.
+    Retourne None si le cache ne peut pas être ouvert.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            path = os.getenv("TRAVEL_CACHE_PATH") or os.path.join(
+                tempfile.gettempdir(), "study_success_travel_times.sqlite"
+            )
+            try:
+                _default_cache = TravelTimeCache(
+                    path,
+                    ttl_seconds=int(os.getenv("TRAVEL_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+                    max_entries=int(os.getenv("TRAVEL_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                    negative_ttl_seconds=int(os.getenv("TRAVEL_CACHE_NEGATIVE_TTL",
+                                                       DEFAULT_NEGATIVE_TTL_SECONDS)),
+                )
+            except Exception as e:
+                print(f"[DEBUG] Cache trajets indisponible: {e}")
+                return None
+        return _default_cache
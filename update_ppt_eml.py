@@ -1,81 +1,76 @@
+import io
 import os
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from pptx import Presentation
-import pandas as pd
 from email.message import EmailMessage
 from email.utils import make_msgid
 
-def update_ppt(selected_row, excel_file_path, pptx_file_path, pdf_file_folder, oft_template_path=None):
-    df = pd.read_excel(excel_file_path, sheet_name=None)
-    selected_id = selected_row['Id']
+from workbook_cache import load_sheets
+from email_templates import render, SafeHtml, attach_inline_images
+from fill_plan import get_fill_plan
 
-    details_df = df['Profils_élèves'].loc[df['Profils_élèves']['id'] == selected_id]
-    if details_df.empty:
-        raise ValueError(f"Aucun élève trouvé avec l'ID {selected_id}.")
-    details = details_df.iloc[0]
+PPTX_MIME = ('application', 'vnd.openxmlformats-officedocument.presentationml.presentation')
 
-    suivi_info = df['Suivi'].loc[df['Suivi']['Id'] == selected_id].iloc[0]
-    to_email = suivi_info['Mail']
-
-    prs = Presentation(pptx_file_path)
-
-    def set_shape_text(shape, new_text):
-        if shape.has_text_frame:
-            for paragraph in shape.text_frame.paragraphs:
-                for run in paragraph.runs:
-                    run.text = ''
-                if paragraph.runs:
-                    paragraph.runs[0].text = new_text
-                else:
-                    paragraph.text = new_text
+DESCRIPTIONS = {
+    "Visuel": "Ton super-pouvoir, c’est la mémoire des images ! Schémas, mindmaps, vidéos, couleurs…",
+    "Verbal": "Si c’est expliqué à l’oral ou à l’écrit, tu captes vite !",
+    "Sensoriel": "Tu as un esprit logique et concret. Tu n’aimes pas les imprévus...",
+    "Intuitif": "La routine t’ennuie ! Tu aimes découvrir de nouvelles idées...",
+    "Actif": "Tu apprends en faisant : expérimenter, manipuler, discuter...",
+    "Réflexif": "Tu aimes prendre ton temps pour comprendre en profondeur.",
+    "Séquentiel": "Tu préfères apprendre étape par étape, en suivant une logique.",
+    "Global": "Tu as besoin de comprendre la vision d’ensemble avant les détails."
+}
 
-    set_shape_text(prs.slides[0].shapes[10], f"{details['Prénom']} {details['Nom'].upper()}")
 
+def profile_texts(details):
+    """Textes à placer dans le modèle : {zone (cf. fill_plan.SLOTS): texte}."""
     visuel_verbal = "Visuel" if details['Visuel'] > details['Verbal'] else "Verbal"
     sensoriel_intuitif = "Sensoriel" if details['Sensoriel'] > details['Intuitif'] else "Intuitif"
     actif_reflexif = "Actif" if details['Actif'] > details['Réflexif'] else "Réflexif"
     sequentiel_global = "Séquentiel" if details['Séquentiel'] > details['Global'] else "Global"
 
-    set_shape_text(prs.slides[0].shapes[1], visuel_verbal)
-    set_shape_text(prs.slides[0].shapes[2], sensoriel_intuitif)
-    set_shape_text(prs.slides[0].shapes[3], actif_reflexif)
-    set_shape_text(prs.slides[0].shapes[7], sequentiel_global)
-
-    descriptions = {
-        "Visuel": "Ton super-pouvoir, c’est la mémoire des images ! Schémas, mindmaps, vidéos, couleurs…",
-        "Verbal": "Si c’est expliqué à l’oral ou à l’écrit, tu captes vite !",
-        "Sensoriel": "Tu as un esprit logique et concret. Tu n’aimes pas les imprévus...",
-        "Intuitif": "La routine t’ennuie ! Tu aimes découvrir de nouvelles idées...",
-        "Actif": "Tu apprends en faisant : expérimenter, manipuler, discuter...",
-        "Réflexif": "Tu aimes prendre ton temps pour comprendre en profondeur.",
-        "Séquentiel": "Tu préfères apprendre étape par étape, en suivant une logique.",
-        "Global": "Tu as besoin de comprendre la vision d’ensemble avant les détails."
+    return {
+        "nom_eleve": f"{details['Prénom']} {details['Nom'].upper()}",
+        "style_visuel_verbal": visuel_verbal,
+        "style_sensoriel_intuitif": sensoriel_intuitif,
+        "style_actif_reflexif": actif_reflexif,
+        "style_sequentiel_global": sequentiel_global,
+        "desc_visuel_verbal": DESCRIPTIONS[visuel_verbal],
+        "desc_sensoriel_intuitif": DESCRIPTIONS[sensoriel_intuitif],
+        "desc_sequentiel_global": DESCRIPTIONS[sequentiel_global],
+        "desc_actif_reflexif": DESCRIPTIONS[actif_reflexif],
     }
 
-    set_shape_text(prs.slides[0].shapes[4], descriptions[visuel_verbal])
-    set_shape_text(prs.slides[0].shapes[5], descriptions[sensoriel_intuitif])
-    set_shape_text(prs.slides[0].shapes[6], descriptions[sequentiel_global])
-    set_shape_text(prs.slides[0].shapes[9], descriptions[actif_reflexif])
 
-    # Enregistrement du PowerPoint mis à jour
-    new_pptx_path = os.path.join(pdf_file_folder, f"{details['Prénom']}_{details['Nom']}_profil.pptx")
-    prs.save(new_pptx_path)
+def render_deck(template_bytes, details, plan=None) -> bytes:
+    """
+    Copie en mémoire du modèle, remplie pour un élève ; retourne le .pptx en bytes.
+    `plan` : plan de remplissage du modèle (sinon résolu / lu en cache par hash).
+    """
+    prs = Presentation(io.BytesIO(template_bytes))
+    if plan is None:
+        plan = get_fill_plan(template_bytes, prs)
+    plan.apply(prs, profile_texts(details))
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
 
-    # === Génération de l'e-mail HTML avec image intégrée ===
+@lru_cache(maxsize=1)
+def _etapes_image():
     image_path = os.path.join(os.path.dirname(__file__), "etapes.png")
-    image_cid = make_msgid(domain="studysuccess.local")[1:-1]
+    if not os.path.exists(image_path):
+        return None
+    with open(image_path, 'rb') as img:
+        return img.read()
 
-    mail_html = f"""
-    <html>
-      <body>
-        Bonjour,<br><br>
-        Merci d'avoir complété le test de profil d'apprentissage de Study Success, voici les résultats :<br><br>
-        Voici les prochaines étapes :<br><br>
-        <img src="cid:{image_cid}"><br><br>
-        Merci pour votre confiance,<br>
-        Excellente journée,
-      </body>
-    </html>
-    """
+
+def build_profile_email(details, to_email, pptx_name, pptx_bytes) -> bytes:
+    """Mail .emltpl des résultats, deck joint depuis la mémoire (sans relecture disque)."""
+    image_cid = make_msgid(domain="studysuccess.local")[1:-1]
+    mail_html = render("profil_results", image_cid=SafeHtml(image_cid))
 
     msg = EmailMessage()
     msg['Subject'] = f"Résultats test de profil de {details['Prénom']}"
@@ -84,27 +79,133 @@ def update_ppt(selected_row, excel_file_path, pptx_file_path, pdf_file_folder, o
     msg.add_alternative(mail_html, subtype='html')
 
     # Pièce jointe : PPTX
-    with open(new_pptx_path, 'rb') as f:
-        msg.add_attachment(
-            f.read(),
-            maintype='application',
-            subtype='vnd.openxmlformats-officedocument.presentationml.presentation',
-            filename=os.path.basename(new_pptx_path)
-        )
-
-    # Image intégrée
-    if os.path.exists(image_path):
-        with open(image_path, 'rb') as img:
-            msg.get_payload()[1].add_related(
-                img.read(),
-                maintype='image',
-                subtype='png',
-                cid=f"<{image_cid}>"
-            )
+    msg.add_attachment(pptx_bytes, maintype=PPTX_MIME[0], subtype=PPTX_MIME[1], filename=pptx_name)
+
+    # Image intégrée (liée au corps HTML, pas à la pièce jointe)
+    image = _etapes_image()
+    if image:
+        attach_inline_images(msg, [{
+            "name": "etapes.png",
+            "content_id": image_cid,
+            "content_type": "image/png",
+            "content": image,
+        }])
+    return bytes(msg)
+
+
+def update_ppt(selected_row, excel_file_path, pptx_file_path, pdf_file_folder, oft_template_path=None):
+    df = load_sheets(excel_file_path, ["Profils_élèves", "Suivi"])
+    selected_id = selected_row['Id']
+
+    details_df = df['Profils_élèves'].loc[df['Profils_élèves']['id'] == selected_id]
+    if details_df.empty:
+        raise ValueError(f"Aucun élève trouvé avec l'ID {selected_id}.")
+    details = details_df.iloc[0]
+
+    suivi_info = df['Suivi'].loc[df['Suivi']['Id'] == selected_id].iloc[0]
+    to_email = suivi_info['Mail']
+
+    with open(pptx_file_path, 'rb') as f:
+        pptx_bytes = render_deck(f.read(), details)
+
+    # Enregistrement du PowerPoint mis à jour
+    new_pptx_path = os.path.join(pdf_file_folder, f"{details['Prénom']}_{details['Nom']}_profil.pptx")
+    with open(new_pptx_path, 'wb') as f:
+        f.write(pptx_bytes)
 
     # Sauvegarde .emltpl
     eml_path = os.path.join(pdf_file_folder, f"profil_{details['Prénom']}_{details['Nom']}.emltpl")
     with open(eml_path, 'wb') as f:
-        f.write(bytes(msg))
+        f.write(build_profile_email(details, to_email, os.path.basename(new_pptx_path), pptx_bytes))
 
     return eml_path
+
+
+# === Génération groupée ===
+
+# modèle et plan de remplissage chargés une fois par process de travail (cf. _init_worker)
+_worker_template = None
+_worker_plan = None
+
+
+def _init_worker(template_bytes):
+    global _worker_template, _worker_plan
+    _worker_template = template_bytes
+    _worker_plan = get_fill_plan(template_bytes)
+
+
+def _file_id(value) -> str:
+    """Id élève pour les noms de fichiers (12.0 lu par Excel -> '12')."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _generate_one(task):
+    """
+    Un élève : deck en mémoire + .emltpl écrit dans output_dir. Exécuté dans un process du pool.
+    Les fichiers portent l'id de l'élève : deux homonymes ne s'écrasent pas.
+    """
+    details, to_email, output_dir, save_decks = task
+    try:
+        pptx_bytes = render_deck(_worker_template, details, _worker_plan)
+        pptx_name = f"{details['Prénom']}_{details['Nom']}_profil.pptx"
+        suffix = _file_id(details.get('id'))
+        if save_decks:
+            with open(os.path.join(output_dir, f"{details['Prénom']}_{details['Nom']}_{suffix}_profil.pptx"), 'wb') as f:
+                f.write(pptx_bytes)
+        eml_path = os.path.join(output_dir, f"profil_{details['Prénom']}_{details['Nom']}_{suffix}.emltpl")
+        with open(eml_path, 'wb') as f:
+            f.write(build_profile_email(details, to_email, pptx_name, pptx_bytes))
+        return {"id": details.get('id'), "path": eml_path, "error": None}
+    except Exception as e:
+        return {"id": details.get('id'), "path": None, "error": str(e)}
+
+
+def update_ppt_batch(excel_file_path, pptx_file_path, output_dir, ids=None, max_workers=None,
+                     save_decks=False, progress_callback=None):
+    """
+    Decks + mails de résultats pour tous les élèves de `Profils_élèves`
+    (ou seulement `ids`). Le classeur et le modèle sont lus une fois ; chaque
+    process du pool reçoit le modèle à son démarrage et en fait une copie en
+    mémoire par élève. `max_workers=1` : génération dans le process courant.
+
+    Retourne une liste de {"id", "path" (.emltpl), "error"} dans l'ordre des élèves.
+    """
+    df = load_sheets(excel_file_path, ["Profils_élèves", "Suivi"])
+    profils = df['Profils_élèves']
+    if ids is not None:
+        profils = profils[profils['id'].isin(list(ids))]
+    mails = df['Suivi'].drop_duplicates('Id').set_index('Id')['Mail']
+
+    with open(pptx_file_path, 'rb') as f:
+        template_bytes = f.read()
+    # modèle incohérent : erreur tout de suite, avant de lancer le pool
+    get_fill_plan(template_bytes)
+
+    # dicts : plus légers à envoyer aux process que des Series
+    tasks = [
+        (details, mails.get(details['id']), output_dir, save_decks)
+        for details in profils.to_dict('records')
+    ]
+    total = len(tasks)
+    results = []
+
+    def collect(iterator):
+        for result in iterator:
+            results.append(result)
+            if progress_callback:
+                progress_callback(len(results), total)
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or total <= 1:
+        _init_worker(template_bytes)
+        collect(map(_generate_one, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(template_bytes,)) as executor:
+            collect(executor.map(_generate_one, tasks, chunksize=max(1, total // (workers * 4))))
+
+    errors = [r for r in results if r["error"]]
+    print(f"✅ {total - len(errors)}/{total} deck(s) générés" + (f", {len(errors)} erreur(s)" if errors else ""))
+    return results
@@ -0,0 +1,176 @@
+# workbook_cache.py
+"""
+Chargement des classeurs Excel avec cache des DataFrames.
+
+Chaque feuille est parsée une fois par contenu de fichier (hash SHA-256) et
+gardée dans un cache mémoire LRU partagé par le process, borné en octets.
+Un instantané Parquet est écrit à côté du classeur : au démarrage à froid,
+la feuille est relue en colonnes sans passer par openpyxl.
+"""
+
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from tracing import span, count
+
+# pyarrow est optionnel : sans lui, pas d'instantané Parquet
+try:
+    import pyarrow  # noqa: F401
+except Exception:
+    pyarrow = None
+
+MAX_CACHE_BYTES = int(os.getenv("WORKBOOK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_frames = OrderedDict()  # (digest, feuille) -> (DataFrame, taille en octets)
+_frames_bytes = 0
+_sheet_names = {}  # digest -> liste des feuilles
+_digests = {}  # (chemin, mtime_ns, taille) -> digest
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 du fichier, mémorisé tant que (mtime, taille) ne change pas."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    digest = _digests.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _digests[key] = digest
+    return digest
+
+
+def _snapshot_path(path: str, digest: str, sheet: str) -> str:
+    safe_sheet = re.sub(r"[^\w-]+", "_", sheet)
+    return f"{path}.{digest[:16]}.{safe_sheet}.parquet"
+
+
+def _remember(digest: str, sheet: str, df: pd.DataFrame):
+    global _frames_bytes
+    size = int(df.memory_usage(deep=True).sum())
+    with _lock:
+        if (digest, sheet) in _frames:
+            return
+        _frames[(digest, sheet)] = (df, size)
+        _frames_bytes += size
+        while _frames_bytes > MAX_CACHE_BYTES and len(_frames) > 1:
+            _, (_, old_size) = _frames.popitem(last=False)
+            _frames_bytes -= old_size
+
+
+def _cached(digest: str, sheet: str):
+    with _lock:
+        item = _frames.get((digest, sheet))
+        if item is None:
+            return None
+        _frames.move_to_end((digest, sheet))
+        return item[0]
+
+
+def _read_snapshot(path: str, digest: str, sheet: str):
+    snapshot = _snapshot_path(path, digest, sheet)
+    if pyarrow is None or not os.path.exists(snapshot):
+        return None
+    try:
+        return pd.read_parquet(snapshot)
+    except Exception as e:
+        print(f"[DEBUG] Instantané illisible {snapshot}: {e}")
+        return None
+
+
+def _write_snapshot(path: str, digest: str, sheet: str, df: pd.DataFrame):
+    if pyarrow is None:
+        return
+    snapshot = _snapshot_path(path, digest, sheet)
+    try:
+        df.to_parquet(f"{snapshot}.tmp", index=False)
+        os.replace(f"{snapshot}.tmp", snapshot)
+    except Exception as e:
+        # colonnes de types mélangés : on garde seulement le cache mémoire
+        print(f"[DEBUG] Instantané Parquet impossible pour '{sheet}': {e}")
+
+
+def load_sheets(path: str, sheets=None, columns=None) -> dict:
+    """
+    Équivalent de `pd.read_excel(path, sheet_name=...)` avec cache.
+
+    `sheets` : liste des feuilles voulues (None = toutes).
+    `columns` : liste de colonnes commune, ou dict {feuille: colonnes}.
+    Retourne {feuille: DataFrame} ; chaque DataFrame est une copie que
+    l'appelant peut modifier librement.
+    """
+    digest = file_digest(path)
+    if sheets is None:
+        if digest not in _sheet_names:
+            _sheet_names[digest] = pd.ExcelFile(path).sheet_names
+        sheets = _sheet_names[digest]
+    elif isinstance(sheets, str):
+        sheets = [sheets]
+
+    frames = {}
+    missing = []
+    for sheet in sheets:
+        df = _cached(digest, sheet)
+        if df is not None:
+            count("workbook.cache_memoire")
+        else:
+            df = _read_snapshot(path, digest, sheet)
+            if df is not None:
+                count("workbook.instantane_parquet")
+                _remember(digest, sheet, df)
+        if df is None:
+            missing.append(sheet)
+        else:
+            frames[sheet] = df
+
+    if missing:
+        print(f"📊 Lecture Excel: {os.path.basename(path)} ({', '.join(missing)})")
+        with span("workbook.read_excel", file=os.path.basename(path), feuilles=",".join(missing)):
+            parsed = pd.read_excel(path, sheet_name=missing)
+        for sheet, df in parsed.items():
+            _remember(digest, sheet, df)
+            _write_snapshot(path, digest, sheet, df)
+            frames[sheet] = df
+
+    out = {}
+    for sheet in sheets:
+        cols = columns.get(sheet) if isinstance(columns, dict) else columns
+        df = frames[sheet]
+        out[sheet] = (df[list(cols)] if cols else df).copy()
+    return out
+
+
+def load_sheet(path: str, sheet: str, columns=None) -> pd.DataFrame:
+    """Une seule feuille, éventuellement restreinte à `columns`."""
+    return load_sheets(path, [sheet], columns)[sheet]
+
+
+def clear_cache():
+    """Vide le cache mémoire (les instantanés Parquet restent sur disque)."""
+    global _frames_bytes
+    with _lock:
+        _frames.clear()
+        _frames_bytes = 0
+        _sheet_names.clear()
+
+
+def frame_fingerprint(df: pd.DataFrame, columns=None) -> str:
+    """Empreinte du contenu d'un DataFrame (ou de `columns`), pour indexer des caches dérivés."""
+    data = df[list(columns)] if columns else df
+    values = pd.util.hash_pandas_object(data, index=False).to_numpy()
+    return hashlib.sha256(values.tobytes() + ",".join(map(str, data.columns)).encode()).hexdigest()[:16]
+
+
+def row_fingerprint(row) -> str:
+    """Empreinte d'une ligne (Series ou dict) : mêmes valeurs -> même empreinte."""
+    items = row.items() if hasattr(row, "items") else dict(row).items()
+    payload = "\x1f".join(f"{k}\x1e{v}" for k, v in items)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]